@@ -1,5 +1,8 @@
 from aggregator import AggregatorAgent
-from typing import Dict
+from batch import BatchProgress, BatchResult, iterate_in_thread
+from cascade import CascadingProvider
+from scheduler import get_scheduler
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional
 
 class AgenticRAGSystem:
     """Main system class that provides the user interface"""
@@ -11,9 +14,47 @@ class AgenticRAGSystem:
         """Process user query and return response"""
         return self.aggregator.process_query(user_input)
 
+    async def aquery_batch(self, queries: Iterable[str], concurrency: int = 4, remember: bool = False,
+                           on_progress: Optional[Callable[[BatchProgress], None]] = None,
+                           report_every: int = 100) -> AsyncIterator[BatchResult]:
+        """
+        Process many independent queries concurrently, yielding results as they complete
+        Args:
+            queries: Query strings (consumed lazily)
+            concurrency: Maximum number of queries in flight
+            remember: Add each answer to short-term memory
+            on_progress: Called with the running BatchProgress after every result
+            report_every: Print progress every N results (0 disables)
+        """
+        progress = BatchProgress()
+        async for result in self.aggregator.process_batch(queries, concurrency=concurrency, remember=remember):
+            progress.update(result)
+            if on_progress is not None:
+                on_progress(progress)
+            if report_every and progress.completed % report_every == 0:
+                print(f"Batch progress: {progress.describe()}")
+            yield result
+        print(f"Batch finished: {progress.describe()}")
+
+    def query_batch(self, queries: Iterable[str], concurrency: int = 4, remember: bool = False,
+                    on_progress: Optional[Callable[[BatchProgress], None]] = None,
+                    report_every: int = 100) -> Iterator[BatchResult]:
+        """Synchronous form of aquery_batch; results are streamed back as they complete"""
+        return iterate_in_thread(lambda: self.aquery_batch(queries, concurrency, remember, on_progress, report_every))
+
     def get_memory_stats(self) -> Dict[str, int]:
         """Get memory usage statistics"""
         return {
             "short_term_items": len(self.aggregator.memory.short_term),
             "long_term_items": len(self.aggregator.memory.long_term)
         }
+
+    def get_llm_scheduler_stats(self) -> Dict[str, Any]:
+        """Queue depth, wait times and rate-limit counters of the LLM scheduler (empty when it is off)"""
+        scheduler = get_scheduler()
+        return scheduler.stats() if scheduler is not None else {}
+
+    def get_model_cascade_stats(self) -> Dict[str, Any]:
+        """Escalation rate and per-tier latency of the generation cascade (empty when it is off)"""
+        provider = self.aggregator.llm_provider
+        return provider.stats() if isinstance(provider, CascadingProvider) else {}
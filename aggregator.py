@@ -1,11 +1,20 @@
 import asyncio
+import os
+import time
+from batch import BatchResult
 from memory import Memory
+from history import create_history_manager
 from planning_engine import PlanningEngine
-from llm_provider import OpenAIProvider
+from cascade import create_generation_provider
+from llm_provider import create_agent_model, get_stage_model
+from scheduler import BATCH, set_priority
 import json
+from typing import AsyncIterator, Iterable
 
 from agents import Agent, ModelSettings, Runner
 from agents.mcp import MCPServerStdio 
+from mcp_base.client.commands import get_command_layer
+from mcp_base.client.shared_session import create_network_server, get_shared_session, is_connection_error
 
 class AggregatorAgent:
     """Main aggregator agent that orchestrates the RAG process"""
@@ -15,9 +24,20 @@ class AggregatorAgent:
         self.memory = Memory(short_term={}, long_term={})
         self.planning_engine = PlanningEngine()
         self.history = []
+        # Bounds the transcript resent to Runner.run (None when HISTORY_MAX_TOKENS=0)
+        self.history_manager = create_history_manager()
         self.current_agent = None
-        self.llm_provider = OpenAIProvider()
+        # With MCP_SERVER_URL, queries share one session to a long-lived network server instead of spawning one each
+        self.mcp_url = os.getenv("MCP_SERVER_URL")
+        self.shared_mcp = get_shared_session(self.mcp_url)
+        # Structured read-only requests answered by one direct tool call (None when FAST_PATH=0)
+        self.commands = get_command_layer()
+        # Fast tier for routing and generation (escalating to the strong tier on low confidence), default tier for tool use
+        self.llm_provider = create_generation_provider()
+        self.agent_model = create_agent_model(get_stage_model("specialist"))
+        self.router_model = create_agent_model(get_stage_model("router"))
         self._flag_queries_loop = flag_loop
+        self.last_timings = {}
 
         # Inicializar os agentes
         self._setup_agents()
@@ -30,7 +50,7 @@ class AggregatorAgent:
         """Configura todos os agentes"""
         self.agentRagEngineSource = Agent(
             name="RagEngineAssistant",
-            model=self.llm_provider.model,
+            model=self.agent_model,
             handoff_description="Assistente para fazer buscas nas documentações locais RAG",
             instructions=
                 "Você é um assistente para fazer buscas nas documentações oficiais que estão nas nossas bases locais." \
@@ -46,7 +66,7 @@ class AggregatorAgent:
         )
         self.agentSearchEngineSource = Agent(
             name="SearchEngineAssistant",
-            model=self.llm_provider.model,
+            model=self.agent_model,
             handoff_description="Assistente para fazer buscas de fontes externas na web",
             instructions=
                 "Você DEVE usar a ferramenta search_web para todas as perguntas." \
@@ -66,7 +86,7 @@ class AggregatorAgent:
         )
         self.agentCloudEngineSource = Agent(
             name="CloudEngineAssistant",
-            model=self.llm_provider.model,
+            model=self.agent_model,
             handoff_description="Assistente gestor do supporte.",
             instructions=
                 "Você é o responsável pelas operações no sistema de ISTM do HelpDesk da Apple." \
@@ -84,6 +104,8 @@ class AggregatorAgent:
                 "9. **create_kb_article**: Cria base de conhecimento" \
                 "10. **increment_kb_view_count**: Fazer o incremento das visualizações na base de conhecimento" \
                 "11. **get_ticket_statistics**: Pega as informações sobre as estatisticas dos chamados" \
+                "12. **get_ticket_trends**: Pega a evolução dos chamados por dia ou semana (period='day' ou 'week')" \
+                "13. **search_tickets_page**: Consulta os tickets página a página (use o next_cursor para a próxima página)" \
                 "" \
                 "Regras para uso:" \
                 "- Se precisar de informações técnicas para resolver tickets, " \
@@ -99,7 +121,7 @@ class AggregatorAgent:
         ) 
         self.agentAggregator = Agent(
             name="AggregatorAssistant",
-            model=self.llm_provider.model,
+            model=self.router_model,
             handoffs=[self.agentRagEngineSource, self.agentSearchEngineSource, self.agentCloudEngineSource],
             handoff_description="Orquestrador que direciona e EXECUTA as solicitações.",
             instructions="Você é responsável por analisar e EXECUTAR o handoff correto para cada tipo de pergunta." \
@@ -134,7 +156,7 @@ class AggregatorAgent:
             """Configura todos os agentes"""
             self.agentRagEngineSource = Agent(
                 name="RagEngineAssistant",
-                model=self.llm_provider.model,
+                model=self.agent_model,
                 handoff_description="Assistant for searching local RAG documentation",
                 instructions="You will only answer the user's question. " \
                     "You are an assistant for searching official documentation found in our local databases. " \
@@ -145,7 +167,7 @@ class AggregatorAgent:
             )
             self.agentSearchEngineSource = Agent(
                 name="SearchEngineAssistant",
-                model=self.llm_provider.model,
+                model=self.agent_model,
                 handoff_description="Assistant for searching external sources on the web",
                 instructions="You will only answer the user's question. " \
                     "You are an assistant for performing internet searches that respect the context of the conversation and the user's request. " \
@@ -156,7 +178,7 @@ class AggregatorAgent:
             )
             self.agentCloudEngineSource = Agent(
                 name="CloudEngineAssistant",
-                model=self.llm_provider.model,
+                model=self.agent_model,
                 handoff_description="Assistant Support Manager.",
                 instructions="You will only answer the user's question. "\
                     "You are responsible for operations in the Apple HelpDesk ISTM system. " \
@@ -183,7 +205,7 @@ class AggregatorAgent:
             ) 
             self.agentAggregator = Agent(
                 name="AggregatorAssistant",
-                model=self.llm_provider.model,
+                model=self.router_model,
                 handoffs=[self.agentRagEngineSource, self.agentSearchEngineSource, self.agentCloudEngineSource],
                 instructions="You must understand the user's request and route to specialized agents. " \
                     #"You are responsible for reception and must ask in a friendly and polite manner what the user wants." \
@@ -207,7 +229,7 @@ class AggregatorAgent:
         self.history = []
 
 
-    async def _chat(self, query: str):
+    async def _chat(self, query: str, server=None):
         """Processa a entrada do usuário e executa o chat"""
         # Adiciona a entrada do usuário ao histórico
         self.current_agent = self.agentAggregator
@@ -216,39 +238,176 @@ class AggregatorAgent:
             "role": "user",
             "content": query
         })
-        
+        if self.history_manager is not None:
+            self.history = self.history_manager.compact(self.history)
+
+        if server is not None:
+            return await self._run_agents(server)
+
         # Conecta com o servidor MCP e executa
-        async with MCPServerStdio(params={"command": "mcp", "args": ["run", "mcp_base/server/server_support_apple.py"]}) as server:            
-            # Atribui o servidor MCP aos agentes que precisam
-            self.agentAggregator.mcp_servers = [server]
-            self.agentRagEngineSource.mcp_servers = [server]
-            self.agentSearchEngineSource.mcp_servers = [server] 
-            self.agentCloudEngineSource.mcp_servers = [server]
+        async with self._mcp_server() as server:
+            return await self._run_agents(server)
+
+    async def _run_agents(self, server):
+        self._attach_server(server)
+        try:
+            # Executa o runner
+            result = await Runner.run(
+                starting_agent=self.current_agent, 
+                input=self.history, 
+                context=self.history
+            )
+            
+            # Atualiza o estado
+            self.current_agent = result.last_agent
+            self.history = result.to_input_list()
+            return result
+            
+        except Exception as e:
+            if self.shared_mcp is not None and is_connection_error(e):
+                # Let the shared session reconnect before the next query
+                raise
+            print(f"ERRO no Runner: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def _mcp_server(self, cache_tools_list: bool = False):
+        if self.mcp_url:
+            return create_network_server(self.mcp_url, cache_tools_list=cache_tools_list)
+        # Forward the environment so backend selection (LLM_BACKEND, WEB_SEARCH_BACKEND, ...) reaches the server
+        return MCPServerStdio(params={"command": "mcp", "args": ["run", "mcp_base/server/server_support_apple.py"], "env": dict(os.environ)},
+                              cache_tools_list=cache_tools_list)
+
+    def _attach_server(self, server):
+        """Atribui o servidor MCP aos agentes que precisam"""
+        self.agentAggregator.mcp_servers = [server]
+        self.agentRagEngineSource.mcp_servers = [server]
+        self.agentSearchEngineSource.mcp_servers = [server]
+        self.agentCloudEngineSource.mcp_servers = [server]
+
+    def _generate(self, query: str, memory_context, retrieved_context, plan):
+        """Context enhancement and generation; returns the response and the context it used"""
+        enhanced_context = {
+            "memory_context": memory_context,
+            "retrieved_context": retrieved_context,
+            "reasoning_trace": plan.reasoning_trace,
+            "query": query
+        }
+        context_str = json.dumps(enhanced_context, indent=2)
+        return self.llm_provider.generate(query, context_str), enhanced_context
+
+    def _remember(self, query: str, response: str, enhanced_context):
+        self.memory.add_short_term(f"query_{len(self.memory.short_term)}", {
+            "query": query,
+            "response": response,
+            "context": enhanced_context
+        })
+
+    async def _process_isolated(self, index: int, query: str, remember: bool) -> BatchResult:
+        """One batch query as its own conversation, on the batch's shared MCP session"""
+        start = time.perf_counter()
+        result = BatchResult(index=index, query=query)
+        # Queued behind interactive queries; the task has its own context, so this stays within it
+        set_priority(BATCH)
+        try:
+            # Planning and generation are blocking calls; keep them off the loop
+            memory_context = self.memory.get_relevant_context(query)
+            plan = await asyncio.to_thread(self.planning_engine.create_plan, query, memory_context)
+            phase_start = time.perf_counter()
+            result.timings["planning"] = phase_start - start
+
+            history = [{"role": "user", "content": query}]
+            run = await Runner.run(starting_agent=self.agentAggregator, input=history, context=history)
+            retrieved_context = {"local": {"source": run.last_agent.name, "results": run.final_output}}
+            plan.data_sources = run.last_agent.name
+            result.source = run.last_agent.name
+            now = time.perf_counter()
+            result.timings["fetching"], phase_start = now - phase_start, now
+
+            result.response, enhanced_context = await asyncio.to_thread(
+                self._generate, query, memory_context, retrieved_context, plan)
+            now = time.perf_counter()
+            result.timings["generation"], phase_start = now - phase_start, now
+
+            if remember:
+                self._remember(query, result.response, enhanced_context)
+                result.timings["memory_update"] = time.perf_counter() - phase_start
+        except Exception as e:
+            print(f"ERRO na query {index}: {e}")
+            result.error = str(e)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    async def process_batch(self, queries: Iterable[str], concurrency: int = 4,
+                            remember: bool = False) -> AsyncIterator[BatchResult]:
+        """
+        Run independent queries through the pipeline, at most `concurrency` at a time
+        Args:
+            queries: Query strings; consumed lazily, so it can be a generator over a large queue
+            concurrency: Maximum number of queries in flight
+            remember: Add each answer to short-term memory (off by default: batch items are unrelated)
+        Yields:
+            A BatchResult per query as soon as it completes (not in input order)
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        # One MCP server process and session for the whole batch, with its tool list fetched once
+        async with self._mcp_server(cache_tools_list=True) as server:
+            self._attach_server(server)
+            pending = set()
+            source = enumerate(queries)
+
+            def submit() -> bool:
+                item = next(source, None)
+                if item is None:
+                    return False
+                pending.add(asyncio.create_task(self._process_isolated(item[0], item[1], remember)))
+                return True
 
             try:
-                # Executa o runner
-                result = await Runner.run(
-                    starting_agent=self.current_agent, 
-                    input=self.history, 
-                    context=self.history
-                )
-                
-                # Atualiza o estado
-                self.current_agent = result.last_agent
-                self.history = result.to_input_list()
-                return result
-                
-            except Exception as e:
-                print(f"ERRO no Runner: {e}")
-                import traceback
-                traceback.print_exc()
-                return None
+                while len(pending) < concurrency and submit():
+                    pass
+                while pending:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        pending.discard(task)
+                        submit()
+                        yield task.result()
+            finally:
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+
+    def _record_phase(self, phase: str, start: float) -> float:
+        """Store the elapsed time of a phase and return the start of the next one"""
+        now = time.perf_counter()
+        self.last_timings[phase] = now - start
+        return now
 
     def process_query(self, query: str) -> str:
         print(f"📥 Processing query: {query}")
         
         if self._flag_queries_loop:
             self.reset_conversation()
+
+        # Per-phase wall-clock seconds of this query, read by the benchmarks
+        self.last_timings = {}
+        phase_start = time.perf_counter()
+
+        if self.commands is not None:
+            handled = self.commands.try_handle(query)
+            if handled is not None:
+                print(f"⚡ Fast path: {handled['intent']} via {handled['tool']}")
+                response = handled["response"]
+                # Keep the transcript whole so follow-ups on the agent path see this exchange
+                self.history += [{"role": "user", "content": query}, {"role": "assistant", "content": response}]
+                self._remember(query, response, {"fast_path": {k: handled[k] for k in ("intent", "tool", "arguments")}})
+                self._record_phase("fast_path", phase_start)
+                print("✅ Process complete!")
+                return response
         
         # Step 1: Planning Phase
         print("🧠 Planning Phase...")
@@ -257,40 +416,34 @@ class AggregatorAgent:
         plan = self.planning_engine.create_plan(query, memory_context)
         
         print(f"   Plan created with {len(plan.steps)} steps")
+        phase_start = self._record_phase("planning", phase_start)
         
         # Step 2: Information Retrieval Phase
         print("🔍 Fetching Phase...")
         retrieved_context = {}
         
-        source_data = asyncio.run(self._chat(query=query))
+        if self.shared_mcp is not None:
+            source_data = self.shared_mcp.run(lambda server: self._chat(query, server))
+        else:
+            source_data = asyncio.run(self._chat(query=query))
         retrieved_context["local"] = { 
             "source" : self.current_agent.name,
             "results": source_data.final_output 
         }
         plan.data_sources=retrieved_context["local"]["source"]
         print(f"   Data sources: {plan.data_sources}")
+        phase_start = self._record_phase("fetching", phase_start)
         
-        # Step 3: Context Enhancement
+        # Steps 3 and 4: Context Enhancement and Generation Phase
         print("🔧 Context Enhancement...")
-        enhanced_context = {
-            "memory_context": memory_context,
-            "retrieved_context": retrieved_context,
-            "reasoning_trace": plan.reasoning_trace,
-            "query": query
-        }
-        
-        # Step 4: Generation Phase
         print("✨ Generation Phase...")
-        context_str = json.dumps(enhanced_context, indent=2)
-        response = self.llm_provider.generate(query, context_str)
+        response, enhanced_context = self._generate(query, memory_context, retrieved_context, plan)
+        phase_start = self._record_phase("generation", phase_start)
         
         # Step 5: Memory Update
         print("💾 Memory Update...")
-        self.memory.add_short_term(f"query_{len(self.memory.short_term)}", {
-            "query": query,
-            "response": response,
-            "context": enhanced_context
-        })
+        self._remember(query, response, enhanced_context)
+        self._record_phase("memory_update", phase_start)
         
         print("✅ Process complete!")
 
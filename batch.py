@@ -0,0 +1,93 @@
+import asyncio
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one query of a batch; `index` is its position in the input"""
+    index: int
+    query: str
+    response: Optional[str] = None
+    source: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchProgress:
+    """Running totals of a batch, updated as results complete"""
+    completed: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def update(self, result: BatchResult):
+        self.completed += 1
+        if not result.ok:
+            self.failed += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Completed queries per second"""
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed else 0.0
+
+    def describe(self) -> str:
+        return (f"{self.completed} done ({self.failed} failed) in {self.elapsed:.1f}s, "
+                f"{self.throughput:.2f} queries/s")
+
+
+def iterate_in_thread(make_iterator: Callable[[], AsyncIterator[Any]]) -> Iterator[Any]:
+    """
+    Consume an async iterator from synchronous code: it runs on its own event
+    loop in a background thread and items are handed over as they are produced
+    """
+    # Unbounded, so a slow consumer never blocks the loop (and the in-flight
+    # queries with it); results are small compared to the work behind them
+    items: "queue.Queue" = queue.Queue()
+    done = object()
+    stop = threading.Event()
+
+    async def pump():
+        iterator = make_iterator()
+        try:
+            async for item in iterator:
+                items.put(item)
+                if stop.is_set():
+                    break
+        finally:
+            await iterator.aclose()
+
+    def run():
+        try:
+            asyncio.run(pump())
+            items.put((done, None))
+        except BaseException as e:
+            items.put((done, e))
+
+    thread = threading.Thread(target=run, name="batch-loop", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if isinstance(item, tuple) and len(item) == 2 and item[0] is done:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+    finally:
+        # Consumer stopped early: the loop cancels the in-flight queries at the next result
+        stop.set()
+        thread.join()
@@ -0,0 +1,253 @@
+"""
+End-to-end benchmark for AgenticRAGSystem.query
+
+Replays a query corpus (troubleshooting, web, ticket operations) through the
+full pipeline and reports per-phase latency percentiles, throughput at each
+concurrency level and memory growth over a long conversation. By default the
+LLM, agent model, embeddings and web search run on their offline stand-ins
+and the helpdesk database is a throwaway copy, so runs are repeatable.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_agentic_rag --concurrency 1,4 --turns 50
+    python -m benchmarks.bench_agentic_rag --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.common import check_baseline, rss_kb, run_metadata, summarize, write_results
+from cascade import cascade_stats
+from scheduler import get_scheduler
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "corpus", "agentic_rag_queries.json")
+OFFLINE_ENV = {
+    "LLM_BACKEND": "fake",
+    "EMBEDDINGS_BACKEND": "fake",
+    "WEB_SEARCH_BACKEND": "fixture",
+}
+PHASES = ("planning", "fetching", "generation", "memory_update")
+
+
+def load_corpus(path: str) -> List[Dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prepare_environment(live: bool) -> str:
+    """Select the offline stand-ins and point the MCP server at a copy of the helpdesk DB"""
+    if not live:
+        for key, value in OFFLINE_ENV.items():
+            os.environ.setdefault(key, value)
+
+    db_copy = os.path.join(tempfile.mkdtemp(prefix="bench_helpdesk_"), "apple_helpdesk.db")
+    shutil.copy("mcp_base/server/apple_helpdesk.db", db_copy)
+    os.environ["HELPDESK_DB_PATH"] = db_copy
+
+    # The fake embeddings need their own index; build it once from the PDFs
+    from rag.load import get_persist_directory, load_vectordb
+    if not os.path.isdir(get_persist_directory()):
+        print(f"Building vector index in {get_persist_directory()}...")
+        load_vectordb()
+
+    return db_copy
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool):
+    if enabled:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    else:
+        yield
+
+
+def measure_latency(corpus: List[Dict[str, str]], repeat: int) -> Dict[str, Any]:
+    """Sequential replay of the corpus; per-phase and per-category latency"""
+    from agenticRagSystem import AgenticRAGSystem
+
+    system = AgenticRAGSystem(True)
+    phases: Dict[str, List[float]] = {phase: [] for phase in PHASES + ("total",)}
+    by_category: Dict[str, List[float]] = {}
+    errors = 0
+
+    for _ in range(repeat):
+        for item in corpus:
+            start = time.perf_counter()
+            try:
+                system.query(item["query"])
+            except Exception as e:
+                errors += 1
+                print(f"Query failed: {item['query']}: {e}", file=sys.stderr)
+                continue
+            elapsed = time.perf_counter() - start
+
+            phases["total"].append(elapsed)
+            by_category.setdefault(item["category"], []).append(elapsed)
+            for phase in PHASES:
+                phases[phase].append(system.aggregator.last_timings.get(phase, 0.0))
+
+    return {
+        "phases": {phase: summarize(samples) for phase, samples in phases.items()},
+        "by_category": {category: summarize(samples) for category, samples in by_category.items()},
+        "errors": errors,
+    }
+
+
+def measure_throughput(corpus: List[Dict[str, str]], concurrency: int, queries: int) -> Dict[str, Any]:
+    """Run `queries` queries over `concurrency` threads, one system per thread"""
+    from agenticRagSystem import AgenticRAGSystem
+
+    local = threading.local()
+
+    def run(index: int) -> float:
+        if not hasattr(local, "system"):
+            local.system = AgenticRAGSystem(True)
+        start = time.perf_counter()
+        local.system.query(corpus[index % len(corpus)]["query"])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(run, range(queries)))
+    seconds = time.perf_counter() - start
+
+    return {
+        "name": f"concurrency_{concurrency}",
+        "concurrency": concurrency,
+        "queries": queries,
+        "seconds": round(seconds, 3),
+        "qps": round(queries / seconds, 3) if seconds else 0.0,
+        "latency": summarize(latencies),
+    }
+
+
+def measure_batch(corpus: List[Dict[str, str]], concurrency: int, queries: int) -> Dict[str, Any]:
+    """Run `queries` queries through query_batch on one system and one shared MCP session"""
+    from agenticRagSystem import AgenticRAGSystem
+
+    system = AgenticRAGSystem(True)
+    start = time.perf_counter()
+    results = list(system.query_batch((corpus[index % len(corpus)]["query"] for index in range(queries)),
+                                      concurrency=concurrency, report_every=0))
+    seconds = time.perf_counter() - start
+
+    return {
+        "name": f"batch_{concurrency}",
+        "concurrency": concurrency,
+        "queries": queries,
+        "errors": sum(1 for result in results if not result.ok),
+        "seconds": round(seconds, 3),
+        "qps": round(queries / seconds, 3) if seconds else 0.0,
+        "latency": summarize([result.seconds for result in results]),
+    }
+
+
+def history_tokens(aggregator) -> int:
+    if aggregator.history_manager is not None:
+        return aggregator.history_manager.last_stats.get("tokens_after", 0)
+    from history import estimate_tokens
+    return estimate_tokens(aggregator.history)
+
+
+def measure_memory(corpus: List[Dict[str, str]], turns: int) -> Dict[str, Any]:
+    """One conversation of `turns` queries without history reset; Python heap and RSS per turn"""
+    from agenticRagSystem import AgenticRAGSystem
+
+    system = AgenticRAGSystem(False)
+    tracemalloc.start()
+    heap_start = tracemalloc.get_traced_memory()[0]
+    rss_start = rss_kb()
+    per_turn = []
+
+    for turn in range(turns):
+        system.query(corpus[turn % len(corpus)]["query"])
+        per_turn.append({
+            "turn": turn + 1,
+            "heap_kb": round(tracemalloc.get_traced_memory()[0] / 1024, 1),
+            "history_items": len(system.aggregator.history),
+            # Estimated tokens of the history sent to Runner.run this turn
+            "input_tokens": history_tokens(system.aggregator),
+        })
+
+    heap_end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return {
+        "turns": turns,
+        "heap_start_kb": round(heap_start / 1024, 1),
+        "heap_end_kb": round(heap_end / 1024, 1),
+        "growth_per_turn_kb": round((heap_end - heap_start) / 1024 / max(turns, 1), 3),
+        "rss_kb": rss_kb(),
+        "rss_start_kb": rss_start,
+        "per_turn": per_turn,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark for AgenticRAGSystem")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {category, query}")
+    parser.add_argument("--repeat", type=int, default=1, help="Corpus replays for the latency run")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per throughput run")
+    parser.add_argument("--turns", type=int, default=30, help="Turns for the memory-growth run")
+    parser.add_argument("--live", action="store_true", help="Use the real LLM, embeddings and Tavily")
+    parser.add_argument("--output", default="benchmarks/results/agentic_rag.json")
+    parser.add_argument("--baseline", help="Previous result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative regression threshold")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's console output")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",") if level]
+    db_copy = prepare_environment(args.live)
+
+    with quiet(not args.verbose):
+        latency = measure_latency(corpus, args.repeat)
+        throughput = [measure_throughput(corpus, level, args.queries) for level in concurrency_levels]
+        throughput += [measure_batch(corpus, level, args.queries) for level in concurrency_levels]
+        memory = measure_memory(corpus, args.turns)
+
+    results = {
+        "benchmark": "agentic_rag",
+        "metadata": run_metadata({
+            "corpus": args.corpus,
+            "corpus_size": len(corpus),
+            "repeat": args.repeat,
+            "live": args.live,
+            "backends": {key: os.getenv(key) for key in OFFLINE_ENV},
+        }),
+        "latency": latency,
+        "throughput": throughput,
+        "memory": memory,
+    }
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        # Queue depth, wait times and throttling under the configured LLM_* limits
+        results["llm_scheduler"] = scheduler.stats()
+    cascade = cascade_stats.stats()
+    if cascade["generations"]:
+        # Escalation rate and generation latency per tier (LLM_MODEL_FAST / LLM_MODEL_STRONG)
+        results["model_cascade"] = cascade
+    write_results(results, args.output)
+    shutil.rmtree(os.path.dirname(db_copy), ignore_errors=True)
+
+    print(json.dumps({"latency": latency["phases"]["total"], "throughput": [
+        {"name": run["name"], "qps": run["qps"]} for run in throughput
+    ]}, indent=2))
+
+    if args.baseline:
+        sys.exit(check_baseline(results, args.baseline, args.threshold))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Micro-benchmarks for the helpdesk database hot paths
+
+Times every AppleHelpDeskDB read and write method per query shape (filter
+combination, hot vs cold key, first vs deep page) against a synthetic
+database, then the same shapes through the MCP tool layer, sequentially and
+under concurrent load, and concurrent write throughput through the async
+layer with per-write commits, group commits and buffered view counts. The synthetic database is generated once per size by
+benchmarks.helpdesk_data and reused on later runs.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_helpdesk_db --tickets 1000000
+    python -m benchmarks.bench_helpdesk_db --baseline benchmarks/results/helpdesk_db_baseline.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.common import check_baseline, run_metadata, summarize, write_results
+from benchmarks.helpdesk_data import HelpDeskDataGenerator
+from mcp_base.server.apple_helpdesk_manager import AppleHelpDeskDB
+
+READ_SHAPES = "read"
+WRITE_SHAPES = "write"
+
+
+def query_shapes(keys: Dict[str, Any]) -> List[Tuple[str, str, str, Dict[str, Any]]]:
+    """(name, kind, method, kwargs) for every benchmarked call; `keys` holds data-dependent values"""
+    return [
+        ("search_tickets.no_filter", READ_SHAPES, "search_tickets", {}),
+        ("search_tickets.status", READ_SHAPES, "search_tickets", {"status": "Open"}),
+        ("search_tickets.status_priority", READ_SHAPES, "search_tickets", {"status": "Open", "priority": "Critical"}),
+        ("search_tickets.agent_hot", READ_SHAPES, "search_tickets", {"agent_id": keys["hot_agent"]}),
+        ("search_tickets.agent_cold", READ_SHAPES, "search_tickets", {"agent_id": keys["cold_agent"]}),
+        ("search_tickets.customer_email_exact", READ_SHAPES, "search_tickets",
+         {"customer_email": keys["hot_customer_email"]}),
+        ("search_tickets.customer_email_partial", READ_SHAPES, "search_tickets",
+         {"customer_email": keys["hot_customer_email"].split("@")[0]}),
+        ("search_tickets.category", READ_SHAPES, "search_tickets", {"category": keys["hot_category"]}),
+        ("search_tickets.product_line", READ_SHAPES, "search_tickets", {"product_line": keys["hot_product_line"]}),
+        ("search_tickets.narrow_columns", READ_SHAPES, "search_tickets",
+         {"status": "Closed", "columns": ["id", "ticket_number", "status", "priority"]}),
+        ("search_tickets_page.first_page", READ_SHAPES, "search_tickets_page", {"status": "Closed", "page_size": 50}),
+        ("search_tickets_page.deep_page", READ_SHAPES, "search_tickets_page",
+         {"status": "Closed", "page_size": 50, "cursor": keys["deep_cursor"]}),
+        ("search_knowledge_base.common_term", READ_SHAPES, "search_knowledge_base", {"search_term": "battery"}),
+        ("search_knowledge_base.no_match", READ_SHAPES, "search_knowledge_base", {"search_term": "no-such-term"}),
+        ("search_knowledge_base.with_category", READ_SHAPES, "search_knowledge_base",
+         {"search_term": "battery", "category_id": keys["hot_category_id"]}),
+        ("get_customer_by_email.hit", READ_SHAPES, "get_customer_by_email", {"email": keys["hot_customer_email"]}),
+        ("get_customer_by_email.miss", READ_SHAPES, "get_customer_by_email", {"email": "nobody@example.com"}),
+        ("get_agent_workload.hot", READ_SHAPES, "get_agent_workload", {"agent_id": keys["hot_agent"]}),
+        ("get_agent_workload.cold", READ_SHAPES, "get_agent_workload", {"agent_id": keys["cold_agent"]}),
+        ("get_ticket_statistics", READ_SHAPES, "get_ticket_statistics", {}),
+        ("get_ticket_trends.day", READ_SHAPES, "get_ticket_trends", {"period": "day"}),
+        ("get_ticket_trends.week", READ_SHAPES, "get_ticket_trends", {"period": "week"}),
+        ("create_ticket", WRITE_SHAPES, "create_ticket",
+         {"customer_id": keys["cold_customer"], "category_id": keys["hot_category_id"],
+          "subject": "Benchmark ticket", "description": "Created by bench_helpdesk_db"}),
+        ("update_ticket_status", WRITE_SHAPES, "update_ticket_status",
+         {"ticket_id": keys["recent_ticket"], "status": "In Progress", "agent_id": keys["hot_agent"]}),
+        ("add_ticket_comment", WRITE_SHAPES, "add_ticket_comment",
+         {"ticket_id": keys["recent_ticket"], "content": "Benchmark comment"}),
+        ("increment_kb_view_count", WRITE_SHAPES, "increment_kb_view_count", {"article_id": keys["kb_article"]}),
+    ]
+
+
+def discover_keys(db: AppleHelpDeskDB) -> Dict[str, Any]:
+    """Pick hot and cold keys from the generated data so shapes hit the skew"""
+    conn = db.conn
+
+    def scalar(query: str):
+        return conn.execute(query).fetchone()[0]
+
+    hot_customer = scalar("SELECT customer_id FROM tickets GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1")
+    hot_category_id = scalar("SELECT category_id FROM tickets GROUP BY category_id ORDER BY COUNT(*) DESC LIMIT 1")
+    keys = {
+        "hot_agent": scalar("SELECT agent_id FROM tickets WHERE agent_id IS NOT NULL "
+                            "GROUP BY agent_id ORDER BY COUNT(*) DESC LIMIT 1"),
+        "cold_agent": scalar("SELECT agent_id FROM tickets WHERE agent_id IS NOT NULL "
+                             "GROUP BY agent_id ORDER BY COUNT(*) ASC LIMIT 1"),
+        "hot_customer_email": scalar(f"SELECT email FROM customers WHERE id = {int(hot_customer)}"),
+        "cold_customer": scalar("SELECT MAX(id) FROM customers"),
+        "hot_category_id": hot_category_id,
+        "hot_category": scalar(f"SELECT name FROM categories WHERE id = {int(hot_category_id)}"),
+        "hot_product_line": scalar("SELECT p.product_line FROM tickets t JOIN products p ON t.product_id = p.id "
+                                   "GROUP BY p.product_line ORDER BY COUNT(*) DESC LIMIT 1"),
+        "recent_ticket": scalar("SELECT MAX(id) FROM tickets"),
+        "kb_article": scalar("SELECT id FROM knowledge_base ORDER BY view_count DESC LIMIT 1"),
+    }
+
+    # Cursor 100 pages deep into the closed tickets
+    page = {"next_cursor": None}
+    for _ in range(100):
+        page = db.search_tickets_page(page_size=50, cursor=page["next_cursor"], columns=["id"], status="Closed")
+        if page["next_cursor"] is None:
+            break
+    keys["deep_cursor"] = page["next_cursor"]
+    return keys
+
+
+def count_rows(result: Any) -> int:
+    if isinstance(result, dict) and "tickets" in result:
+        return len(result["tickets"])
+    if isinstance(result, list):
+        return len(result)
+    return 1 if result else 0
+
+
+def time_calls(call: Callable[[], Any], iterations: int, warmup: int) -> Tuple[List[float], Any]:
+    result = None
+    for _ in range(warmup):
+        result = call()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = call()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def bench_methods(db: AppleHelpDeskDB, shapes, iterations: int, warmup: int) -> List[Dict[str, Any]]:
+    """Direct AppleHelpDeskDB calls, one summary per shape"""
+    results = []
+    for name, kind, method, kwargs in shapes:
+        samples, result = time_calls(lambda: getattr(db, method)(**kwargs), iterations, warmup)
+        results.append({"name": name, "kind": kind, "rows": count_rows(result), "latency": summarize(samples)})
+
+    # Streaming a large result set page by page
+    samples, rows = [], 0
+    for _ in range(max(1, iterations // 5)):
+        start = time.perf_counter()
+        rows = sum(1 for _ in itertools.islice(db.iter_tickets(batch_size=500, status="Closed"), 10_000))
+        samples.append(time.perf_counter() - start)
+    results.append({"name": "iter_tickets.stream_10k", "kind": READ_SHAPES, "rows": rows, "latency": summarize(samples)})
+    return results
+
+
+def load_tools(db_path: str) -> Tuple[str, Any]:
+    """
+    The MCP server's tool coroutines, or the async access layer they wrap when
+    the server's own dependencies (mcp, rag) are not installed
+    """
+    os.environ["HELPDESK_DB_PATH"] = db_path
+    try:
+        from mcp_base.server import server_support_apple
+        return "mcp_tools", server_support_apple
+    except ImportError as e:
+        print(f"MCP server not importable ({e}); timing the async access layer the tools call")
+        from mcp_base.server.async_helpdesk_db import AsyncAppleHelpDeskDB
+        return "async_db", AsyncAppleHelpDeskDB(db_path)
+
+
+async def bench_tools(tools: Any, shapes, iterations: int, warmup: int, concurrency: int) -> Dict[str, Any]:
+    """Read shapes through the tool layer, sequentially and `concurrency` calls at a time"""
+    read_shapes = [shape for shape in shapes if shape[1] == READ_SHAPES]
+
+    sequential = []
+    for name, _, method, kwargs in read_shapes:
+        for _ in range(warmup):
+            await getattr(tools, method)(**kwargs)
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await getattr(tools, method)(**kwargs)
+            samples.append(time.perf_counter() - start)
+        sequential.append({"name": name, "latency": summarize(samples)})
+
+    # Mixed read load: every shape `iterations` times, `concurrency` in flight
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run(method: str, kwargs: Dict[str, Any]):
+        async with semaphore:
+            start = time.perf_counter()
+            await getattr(tools, method)(**kwargs)
+            latencies.append(time.perf_counter() - start)
+
+    calls = [(method, kwargs) for _ in range(iterations) for _, _, method, kwargs in read_shapes]
+    start = time.perf_counter()
+    await asyncio.gather(*(run(method, kwargs) for method, kwargs in calls))
+    seconds = time.perf_counter() - start
+
+    return {
+        "sequential": sequential,
+        "concurrent": {
+            "concurrency": concurrency,
+            "calls": len(calls),
+            "seconds": round(seconds, 3),
+            "qps": round(len(calls) / seconds, 3) if seconds else 0.0,
+            "latency": summarize(latencies),
+        },
+    }
+
+
+WRITE_MODES = {
+    "per_write_commit": {"max_group_size": 1, "view_flush_interval": 0},
+    "group_commit": {"max_group_size": 256, "view_flush_interval": 0},
+    "group_commit_buffered_views": {"max_group_size": 256, "view_flush_interval": 1.0},
+}
+
+
+async def bench_write_mode(db_path: str, keys: Dict[str, Any], options: Dict[str, Any], writes: int,
+                           concurrency: int, synchronous: str) -> Dict[str, Any]:
+    """`writes` mixed writes (mostly view counts, as in production) with `concurrency` in flight"""
+    from mcp_base.server.async_helpdesk_db import AsyncAppleHelpDeskDB
+
+    db = AsyncAppleHelpDeskDB(db_path, synchronous=synchronous, **options)
+    rng = random.Random(7)
+    calls = []
+    for _ in range(writes):
+        roll = rng.random()
+        if roll < 0.7:
+            calls.append(("increment_kb_view_count", {"article_id": keys["kb_article"]}))
+        elif roll < 0.9:
+            calls.append(("add_ticket_comment", {"ticket_id": keys["recent_ticket"], "content": "Benchmark comment"}))
+        else:
+            calls.append(("update_ticket_status", {"ticket_id": keys["recent_ticket"], "status": "In Progress",
+                                                    "agent_id": keys["hot_agent"]}))
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run(method: str, kwargs: Dict[str, Any]):
+        async with semaphore:
+            start = time.perf_counter()
+            await getattr(db, method)(**kwargs)
+            latencies.append(time.perf_counter() - start)
+
+    await db.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(run(method, kwargs) for method, kwargs in calls))
+    seconds = time.perf_counter() - start
+    # Buffered views are only durable after the final flush, so it counts
+    db.close()
+    total = time.perf_counter() - start
+    stats = db.write_stats()
+    return {
+        "writes": writes,
+        "seconds": round(total, 3),
+        "writes_per_second": round(writes / total, 1) if total else 0.0,
+        "acknowledged_seconds": round(seconds, 3),
+        "commits": stats["commits"],
+        "avg_group_size": round(stats["avg_group_size"], 2),
+        "avg_commit_ms": round(stats["avg_commit_ms"], 3),
+        "latency": summarize(latencies),
+    }
+
+
+def bench_writes(db_path: str, keys: Dict[str, Any], writes: int, concurrency: int,
+                 synchronous: str) -> Dict[str, Any]:
+    """Every write mode against its own copy of the database"""
+    results = {"concurrency": concurrency, "synchronous": synchronous, "modes": {}}
+    for name, options in WRITE_MODES.items():
+        copy_path = f"{db_path}.writes.db"
+        shutil.copyfile(db_path, copy_path)
+        try:
+            results["modes"][name] = asyncio.run(bench_write_mode(copy_path, keys, options, writes, concurrency,
+                                                                  synchronous))
+        finally:
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(copy_path + suffix)
+    return results
+
+
+def print_table(rows: List[Dict[str, Any]], title: str):
+    print(f"\n{title}")
+    print(f"  {'shape':<42} {'rows':>6} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for row in rows:
+        latency = row["latency"]
+        print(f"  {row['name']:<42} {row.get('rows', ''):>6} {latency['p50']:>10.3f} "
+              f"{latency['p95']:>10.3f} {latency['max']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the helpdesk database hot paths")
+    parser.add_argument("--db", help="Synthetic database path (default benchmarks/data/helpdesk_<tickets>.db)")
+    parser.add_argument("--tickets", type=int, default=200_000, help="Tickets in the generated database")
+    parser.add_argument("--kb-articles", type=int, default=5_000, help="Knowledge base articles in the generated database")
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the synthetic database")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed calls per shape")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls per shape")
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight tool calls for the concurrent run")
+    parser.add_argument("--skip-writes", action="store_true", help="Leave the synthetic database untouched")
+    parser.add_argument("--skip-tools", action="store_true", help="Only time the AppleHelpDeskDB methods")
+    parser.add_argument("--writes", type=int, default=2000, help="Writes per mode in the write throughput run")
+    parser.add_argument("--write-concurrency", type=int, default=32, help="In-flight writes in the write throughput run")
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous for the write throughput run")
+    parser.add_argument("--output", default="benchmarks/results/helpdesk_db.json")
+    parser.add_argument("--baseline", help="Previous result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Relative regression threshold")
+    parser.add_argument("--min-delta", type=float, default=0.5, help="Ignore changes smaller than this many ms")
+    args = parser.parse_args()
+
+    db_path = args.db or f"benchmarks/data/helpdesk_{args.tickets}.db"
+    if args.regenerate or not os.path.exists(db_path):
+        print(f"Generating {db_path} ({args.tickets} tickets)...")
+        HelpDeskDataGenerator(tickets=args.tickets, kb_articles=args.kb_articles).generate(db_path)
+
+    db = AppleHelpDeskDB(db_path)
+    keys = discover_keys(db)
+    shapes = [shape for shape in query_shapes(keys) if not (args.skip_writes and shape[1] == WRITE_SHAPES)]
+    table_sizes = {
+        table: db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("tickets", "ticket_comments", "customers", "agents", "knowledge_base")
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        methods = bench_methods(db, shapes, args.iterations, args.warmup)
+    db.close()
+
+    tools = None
+    tool_layer = None
+    if not args.skip_tools:
+        tool_layer, module = load_tools(db_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            tools = asyncio.run(bench_tools(module, shapes, args.iterations, args.warmup, args.concurrency))
+        if tool_layer == "async_db":
+            module.close()
+
+    writes = None
+    if not args.skip_writes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            writes = bench_writes(db_path, keys, args.writes, args.write_concurrency, args.synchronous.upper())
+
+    results = {
+        "benchmark": "helpdesk_db",
+        "metadata": run_metadata({
+            "db": db_path,
+            "table_sizes": table_sizes,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "tool_layer": tool_layer,
+        }),
+        "methods": methods,
+        "tools": tools,
+        "writes": writes,
+    }
+    write_results(results, args.output)
+
+    print(json.dumps(table_sizes))
+    print_table(methods, "AppleHelpDeskDB methods")
+    if tools:
+        print_table(tools["sequential"], f"Tool layer ({tool_layer})")
+        concurrent = tools["concurrent"]
+        print(f"\n  concurrent: {concurrent['calls']} calls x{concurrent['concurrency']} -> "
+              f"{concurrent['qps']} calls/s, p95 {concurrent['latency']['p95']} ms")
+    if writes:
+        print(f"\nWrite throughput ({args.writes} writes x{writes['concurrency']}, synchronous={writes['synchronous']})")
+        print(f"  {'mode':<30} {'writes/s':>10} {'commits':>8} {'group':>7} {'p50 ms':>10} {'p95 ms':>10}")
+        for name, mode in writes["modes"].items():
+            print(f"  {name:<30} {mode['writes_per_second']:>10} {mode['commits']:>8} {mode['avg_group_size']:>7} "
+                  f"{mode['latency']['p50']:>10.3f} {mode['latency']['p95']:>10.3f}")
+
+    if args.baseline:
+        sys.exit(check_baseline(results, args.baseline, args.threshold, args.min_delta))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark for pre-fork multi-process serving
+
+Runs the same query load twice with the same number of workers: as threads
+in one process (one AgenticRAGSystem each), and as PreforkPool worker
+processes forked from a preloaded master. Reports aggregate throughput and
+latency of both, and the memory of every worker (RSS, PSS and private) next
+to the single process's, to show how much of the preloaded state the forked
+workers share.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_prefork --workers 4 --queries 40
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.bench_agentic_rag import DEFAULT_CORPUS, load_corpus, prepare_environment, quiet
+from benchmarks.bench_shared_server import run_load
+from benchmarks.common import check_baseline, run_metadata, summarize, write_results
+from prefork import PreforkPool, memory_kb
+
+
+def run_prefork(corpus: List[Dict[str, str]], workers: int, queries: int, mcp_server: bool) -> Dict[str, Any]:
+    """`queries` queries over `workers` forked processes"""
+    with PreforkPool(workers, mcp_server=mcp_server) as pool:
+        results = list(pool.map(corpus[index % len(corpus)]["query"] for index in range(queries)))
+        # Measured while the workers are alive, before close() replaces it with their final numbers
+        live = pool.stats()
+    stats = pool.stats()
+    return {
+        "workers": workers,
+        "queries": queries,
+        "errors": stats["errors"],
+        "seconds": stats["seconds"],
+        "qps": stats["qps"],
+        "latency": summarize([result.seconds for result in results]),
+        "preload_seconds": stats["preload_seconds"].get("total", 0.0),
+        "mcp_server": stats["mcp_server_url"] is not None,
+        "master_memory_kb": live["master_memory_kb"],
+        "total_pss_kb": stats["total_pss_kb"],
+        "per_worker": [{"worker": row["worker"], "queries": row["queries"], "errors": row["errors"],
+                        "memory_kb": row["memory_kb"]} for row in stats["workers"]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark for pre-fork multi-process serving")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {category, query}")
+    parser.add_argument("--workers", type=int, default=4, help="Worker threads / processes")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per mode")
+    parser.add_argument("--no-mcp-server", action="store_true", help="Prefork workers start a stdio server per query")
+    parser.add_argument("--live", action="store_true", help="Use the real LLM, embeddings and Tavily")
+    parser.add_argument("--output", default="benchmarks/results/prefork.json")
+    parser.add_argument("--baseline", help="Previous result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative regression threshold")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's console output")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    db_copy = prepare_environment(args.live)
+    try:
+        # Prefork first: the threaded run leaves clients and threads behind that the master must not fork
+        with quiet(not args.verbose):
+            prefork = run_prefork(corpus, args.workers, args.queries, not args.no_mcp_server)
+            threads = run_load(corpus, args.workers, args.queries)
+        threads["memory_kb"] = memory_kb()
+    finally:
+        shutil.rmtree(os.path.dirname(db_copy), ignore_errors=True)
+
+    results = {
+        "benchmark": "prefork",
+        "metadata": run_metadata({
+            "corpus": args.corpus,
+            "workers": args.workers,
+            "queries": args.queries,
+            "live": args.live,
+            "cpu_count": os.cpu_count(),
+        }),
+        "modes": [{"name": "threads", **threads}, {"name": "prefork", **prefork}],
+    }
+    write_results(results, args.output)
+
+    print(f"  threads  {threads['qps']:.2f} queries/s  p50 {threads['latency']['p50']:.1f} ms  "
+          f"errors {threads['errors']}  rss {threads['memory_kb']['rss']} KiB")
+    print(f"  prefork  {prefork['qps']:.2f} queries/s  p50 {prefork['latency']['p50']:.1f} ms  "
+          f"errors {prefork['errors']}  pss {prefork['total_pss_kb']} KiB over {args.workers} workers")
+    for row in prefork["per_worker"]:
+        memory = row["memory_kb"]
+        print(f"    worker {row['worker']}: {row['queries']} queries  rss {memory['rss']}  pss {memory['pss']}  "
+              f"private {memory['private']} KiB")
+    print(json.dumps({mode["name"]: mode["qps"] for mode in results["modes"]}))
+
+    if args.baseline:
+        sys.exit(check_baseline(results, args.baseline, args.threshold))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Retrieval quality versus latency benchmark for the Chroma RAG path
+
+Runs a labeled question set against the PDF index with each retrieval
+strategy and reports recall@k, MRR and latency percentiles, then names the
+fastest strategy that meets the quality bar. A retrieved chunk counts as
+relevant when it contains one of the question's expected phrases (compared
+on lowercase alphanumerics, so PDF spacing and punctuation do not matter).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_retrieval
+    python -m benchmarks.bench_retrieval --strategies "similarity:k=5;hybrid:k=5,fetch_k=30" --min-recall 0.8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import check_baseline, run_metadata, summarize, write_results
+
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(__file__), "corpus", "retrieval_questions.json")
+DEFAULT_STRATEGIES = ";".join([
+    "similarity:k=5",
+    "mmr:k=5,fetch_k=10",
+    "mmr:k=5,fetch_k=20",
+    "mmr:k=5,fetch_k=40",
+    "hybrid:k=5,fetch_k=20",
+    "reranked:k=5,fetch_k=20",
+    "reranked:k=3,fetch_k=30",
+])
+OFFLINE_ENV = {
+    "LLM_BACKEND": "fake",
+    "EMBEDDINGS_BACKEND": "fake",
+}
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"[\W_]+", "", text.lower())
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        questions = json.load(f)
+    for question in questions:
+        question["expected_normalized"] = [normalize(phrase) for phrase in question["expected"]]
+    return questions
+
+
+def first_relevant_rank(docs: List[Any], expected: List[str]) -> Optional[int]:
+    """1-based rank of the first chunk containing an expected phrase"""
+    for rank, doc in enumerate(docs, start=1):
+        content = normalize(doc.page_content)
+        if any(phrase in content for phrase in expected):
+            return rank
+    return None
+
+
+def evaluate(vectordb, strategy, questions: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    from rag.compact import compact_results
+
+    latencies = []
+    hits, reciprocal_ranks = [], []
+    by_language: Dict[str, List[float]] = {}
+    misses = []
+    full_bytes, compact_bytes = [], []
+
+    for question in questions:
+        docs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            docs = strategy.retrieve(vectordb, question["question"])
+            latencies.append(time.perf_counter() - start)
+
+        rank = first_relevant_rank(docs[:strategy.k], question["expected_normalized"])
+        hits.append(1.0 if rank else 0.0)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        by_language.setdefault(question.get("language", "unknown"), []).append(1.0 if rank else 0.0)
+        if not rank:
+            misses.append(question["question"])
+
+        full = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+        full_bytes.append(len(json.dumps(full, default=str)))
+        compact_bytes.append(len(json.dumps(compact_results(docs, question["question"]))))
+
+    return {
+        "name": strategy.describe(),
+        "k": strategy.k,
+        "recall": round(sum(hits) / len(hits), 4) if hits else 0.0,
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4) if reciprocal_ranks else 0.0,
+        "recall_by_language": {language: round(sum(values) / len(values), 4) for language, values in by_language.items()},
+        "latency": summarize(latencies),
+        # Mean size of the get_info_support_apple tool response, raw Documents vs compact hits
+        "payload": {
+            "full_bytes": round(sum(full_bytes) / len(full_bytes)) if full_bytes else 0,
+            "compact_bytes": round(sum(compact_bytes) / len(compact_bytes)) if compact_bytes else 0,
+        },
+        "misses": misses,
+    }
+
+
+def pick_strategy(results: List[Dict[str, Any]], min_recall: float, min_mrr: float) -> Optional[str]:
+    """Fastest strategy (by p50) that meets the quality bar"""
+    eligible = [result for result in results if result["recall"] >= min_recall and result["mrr"] >= min_mrr]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda result: result["latency"]["p50"])["name"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality versus latency benchmark")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="JSON list of {question, expected, language}")
+    parser.add_argument("--strategies", default=DEFAULT_STRATEGIES, help="Semicolon-separated strategy specs")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed retrievals per question")
+    parser.add_argument("--min-recall", type=float, default=0.8, help="Quality bar: minimum recall@k")
+    parser.add_argument("--min-mrr", type=float, default=0.0, help="Quality bar: minimum MRR")
+    parser.add_argument("--live", action="store_true", help="Use the OpenAI embeddings and index")
+    parser.add_argument("--output", default="benchmarks/results/retrieval.json")
+    parser.add_argument("--baseline", help="Previous result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative regression threshold")
+    args = parser.parse_args()
+
+    if not args.live:
+        for key, value in OFFLINE_ENV.items():
+            os.environ.setdefault(key, value)
+
+    from rag.load import get_persist_directory, get_vectordb, load_vectordb
+    from rag.retrieval import parse_retrieval_strategy
+
+    if not os.path.isdir(get_persist_directory()):
+        print(f"Building vector index in {get_persist_directory()}...")
+        load_vectordb()
+
+    questions = load_questions(args.questions)
+    strategies = [parse_retrieval_strategy(spec) for spec in args.strategies.split(";") if spec.strip()]
+    vectordb = get_vectordb()
+
+    results = []
+    for strategy in strategies:
+        # Warm-up outside the timed loop (lexical index build, first Chroma query)
+        with contextlib.redirect_stdout(io.StringIO()):
+            strategy.retrieve(vectordb, questions[0]["question"])
+        results.append(evaluate(vectordb, strategy, questions, args.repeat))
+
+    recommended = pick_strategy(results, args.min_recall, args.min_mrr)
+    reranker_stats = {}
+    if any(strategy.name == "reranked" for strategy in strategies):
+        from rag.rerank import get_reranker
+        scorers = {getattr(strategy, "scorer", None) for strategy in strategies if strategy.name == "reranked"}
+        reranker_stats = {get_reranker(scorer).scorer.name: get_reranker(scorer).stats() for scorer in scorers}
+    output = {
+        "benchmark": "retrieval",
+        "metadata": run_metadata({
+            "questions": args.questions,
+            "question_count": len(questions),
+            "repeat": args.repeat,
+            "persist_directory": get_persist_directory(),
+            "vector_store": os.getenv("RAG_VECTOR_STORE", "chroma"),
+            "embeddings": os.getenv("EMBEDDINGS_BACKEND", os.getenv("LLM_BACKEND", "openai")),
+            "min_recall": args.min_recall,
+            "min_mrr": args.min_mrr,
+        }),
+        "strategies": results,
+        "recommended": recommended,
+        "rerankers": reranker_stats,
+    }
+    write_results(output, args.output)
+
+    print(f"\n  {'strategy':<40} {'recall':>7} {'mrr':>7} {'p50 ms':>9} {'p95 ms':>9} {'bytes':>13}")
+    for result in results:
+        payload = f"{result['payload']['full_bytes']}->{result['payload']['compact_bytes']}"
+        print(f"  {result['name']:<40} {result['recall']:>7.3f} {result['mrr']:>7.3f} "
+              f"{result['latency']['p50']:>9.3f} {result['latency']['p95']:>9.3f} {payload:>13}")
+    print(f"\nFastest strategy with recall >= {args.min_recall} and MRR >= {args.min_mrr}: {recommended or 'none'}")
+
+    if args.baseline:
+        sys.exit(check_baseline(output, args.baseline, args.threshold))
+
+if __name__ == "__main__":
+    main()
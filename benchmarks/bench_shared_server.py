@@ -0,0 +1,149 @@
+"""
+Loopback benchmark for the shared network MCP server
+
+Starts the support server once as a streamable HTTP (or SSE) service on
+127.0.0.1 and runs the same query load from several aggregator workers
+(threads, one AgenticRAGSystem each) twice: with a stdio server spawned per
+query, and connected to the shared server through MCP_SERVER_URL. Reports
+throughput, latency, server processes started and the shared server's
+resident memory.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_shared_server --workers 4 --queries 40
+    python -m benchmarks.bench_shared_server --serve          # only run the loopback server
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.bench_agentic_rag import load_corpus, prepare_environment, quiet, DEFAULT_CORPUS
+from benchmarks.common import check_baseline, run_metadata, summarize, write_results
+from mcp_base.client.shared_session import free_port, local_network_server, server_url
+
+
+def process_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return 0
+
+
+def run_load(corpus: List[Dict[str, str]], workers: int, queries: int) -> Dict[str, Any]:
+    """`queries` queries over `workers` threads, one system per thread"""
+    from agenticRagSystem import AgenticRAGSystem
+
+    local = threading.local()
+    errors = []
+
+    def run(index: int) -> float:
+        if not hasattr(local, "system"):
+            local.system = AgenticRAGSystem(True)
+        start = time.perf_counter()
+        try:
+            local.system.query(corpus[index % len(corpus)]["query"])
+        except Exception as e:
+            errors.append(str(e))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(run, range(queries)))
+    seconds = time.perf_counter() - start
+    return {
+        "workers": workers,
+        "queries": queries,
+        "errors": len(errors),
+        "seconds": round(seconds, 3),
+        "qps": round(queries / seconds, 3) if seconds else 0.0,
+        "latency": summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback benchmark for the shared network MCP server")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {category, query}")
+    parser.add_argument("--workers", type=int, default=4, help="Aggregator worker threads")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per mode")
+    parser.add_argument("--transport", choices=["streamable-http", "sse"], default="streamable-http")
+    parser.add_argument("--port", type=int, help="Server port (default: a free one)")
+    parser.add_argument("--skip-stdio", action="store_true", help="Only measure the shared server")
+    parser.add_argument("--serve", action="store_true", help="Run the loopback server until interrupted")
+    parser.add_argument("--live", action="store_true", help="Use the real LLM, embeddings and Tavily")
+    parser.add_argument("--output", default="benchmarks/results/shared_server.json")
+    parser.add_argument("--baseline", help="Previous result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative regression threshold")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's console output")
+    args = parser.parse_args()
+
+    db_copy = prepare_environment(args.live)
+    try:
+        run(args, db_copy)
+    finally:
+        shutil.rmtree(os.path.dirname(db_copy), ignore_errors=True)
+
+
+def run(args, db_copy: str):
+    port = args.port or free_port()
+    url = server_url(args.transport, port)
+
+    if args.serve:
+        with local_network_server(args.transport, port):
+            print(f"Serving {url} (HELPDESK_DB_PATH={db_copy}); set MCP_SERVER_URL={url} in the workers. Ctrl+C to stop.")
+            with contextlib.suppress(KeyboardInterrupt):
+                while True:
+                    time.sleep(1)
+        return
+
+    corpus = load_corpus(args.corpus)
+    modes = []
+    if not args.skip_stdio:
+        os.environ.pop("MCP_SERVER_URL", None)
+        with quiet(not args.verbose):
+            result = run_load(corpus, args.workers, args.queries)
+        # One `mcp run` child per query
+        modes.append({"name": "stdio", "server_processes": args.queries, **result})
+        print(f"  stdio   {result['qps']:.2f} queries/s  p50 {result['latency']['p50']:.1f} ms  errors {result['errors']}")
+
+    with local_network_server(args.transport, port) as server:
+        os.environ["MCP_SERVER_URL"] = url
+        try:
+            with quiet(not args.verbose):
+                result = run_load(corpus, args.workers, args.queries)
+        finally:
+            os.environ.pop("MCP_SERVER_URL", None)
+        from mcp_base.client.shared_session import close_shared_sessions, get_shared_session
+        sessions = get_shared_session(url).stats()
+        close_shared_sessions()
+        modes.append({"name": "shared", "server_processes": 1, "server_rss_kb": process_rss_kb(server.pid),
+                      "sessions": sessions, **result})
+        print(f"  shared  {result['qps']:.2f} queries/s  p50 {result['latency']['p50']:.1f} ms  errors {result['errors']}  "
+              f"sessions opened {sessions['connects']}")
+
+    output = {
+        "benchmark": "shared_server",
+        "metadata": run_metadata({
+            "corpus": args.corpus,
+            "workers": args.workers,
+            "queries": args.queries,
+            "transport": args.transport,
+            "live": args.live,
+            "client_concurrency": int(os.getenv("MCP_CLIENT_CONCURRENCY", "8")),
+            "client_sessions": int(os.getenv("MCP_CLIENT_SESSIONS", "4")),
+        }),
+        "modes": modes,
+    }
+    write_results(output, args.output)
+
+    if args.baseline:
+        sys.exit(check_baseline(output, args.baseline, args.threshold))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Cold start benchmark for the MCP support server
+
+Every measurement runs in a fresh Python process so nothing is already
+imported or cached:
+
+- import: seconds to import the server module and each of its dependency
+  modules, plus which heavy libraries (langchain, Chroma, OpenAI, Tavily,
+  NumPy, pypdf) that import pulled in
+- first response: for a helpdesk tool and the RAG tool, the seconds from
+  the start of the import until the first call returns, split into import,
+  warm-up and the call itself; measured without warm-up ("cold") and with
+  MCP_WARMUP=all ("warm")
+
+Results are checked against time budgets (p50 over the runs); the process
+exits non-zero when one is exceeded. When the installed mcp package cannot
+load the server module, the first-response probes call the functions its
+tools wrap (AsyncAppleHelpDeskDB, rag.load.get_compact_query) instead.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --budget cold.get_info_support_apple.time_to_first_response=4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import check_baseline, run_metadata, summarize, write_results
+
+SERVER_MODULE = "mcp_base.server.server_support_apple"
+IMPORT_MODULES = [
+    SERVER_MODULE,
+    "rag.load",
+    "mcp_base.server.web_search",
+    "mcp_base.server.async_helpdesk_db",
+]
+HEAVY_MODULES = ["langchain_openai", "langchain_chroma", "chromadb", "langchain_community", "langchain_tavily",
+                 "langchain_text_splitters", "openai", "numpy", "pypdf"]
+# First tool call per probe: server tool name -> arguments
+FIRST_CALLS = {
+    "search_tickets_page": {"page_size": 5, "columns": ["ticket_number", "subject", "status"]},
+    "get_info_support_apple": {"query": "My iPhone battery drains quickly"},
+}
+# p50 seconds; keys are flattened result paths
+DEFAULT_BUDGETS = {
+    "import.rag.load": 0.3,
+    "import.mcp_base.server.web_search": 0.3,
+    "import.mcp_base.server.async_helpdesk_db": 0.3,
+    "cold.search_tickets_page.time_to_first_response": 1.0,
+    "cold.get_info_support_apple.time_to_first_response": 8.0,
+    "warm.get_info_support_apple.call_seconds": 0.5,
+    "warm.search_tickets_page.call_seconds": 0.2,
+}
+RESULT_MARKER = "STARTUP_RESULT "
+
+
+# PROBES (run in the child process)
+
+def probe_import(module: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        __import__(module)
+    except ImportError as e:
+        return {"error": str(e)}
+    return {
+        "seconds": time.perf_counter() - start,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+class ComponentTools:
+    """The functions the server's tools wrap, for when the server module cannot be imported"""
+
+    def __init__(self):
+        from mcp_base.server.async_helpdesk_db import AsyncAppleHelpDeskDB, DEFAULT_DB_PATH
+        from rag.load import get_compact_query
+
+        self.helpdesk_db = AsyncAppleHelpDeskDB(os.getenv("HELPDESK_DB_PATH", DEFAULT_DB_PATH))
+        self.search_tickets_page = self.helpdesk_db.search_tickets_page
+        self.get_info_support_apple = get_compact_query
+        self.get_web_search = None
+
+
+async def _call(function, kwargs: Dict[str, Any]):
+    result = function(**kwargs)
+    if hasattr(result, "__await__"):
+        result = await result
+    return result
+
+
+def probe_first_response(tool: str, warm: bool) -> Dict[str, Any]:
+    import asyncio
+
+    start = time.perf_counter()
+    try:
+        tools = __import__(SERVER_MODULE, fromlist=["helpdesk_db"])
+        layer = "mcp_tools"
+    except ImportError:
+        # Do not count the failed import of the server module
+        start = time.perf_counter()
+        tools = ComponentTools()
+        layer = "components"
+    import_seconds = time.perf_counter() - start
+
+    async def run() -> Dict[str, Any]:
+        warm_seconds = 0.0
+        if warm:
+            from mcp_base.server.warmup import WARMUP_COMPONENTS, warm_up
+
+            warm_start = time.perf_counter()
+            with contextlib.redirect_stderr(io.StringIO()):
+                await warm_up(tools.helpdesk_db, list(WARMUP_COMPONENTS), web_search_factory=tools.get_web_search)
+            warm_seconds = time.perf_counter() - warm_start
+
+        call_start = time.perf_counter()
+        await _call(getattr(tools, tool), FIRST_CALLS[tool])
+        call_seconds = time.perf_counter() - call_start
+        return {"warm_up_seconds": warm_seconds, "call_seconds": call_seconds}
+
+    # The RAG tool prints the retrieved chunks
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = asyncio.run(run())
+    return {
+        "layer": layer,
+        "import_seconds": import_seconds,
+        **timings,
+        "time_to_first_response": time.perf_counter() - start,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def run_probe(spec: Dict[str, Any]):
+    if spec["kind"] == "import":
+        result = probe_import(spec["module"])
+    else:
+        result = probe_first_response(spec["tool"], spec["warm"])
+    print(RESULT_MARKER + json.dumps(result))
+
+
+# DRIVER
+
+def spawn(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one probe in a fresh interpreter; adds the process wall time"""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--probe", json.dumps(spec)],
+                               capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+    if not lines:
+        return {"error": (completed.stderr.strip().splitlines() or ["no result"])[-1]}
+    result = json.loads(lines[-1][len(RESULT_MARKER):])
+    result["process_seconds"] = wall
+    return result
+
+
+def aggregate(samples: List[Dict[str, Any]], keys: List[str]) -> Dict[str, Any]:
+    """p50 seconds per key, the full latency summary (ms) and the last run's details"""
+    ok = [sample for sample in samples if "error" not in sample]
+    if not ok:
+        return {"error": samples[-1]["error"] if samples else "no runs"}
+    result: Dict[str, Any] = {}
+    for key in keys:
+        values = sorted(sample[key] for sample in ok)
+        result[key] = round(values[len(values) // 2], 4)
+        result[f"{key}_latency"] = summarize(values)
+    for key in ("heavy_modules", "layer"):
+        if key in ok[-1]:
+            result[key] = ok[-1][key]
+    return result
+
+
+def check_budgets(results: Dict[str, Any], budgets: Dict[str, float]) -> List[str]:
+    over = []
+    for path, budget in sorted(budgets.items()):
+        section, _, rest = path.partition(".")
+        if section == "import":
+            entry, key = results["import"].get(rest, {}), "seconds"
+        else:
+            tool, _, key = rest.partition(".")
+            entry = results.get(section, {}).get(tool, {})
+        value = entry.get(key)
+        if value is None:
+            print(f"  budget {path}: not measured ({entry.get('error', 'missing')})")
+        elif value > budget:
+            over.append(f"{path}: {value:.3f}s > {budget:.3f}s")
+    return over
+
+
+def measure(runs: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"import": {}, "cold": {}, "warm": {}}
+    for module in IMPORT_MODULES:
+        samples = [spawn({"kind": "import", "module": module}) for _ in range(runs)]
+        entry = aggregate(samples, ["seconds", "process_seconds"])
+        results["import"][module] = entry
+        if "error" in entry:
+            print(f"  import {module:<40} error: {entry['error']}")
+        else:
+            print(f"  import {module:<40} {entry['seconds']:.3f}s  heavy modules: {', '.join(entry['heavy_modules']) or 'none'}")
+
+    for mode in ("cold", "warm"):
+        for tool in FIRST_CALLS:
+            samples = [spawn({"kind": "first_response", "tool": tool, "warm": mode == "warm"}) for _ in range(runs)]
+            entry = aggregate(samples, ["import_seconds", "warm_up_seconds", "call_seconds", "time_to_first_response"])
+            results[mode][tool] = entry
+            if "error" in entry:
+                print(f"  {mode:<4} {tool:<24} error: {entry['error']}")
+            else:
+                print(f"  {mode:<4} {tool:<24} import {entry['import_seconds']:.3f}s  warm-up {entry['warm_up_seconds']:.3f}s  "
+                      f"call {entry['call_seconds']:.3f}s  first response {entry['time_to_first_response']:.3f}s")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark for the MCP support server")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--budget", action="append", default=[], metavar="PATH=SECONDS",
+                        help="Override or add a budget, e.g. import.rag.load=0.2")
+    parser.add_argument("--db", default="mcp_base/server/apple_helpdesk.db", help="Helpdesk DB to copy for the probes")
+    parser.add_argument("--live", action="store_true", help="Use OpenAI embeddings and Tavily")
+    parser.add_argument("--output", default="benchmarks/results/startup.json")
+    parser.add_argument("--baseline", help="Previous result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Relative regression threshold")
+    args = parser.parse_args()
+
+    if args.probe:
+        run_probe(json.loads(args.probe))
+        return
+
+    if not args.live:
+        from benchmarks.bench_agentic_rag import OFFLINE_ENV
+
+        for key, value in OFFLINE_ENV.items():
+            os.environ.setdefault(key, value)
+
+    # Opening the DB switches it to WAL; probe a throwaway copy
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    db_copy = os.path.join(workdir, "apple_helpdesk.db")
+    shutil.copy(args.db, db_copy)
+    os.environ["HELPDESK_DB_PATH"] = db_copy
+
+    # The RAG probes need an index; build the offline one once, outside the timings
+    from rag.load import get_persist_directory, load_vectordb
+    if not os.path.isdir(get_persist_directory()):
+        print(f"Building vector index in {get_persist_directory()}...")
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_vectordb()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in args.budget:
+        path, _, seconds = item.partition("=")
+        budgets[path.strip()] = float(seconds)
+
+    try:
+        results = measure(args.runs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    over_budget = check_budgets(results, budgets)
+    output = {
+        "benchmark": "startup",
+        "metadata": run_metadata({
+            "runs": args.runs,
+            "budgets": budgets,
+            "embeddings": os.getenv("EMBEDDINGS_BACKEND", os.getenv("LLM_BACKEND", "openai")),
+            "vector_store": os.getenv("RAG_VECTOR_STORE", "chroma"),
+        }),
+        **results,
+        "over_budget": over_budget,
+    }
+    write_results(output, args.output)
+
+    if over_budget:
+        print(f"{len(over_budget)} budget(s) exceeded:")
+        for message in over_budget:
+            print(f"  - {message}")
+    else:
+        print(f"All {len(budgets)} budgets met")
+
+    status = 1 if over_budget else 0
+    if args.baseline:
+        status = max(status, check_baseline(output, args.baseline, args.threshold))
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Shared helpers for the benchmark scripts: latency summaries, run metadata,
+JSON result files and regression checks against a baseline run.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence
+
+# Leaf metric names compared against a baseline, by direction of improvement
+LOWER_IS_BETTER = {"p50", "p90", "p95", "p99", "mean", "max", "growth_per_turn_kb", "rss_kb", "seconds",
+                   "compact_bytes", "index_bytes", "text_bytes"}
+HIGHER_IS_BETTER = {"qps", "recall", "mrr", "hit_rate"}
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    millis = [sample * 1000 for sample in samples]
+    return {
+        "count": len(millis),
+        "mean": round(sum(millis) / len(millis), 3) if millis else 0.0,
+        "p50": round(percentile(millis, 50), 3),
+        "p90": round(percentile(millis, 90), 3),
+        "p95": round(percentile(millis, 95), 3),
+        "p99": round(percentile(millis, 99), 3),
+        "max": round(max(millis), 3) if millis else 0.0,
+    }
+
+
+def rss_kb() -> int:
+    """Current resident set size of this process in KiB (0 where unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return 0
+
+
+def run_metadata(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Context needed to compare two result files"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": config,
+    }
+
+
+def write_results(results: Dict[str, Any], path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+
+
+def _flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            label = value.get("name", index) if isinstance(value, dict) else index
+            flat.update(_flatten(value, f"{prefix}[{label}]"))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = float(data)
+    return flat
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.10,
+                    min_delta: float = 0.0) -> List[str]:
+    """
+    Compare two result files metric by metric
+    Args:
+        threshold: Relative change that counts as a regression
+        min_delta: Absolute change below which a metric is treated as noise
+    Returns:
+        One message per metric that got worse than the baseline by more than
+        `threshold` (relative); metadata is ignored
+    """
+    now = _flatten({key: value for key, value in current.items() if key != "metadata"})
+    before = _flatten({key: value for key, value in baseline.items() if key != "metadata"})
+
+    regressions = []
+    for name, value in sorted(now.items()):
+        if name not in before or before[name] == 0:
+            continue
+        metric = name.rsplit(".", 1)[-1]
+        if abs(value - before[name]) < min_delta:
+            continue
+        change = (value - before[name]) / abs(before[name])
+        if (metric in LOWER_IS_BETTER and change > threshold) or (metric in HIGHER_IS_BETTER and change < -threshold):
+            regressions.append(f"{name}: {before[name]:.3f} -> {value:.3f} ({change:+.1%})")
+    return regressions
+
+
+def check_baseline(results: Dict[str, Any], baseline_path: str, threshold: float, min_delta: float = 0.0) -> int:
+    """Print regressions against a baseline file and return a process exit code"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_results(results, baseline, threshold, min_delta)
+    if not regressions:
+        print(f"No regressions beyond {threshold:.0%} against {baseline_path}")
+        return 0
+    print(f"{len(regressions)} regression(s) beyond {threshold:.0%} against {baseline_path}:")
+    for regression in regressions:
+        print(f"  - {regression}")
+    return 1
@@ -0,0 +1,226 @@
+"""
+Synthetic data generator for the Apple Help Desk database
+
+Builds a database with the production schema and a realistic skew: a few
+customers and agents own most tickets, most old tickets are closed, volume
+grows over time and knowledge base popularity follows a long tail.
+
+Usage (from the repository root):
+    python -m benchmarks.helpdesk_data --tickets 2000000 --output benchmarks/data/helpdesk_2m.db
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Sequence
+
+from mcp_base.server.apple_helpdesk_manager import AppleHelpDeskDB
+
+STATUSES_RECENT = (["Open", "In Progress", "Pending", "Resolved", "Closed"], [35, 25, 15, 15, 10])
+STATUSES_OLD = (["Open", "In Progress", "Pending", "Resolved", "Closed"], [2, 2, 1, 25, 70])
+PRIORITIES = (["Low", "Medium", "High", "Critical"], [25, 45, 22, 8])
+WORDS = (
+    "iphone ipad mac macbook watch airpods battery screen wifi bluetooth restart update ios macos "
+    "icloud password apple id charging slow crash app storage backup restore camera sound network "
+    "touch face id keyboard trackpad display flicker boot black spinning wheel setup transfer"
+).split()
+BATCH_SIZE = 50_000
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    """Cumulative Zipf weights: rank r gets weight 1 / r^exponent"""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def batched(rows: Iterator[tuple], size: int = BATCH_SIZE) -> Iterator[List[tuple]]:
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class HelpDeskDataGenerator:
+    """Fills a fresh database with skewed synthetic helpdesk data"""
+
+    def __init__(self, tickets: int = 200_000, customers: int = 50_000, agents: int = 200,
+                 kb_articles: int = 5_000, comments_per_ticket: float = 2.0, days: int = 730, seed: int = 42):
+        self.tickets = tickets
+        self.customers = customers
+        self.agents = agents
+        self.kb_articles = kb_articles
+        self.comments_per_ticket = comments_per_ticket
+        self.days = days
+        self.rng = random.Random(seed)
+        self.end = datetime(2025, 8, 1)
+
+    def generate(self, path: str) -> str:
+        if os.path.exists(path):
+            os.remove(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = AppleHelpDeskDB(path)
+            db.create_database()
+        conn = db.conn
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+
+        # Statistics triggers fire per row; drop them for the bulk load and rebuild afterwards
+        conn.executescript("""
+            DROP TRIGGER IF EXISTS trg_ticket_stats_insert;
+            DROP TRIGGER IF EXISTS trg_ticket_stats_update;
+            DROP TRIGGER IF EXISTS trg_ticket_stats_delete;
+            DROP TRIGGER IF EXISTS trg_ticket_buckets_created;
+            DROP TRIGGER IF EXISTS trg_ticket_buckets_resolved;
+            DROP TRIGGER IF EXISTS trg_ticket_buckets_closed;
+            DROP TABLE IF EXISTS ticket_stats_counters;
+            DROP TABLE IF EXISTS ticket_stats_buckets;
+        """)
+
+        start = time.perf_counter()
+        self._insert_people(conn)
+        self._insert_tickets(conn)
+        self._insert_comments(conn)
+        self._insert_kb_articles(conn)
+        db._ensure_ticket_statistics()
+        conn.execute("ANALYZE")
+        conn.commit()
+        db.close()
+        print(f"Generated {path} in {time.perf_counter() - start:.1f}s")
+        return path
+
+    def _insert_people(self, conn):
+        conn.executemany(
+            "INSERT INTO customers (first_name, last_name, email, phone, apple_id) VALUES (?, ?, ?, ?, ?)",
+            ((f"First{i}", f"Last{i}", f"customer{i}@example.com", f"+1-555-{i % 10000:04d}",
+              f"customer{i}@icloud.com") for i in range(self.customers)),
+        )
+        conn.executemany(
+            "INSERT INTO agents (first_name, last_name, email, employee_id, specialization) VALUES (?, ?, ?, ?, ?)",
+            ((f"Agent{i}", f"Surname{i}", f"agent{i}@applecare.com", f"GEN{i:05d}",
+              self.rng.choice(["iOS Support", "macOS Support", "Hardware Specialist", "Account & Security"]))
+             for i in range(self.agents)),
+        )
+        conn.commit()
+
+    def _ids(self, conn, table: str) -> List[int]:
+        ids = [row[0] for row in conn.execute(f"SELECT id FROM {table} ORDER BY id")]
+        # Shuffle so the heaviest Zipf ranks are not always the lowest ids
+        self.rng.shuffle(ids)
+        return ids
+
+    def _choose(self, population: Sequence, cum_weights: List[float], k: int) -> List:
+        return self.rng.choices(population, cum_weights=cum_weights, k=k)
+
+    def _insert_tickets(self, conn):
+        customer_ids = self._ids(conn, "customers")
+        agent_ids = self._ids(conn, "agents")
+        category_ids = self._ids(conn, "categories")
+        product_ids = self._ids(conn, "products")
+        customer_weights = zipf_weights(len(customer_ids))
+        agent_weights = zipf_weights(len(agent_ids), exponent=0.8)
+        category_weights = zipf_weights(len(category_ids), exponent=0.7)
+        product_weights = zipf_weights(len(product_ids), exponent=0.9)
+
+        def rows():
+            for offset in range(0, self.tickets, BATCH_SIZE):
+                count = min(BATCH_SIZE, self.tickets - offset)
+                customers = self._choose(customer_ids, customer_weights, count)
+                agents = self._choose(agent_ids, agent_weights, count)
+                categories = self._choose(category_ids, category_weights, count)
+                products = self._choose(product_ids, product_weights, count)
+                priorities = self.rng.choices(*PRIORITIES, k=count)
+                for i in range(count):
+                    # sqrt skews creation dates toward the end: volume grows over time
+                    age_days = self.days * (1 - self.rng.random() ** 0.5)
+                    created = self.end - timedelta(days=age_days, seconds=self.rng.randrange(86400))
+                    status = self.rng.choices(*(STATUSES_RECENT if age_days < 30 else STATUSES_OLD))[0]
+                    resolved = created + timedelta(hours=self.rng.randrange(1, 240)) \
+                        if status in ("Resolved", "Closed") else None
+                    closed = resolved + timedelta(hours=self.rng.randrange(1, 72)) if status == "Closed" else None
+                    yield (
+                        f"GEN-{offset + i:08d}", customers[i], agents[i] if status != "Open" or i % 3 else None,
+                        categories[i], products[i] if i % 5 else None, sentence(self.rng, 6),
+                        sentence(self.rng, 40), priorities[i], status, created.strftime("%Y-%m-%d %H:%M:%S"),
+                        created.strftime("%Y-%m-%d %H:%M:%S"),
+                        resolved.strftime("%Y-%m-%d %H:%M:%S") if resolved else None,
+                        closed.strftime("%Y-%m-%d %H:%M:%S") if closed else None,
+                    )
+
+        for batch in batched(rows()):
+            conn.executemany("""
+                INSERT INTO tickets (ticket_number, customer_id, agent_id, category_id, product_id, subject,
+                                     description, priority, status, created_at, updated_at, resolved_at, closed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            conn.commit()
+
+    def _insert_comments(self, conn):
+        max_ticket = conn.execute("SELECT MAX(id) FROM tickets").fetchone()[0] or 0
+        agent_ids = self._ids(conn, "agents")
+        total = int(self.tickets * self.comments_per_ticket)
+
+        def rows():
+            for _ in range(total):
+                yield (self.rng.randint(1, max_ticket), self.rng.choice(agent_ids),
+                       self.rng.choice(["note", "reply", "internal"]), sentence(self.rng, 25), self.rng.random() < 0.4)
+
+        for batch in batched(rows()):
+            conn.executemany(
+                "INSERT INTO ticket_comments (ticket_id, agent_id, comment_type, content, is_public) VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+            conn.commit()
+
+    def _insert_kb_articles(self, conn):
+        agent_ids = self._ids(conn, "agents")
+        category_ids = self._ids(conn, "categories")
+        product_ids = self._ids(conn, "products")
+        conn.executemany("""
+            INSERT INTO knowledge_base (title, content, category_id, product_id, tags, created_by, view_count, is_published)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            (
+                f"How to fix {sentence(self.rng, 4)}", sentence(self.rng, self.rng.randint(150, 500)),
+                self.rng.choice(category_ids), self.rng.choice(product_ids), ",".join(self.rng.sample(WORDS, 4)),
+                self.rng.choice(agent_ids), int(self.rng.paretovariate(1.2) * 10), self.rng.random() < 0.95,
+            )
+            for _ in range(self.kb_articles)
+        ))
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Apple Help Desk database")
+    parser.add_argument("--output", default="benchmarks/data/helpdesk_synthetic.db")
+    parser.add_argument("--tickets", type=int, default=200_000)
+    parser.add_argument("--customers", type=int, default=50_000)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--kb-articles", type=int, default=5_000)
+    parser.add_argument("--comments-per-ticket", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    HelpDeskDataGenerator(
+        tickets=args.tickets,
+        customers=args.customers,
+        agents=args.agents,
+        kb_articles=args.kb_articles,
+        comments_per_ticket=args.comments_per_ticket,
+        seed=args.seed,
+    ).generate(args.output)
+
+if __name__ == "__main__":
+    main()
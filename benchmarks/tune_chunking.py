@@ -0,0 +1,153 @@
+"""
+Chunking configuration sweep for the RAG index
+
+Builds one index per chunker configuration from the same parsed PDF pages
+and reports chunk count, stored text, on-disk index size and build time next
+to the bench_retrieval quality and latency metrics for each retrieval
+strategy. The recommended configuration is the smallest index whose first
+strategy still meets the recall bar.
+
+Usage (from the repository root):
+    python -m benchmarks.tune_chunking
+    python -m benchmarks.tune_chunking --chunkers "recursive;structure:chunk_size=600" --strategies "hybrid:k=5"
+    RAG_VECTOR_STORE=mmap python -m benchmarks.tune_chunking
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_retrieval import DEFAULT_QUESTIONS, OFFLINE_ENV, evaluate, load_questions
+from benchmarks.common import check_baseline, run_metadata, write_results
+
+DEFAULT_CHUNKERS = ";".join([
+    "recursive:chunk_size=1000,chunk_overlap=100",
+    "recursive:chunk_size=600,chunk_overlap=60",
+    "structure:chunk_size=1000,min_chunk_size=200",
+    "structure:chunk_size=1000,min_chunk_size=500",
+    "structure:chunk_size=800,min_chunk_size=400",
+    "structure:chunk_size=1200,min_chunk_size=700",
+])
+DEFAULT_STRATEGIES = "similarity:k=5;hybrid:k=5,fetch_k=20;reranked:k=5,fetch_k=20"
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def tune(spec: str, pages, strategies, questions: List[Dict[str, Any]], repeat: int, workdir: str) -> Dict[str, Any]:
+    from rag.load import get_chunker, get_vectordb, load_vectordb, split_pages
+
+    chunker = get_chunker(spec)
+    documents = split_pages(pages, chunker)
+    directory = os.path.join(workdir, chunker.describe().replace(":", "_").replace(",", "_").replace("=", ""))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_vectordb(chunker, directory, pages=pages)
+    build_seconds = time.perf_counter() - start
+
+    vectordb = get_vectordb(directory)
+    results = []
+    for strategy in strategies:
+        with contextlib.redirect_stdout(io.StringIO()):
+            strategy.retrieve(vectordb, questions[0]["question"])
+            results.append(evaluate(vectordb, strategy, questions, repeat))
+
+    lengths = [len(doc.page_content) for doc in documents]
+    return {
+        "name": chunker.describe(),
+        "chunks": len(documents),
+        "text_bytes": sum(len(doc.page_content.encode("utf-8")) for doc in documents),
+        "mean_chunk_chars": round(sum(lengths) / len(lengths)) if lengths else 0,
+        "max_chunk_chars": max(lengths) if lengths else 0,
+        "index_bytes": directory_bytes(directory),
+        "build": {"seconds": round(build_seconds, 3)},
+        "strategies": results,
+    }
+
+
+def pick_config(configs: List[Dict[str, Any]], min_recall: float) -> Optional[str]:
+    """Smallest index (then fewest chunks) whose first strategy meets the recall bar"""
+    eligible = [config for config in configs if config["strategies"] and config["strategies"][0]["recall"] >= min_recall]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda config: (config["index_bytes"], config["chunks"]))["name"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunking configuration sweep for the RAG index")
+    parser.add_argument("--chunkers", default=DEFAULT_CHUNKERS, help="Semicolon-separated chunker specs")
+    parser.add_argument("--strategies", default=DEFAULT_STRATEGIES, help="Semicolon-separated retrieval strategy specs")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="JSON list of {question, expected, language}")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed retrievals per question")
+    parser.add_argument("--min-recall", type=float, default=0.8, help="Recall bar for the first strategy")
+    parser.add_argument("--live", action="store_true", help="Use the OpenAI embeddings")
+    parser.add_argument("--keep", help="Directory to keep the built indexes in (default: temporary)")
+    parser.add_argument("--output", default="benchmarks/results/chunking.json")
+    parser.add_argument("--baseline", help="Previous result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative regression threshold")
+    args = parser.parse_args()
+
+    if not args.live:
+        for key, value in OFFLINE_ENV.items():
+            os.environ.setdefault(key, value)
+
+    from rag.load import get_vector_store_backend, load_pages
+    from rag.retrieval import parse_retrieval_strategy
+
+    questions = load_questions(args.questions)
+    strategies = [parse_retrieval_strategy(spec) for spec in args.strategies.split(";") if spec.strip()]
+    with contextlib.redirect_stderr(io.StringIO()):
+        pages = load_pages()
+
+    workdir = args.keep or tempfile.mkdtemp(prefix="tune_chunking_")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        configs = []
+        for spec in filter(None, (spec.strip() for spec in args.chunkers.split(";"))):
+            print(f"Building index for {spec}...")
+            configs.append(tune(spec, pages, strategies, questions, args.repeat, workdir))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    recommended = pick_config(configs, args.min_recall)
+    output = {
+        "benchmark": "chunking",
+        "metadata": run_metadata({
+            "questions": args.questions,
+            "question_count": len(questions),
+            "repeat": args.repeat,
+            "vector_store": get_vector_store_backend(),
+            "embeddings": os.getenv("EMBEDDINGS_BACKEND", os.getenv("LLM_BACKEND", "openai")),
+            "min_recall": args.min_recall,
+        }),
+        "configs": configs,
+        "recommended": recommended,
+    }
+    write_results(output, args.output)
+
+    print(f"\n  {'chunker':<44} {'chunks':>6} {'index KB':>9} {'strategy':<28} {'recall':>7} {'mrr':>7} {'p50 ms':>8}")
+    for config in configs:
+        for index, result in enumerate(config["strategies"]):
+            prefix = (f"  {config['name']:<44} {config['chunks']:>6} {config['index_bytes'] / 1024:>9.1f}" if index == 0
+                      else f"  {'':<44} {'':>6} {'':>9}")
+            print(f"{prefix} {result['name'][:28]:<28} {result['recall']:>7.3f} {result['mrr']:>7.3f} "
+                  f"{result['latency']['p50']:>8.3f}")
+    print(f"\nSmallest index with recall >= {args.min_recall} on {strategies[0].describe()}: {recommended or 'none'}")
+
+    if args.baseline:
+        sys.exit(check_baseline(output, args.baseline, args.threshold))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+_MISSING = object()
+# Returned by VersionedCache.get on a miss, since None is a valid cached result
+MISSING = _MISSING
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._entries.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class VersionedCache:
+    """
+    Result cache invalidated by write scopes instead of (or as well as) a TTL
+
+    Every cached value records the scopes it was read from (e.g. "tickets",
+    "agent:3") and the write sequence number observed before the read
+    started. A write bumps the sequence and stamps its scopes with it; a
+    value is served only while none of its scopes has been written since
+    its read began, so a write racing with a read never leaves a stale
+    entry behind. Entries are bounded by an LRU of `max_size`; per-scope
+    stamps are reset (invalidating everything) after `max_scopes` distinct
+    scopes have been written.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, max_scopes: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self._entries = TTLCache(max_size=max_size, ttl=ttl, clock=clock)
+        self.max_scopes = max_scopes
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._floor = 0
+        self._written: Dict[str, int] = {}
+        self.stale = 0
+        self.invalidations = 0
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, counter: str):
+        counters = self._counters.setdefault(name, {"hits": 0, "misses": 0, "stale": 0})
+        counters[counter] += 1
+
+    def begin(self) -> int:
+        """Sequence number to pass to `set` for a read that is about to start"""
+        with self._lock:
+            return self._sequence
+
+    def get(self, key: Hashable, name: str = "default") -> Any:
+        """Cached value, or the module-level MISSING sentinel"""
+        entry = self._entries.get(key, _MISSING)
+        with self._lock:
+            if entry is _MISSING:
+                self._count(name, "misses")
+                return MISSING
+            value, sequence, scopes = entry
+            if sequence < self._floor or any(self._written.get(scope, 0) > sequence for scope in scopes):
+                self.stale += 1
+                self._count(name, "stale")
+                self._count(name, "misses")
+                stale = True
+            else:
+                self._count(name, "hits")
+                stale = False
+        if stale:
+            self._entries.invalidate(key)
+            return MISSING
+        return value
+
+    def set(self, key: Hashable, value: Any, sequence: int, scopes: Iterable[str]):
+        scopes = tuple(scopes)
+        with self._lock:
+            # Already outdated: a write to one of its scopes landed while it was being read
+            if sequence < self._floor or any(self._written.get(scope, 0) > sequence for scope in scopes):
+                return
+        self._entries.set(key, (value, sequence, scopes))
+
+    def invalidate(self, scopes: Iterable[str]):
+        """Record a write to `scopes`; cached values read from them become stale"""
+        with self._lock:
+            self._sequence += 1
+            self.invalidations += 1
+            for scope in scopes:
+                self._written[scope] = self._sequence
+            if len(self._written) > self.max_scopes:
+                self._written.clear()
+                self._floor = self._sequence
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+        for values in counters.values():
+            lookups = values["hits"] + values["misses"]
+            values["hit_rate"] = values["hits"] / lookups if lookups else 0.0
+        hits = sum(values["hits"] for values in counters.values())
+        misses = sum(values["misses"] for values in counters.values())
+        return {
+            "size": len(self._entries),
+            "max_size": self._entries.max_size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "stale": self.stale,
+            "evictions": self._entries.evictions,
+            "expirations": self._entries.expirations,
+            "invalidations": self.invalidations,
+            "by_name": counters,
+        }
+
+
+def completion_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """Stable digest of everything that determines a chat completion"""
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Exact-match LLM completion cache in a SQLite file, shared across runs and processes
+
+    Entries expire `ttl` seconds after they were written (None: never). Once
+    more than `max_entries` are stored, the least recently used ones are
+    deleted; the size is checked every `prune_every` writes, so it can
+    briefly overshoot by that much.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: int = 10_000, prune_every: int = 100,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                expires_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions(last_used)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.writes = 0
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[str]:
+        """Cached response, or None; `count_miss=False` for a probe that is followed by a counted lookup"""
+        now = self._clock()
+        with self._lock:
+            row = self.conn.execute("SELECT response, expires_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += count_miss
+                return None
+            response, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self.conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.conn.commit()
+                self.expirations += 1
+                self.misses += count_miss
+                return None
+            self.conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return response
+
+    def set(self, key: str, model: str, response: str):
+        now = self._clock()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO completions (key, model, response, created_at, last_used, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, model, response, now, now, expires_at))
+            self.writes += 1
+            if self.writes % self.prune_every == 0:
+                self._prune(now)
+            self.conn.commit()
+
+    def _prune(self, now: float):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        cursor = self.conn.execute("DELETE FROM completions WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self.expirations += cursor.rowcount
+        cursor = self.conn.execute("""
+            DELETE FROM completions WHERE key IN (
+                SELECT key FROM completions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        self.evictions += cursor.rowcount
+
+    def prune(self):
+        with self._lock:
+            self._prune(self._clock())
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM completions")
+            self.conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "size": len(self),
+            "max_size": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,162 @@
+"""
+Model cascade for the final generation step
+
+Generation first runs on the fast tier (LLM_MODEL_FAST) and escalates to the
+strong tier (LLM_MODEL_STRONG) only when a confidence check fails: when the
+retrieved context holds no evidence (the strong model goes first, the fast
+answer would be a guess), or when the fast answer is empty, an error or a
+hedge ("I don't have enough information..."). The strong tier falls back to
+LLM_MODEL; when it resolves to the fast model there is nothing to escalate to
+and generation uses a plain provider.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from llm_provider import LLMProvider, create_llm_provider, get_stage_model, get_tier_model
+from scheduler import latency_summary
+
+TIERS = ("fast", "strong")
+
+NO_EVIDENCE_PATTERN = re.compile(
+    r"^\s*(error\b|none\s*$|null\s*$|\[\]\s*$|\{\}\s*$)"
+    r"|\breturned:\s*(none|null|\[\]|\{\})?\s*$"
+    r"|\b(no (matching |relevant )?(results?|information|data|tickets?|articles?|documents?) (were |was )?(found|available))"
+    r"|\b(could ?n[o']t find|unable to find|not found)\b"
+    r"|\b(nenhum (resultado|chamado|artigo)|n[ãa]o (encontrei|foi encontrad))",
+    re.IGNORECASE)
+HEDGE_PATTERN = re.compile(
+    r"\b(i (do not|don'?t) (know|have (enough|sufficient|any) information)|i'?m not sure|i am not sure"
+    r"|(cannot|can'?t|unable to) (answer|determine|find)|not enough (information|context)"
+    r"|n[ãa]o (sei|tenho (informa[çc][õo]es|dados) suficientes))\b",
+    re.IGNORECASE)
+MIN_ANSWER_CHARS = 20
+# Longer tool outputs carry evidence even if they mention a miss; answers hedge up front
+EMPTY_RESULT_CHARS = 300
+HEDGE_WINDOW_CHARS = 200
+
+
+def evidence_issue(context: str) -> Optional[str]:
+    """Reason to skip the fast tier, judged from the generation context; None when it holds evidence"""
+    try:
+        retrieved = json.loads(context).get("retrieved_context")
+    except (ValueError, AttributeError):
+        # Not the aggregator's context; nothing to judge it by
+        return None
+    if not isinstance(retrieved, dict):
+        return None
+    results = [str(source.get("results") or "").strip() for source in retrieved.values() if isinstance(source, dict)]
+    if all(_is_empty_result(result) for result in results):
+        return "no_evidence"
+    return None
+
+
+def _is_empty_result(result: str) -> bool:
+    if not result:
+        return True
+    return len(result) <= EMPTY_RESULT_CHARS and NO_EVIDENCE_PATTERN.search(result) is not None
+
+
+def answer_issue(response: str) -> Optional[str]:
+    """Reason to distrust a fast-tier answer; None when it looks usable"""
+    text = (response or "").strip()
+    if len(text) < MIN_ANSWER_CHARS:
+        return "short_answer"
+    if text.startswith("Error generating response"):
+        return "provider_error"
+    if HEDGE_PATTERN.search(text[:HEDGE_WINDOW_CHARS]):
+        return "hedged_answer"
+    return None
+
+
+class CascadeStats:
+    """Calls and latency per tier, escalations and their reasons (shared by every cascade in the process)"""
+
+    def __init__(self, samples: int = 1000):
+        self._lock = threading.Lock()
+        self.generations = 0
+        self.escalations: Dict[str, int] = {}
+        self.calls = {tier: 0 for tier in TIERS}
+        self.latencies: Dict[str, Deque[float]] = {tier: deque(maxlen=samples) for tier in TIERS}
+
+    def record_call(self, tier: str, seconds: float):
+        with self._lock:
+            self.calls[tier] += 1
+            self.latencies[tier].append(seconds)
+
+    def record_generation(self, escalation: Optional[str]):
+        with self._lock:
+            self.generations += 1
+            if escalation is not None:
+                self.escalations[escalation] = self.escalations.get(escalation, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            escalated = sum(self.escalations.values())
+            return {
+                "generations": self.generations,
+                "escalations": escalated,
+                "escalation_rate": escalated / self.generations if self.generations else 0.0,
+                "by_reason": dict(self.escalations),
+                "tiers": {tier: {"model": get_tier_model(tier), "calls": self.calls[tier],
+                                 "latency_ms": latency_summary(sorted(self.latencies[tier]))} for tier in TIERS},
+            }
+
+
+cascade_stats = CascadeStats()
+
+
+class CascadingProvider(LLMProvider):
+    """Fast provider first, strong provider when `evidence_check` or `answer_check` finds a problem"""
+
+    def __init__(self, fast: LLMProvider, strong: LLMProvider,
+                 evidence_check: Callable[[str], Optional[str]] = evidence_issue,
+                 answer_check: Callable[[str], Optional[str]] = answer_issue,
+                 stats: CascadeStats = cascade_stats):
+        self.fast = fast
+        self.strong = strong
+        self.evidence_check = evidence_check
+        self.answer_check = answer_check
+        self.cascade_stats = stats
+
+    @property
+    def model(self) -> str:
+        return self.fast.model
+
+    def _timed(self, tier: str, provider: LLMProvider, prompt: str, context: str) -> str:
+        start = time.perf_counter()
+        try:
+            return provider.generate(prompt, context)
+        finally:
+            self.cascade_stats.record_call(tier, time.perf_counter() - start)
+
+    def generate(self, prompt: str, context: str) -> str:
+        reason = self.evidence_check(context)
+        if reason is None:
+            response = self._timed("fast", self.fast, prompt, context)
+            reason = self.answer_check(response)
+            if reason is None:
+                self.cascade_stats.record_generation(None)
+                return response
+        print(f"   Escalating generation to {self.strong.model} ({reason})")
+        self.cascade_stats.record_generation(reason)
+        return self._timed("strong", self.strong, prompt, context)
+
+    def query(self, prompt: str) -> str:
+        return self.fast.query(prompt)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cascade_stats.stats()
+
+
+def create_generation_provider() -> LLMProvider:
+    """Provider for the final generation: a CascadingProvider when the strong tier is another model than the fast one"""
+    fast_model, strong_model = get_stage_model("generation"), get_tier_model("strong")
+    fast = create_llm_provider(fast_model)
+    if strong_model == fast_model:
+        return fast
+    return CascadingProvider(fast, create_llm_provider(strong_model))
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.models.interface import Model
+from agents.items import ModelResponse
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseCreatedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputItemAddedEvent,
+    ResponseOutputItemDoneEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+
+from fake_providers import LatencyModel
+
+# Keyword routing used by the aggregator (agent name -> trigger words)
+DEFAULT_ROUTES = {
+    "CloudEngineAssistant": ["ticket", "report", "customer", "statistic", "workload", "chamado", "apl-"],
+    "SearchEngineAssistant": ["latest", "current", "recent", "news", "who", "ceo", "trend"],
+    "RagEngineAssistant": [],
+}
+
+# Tool preferences for specialists (tool name -> trigger words)
+DEFAULT_TOOL_RULES = [
+    ("get_ticket_statistics", ["report", "statistic", "relatório"]),
+    ("get_ticket_trends", ["trend", "per day", "per week"]),
+    ("get_customer_by_email", ["@"]),
+    ("get_agent_workload", ["workload"]),
+    ("search_knowledge_base", ["knowledge", "article"]),
+    ("search_tickets_page", ["ticket", "apl-"]),
+]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeAgentModel(Model):
+    """Offline, deterministic stand-in for the agents SDK model.
+
+    Agents with handoffs route the latest user message by keyword, agents
+    with tools call the best-matching tool once per user turn, and once that
+    tool has answered the model replies with a summary of its output.
+    """
+
+    def __init__(self, name: str = "gpt-3.5-turbo-0125", latency: LatencyModel = None,
+                 routes: Dict[str, List[str]] = None, tool_rules: List[Tuple[str, List[str]]] = None):
+        self.name = name
+        self.latency = latency or LatencyModel()
+        self.routes = routes or DEFAULT_ROUTES
+        self.tool_rules = tool_rules or DEFAULT_TOOL_RULES
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, **kwargs) -> ModelResponse:
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+        items = [{"role": "user", "content": input}] if isinstance(input, str) else list(input)
+        query, turn_items = self._current_turn(items)
+        tool_names = {tool.name for tool in tools}
+
+        answered = self._own_tool_output(turn_items, tool_names)
+        if answered is not None:
+            name, output = answered
+            output_item = self._message(f"{name} returned: {' '.join(str(output).split())[:500]}")
+        elif handoffs:
+            handoff = self._route(query, handoffs)
+            output_item = self._function_call(handoff.tool_name, {}, query)
+        elif tools:
+            # Every agent sees every MCP tool; prefer the ones its instructions mention
+            candidates = [tool for tool in tools if tool.name in (system_instructions or "")] or list(tools)
+            tool = self._choose_tool(query, candidates)
+            output_item = self._function_call(tool.name, self._arguments(query, tool), query)
+        else:
+            output_item = self._message(f"[fake {self.name}] {query}")
+
+        prompt_text = (system_instructions or "") + json.dumps(items, default=str)
+        input_tokens = _estimate_tokens(prompt_text)
+        output_tokens = _estimate_tokens(json.dumps(output_item.model_dump(), default=str))
+        usage = Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                      total_tokens=input_tokens + output_tokens)
+        return ModelResponse(output=[output_item], usage=usage, response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, **kwargs):
+        """Same turn as get_response, replayed as Responses API stream events"""
+        model_response = await self.get_response(system_instructions, input, model_settings, tools, output_schema,
+                                                 handoffs, tracing, **kwargs)
+        usage = model_response.usage
+        output = json.dumps([item.model_dump() for item in model_response.output], default=str)
+        response = Response(
+            id=f"resp_{hashlib.sha256(output.encode()).hexdigest()[:16]}",
+            created_at=time.time(),
+            model=self.name,
+            object="response",
+            output=[],
+            tool_choice="auto",
+            tools=[],
+            parallel_tool_calls=False,
+        )
+        sequence = 0
+
+        def next_sequence() -> int:
+            nonlocal sequence
+            sequence += 1
+            return sequence - 1
+
+        yield ResponseCreatedEvent(response=response, type="response.created", sequence_number=next_sequence())
+        for index, item in enumerate(model_response.output):
+            yield ResponseOutputItemAddedEvent(item=item, output_index=index, type="response.output_item.added",
+                                               sequence_number=next_sequence())
+            if isinstance(item, ResponseOutputMessage):
+                for part_index, part in enumerate(item.content):
+                    yield ResponseTextDeltaEvent(content_index=part_index, delta=part.text, item_id=item.id,
+                                                 logprobs=[], output_index=index, type="response.output_text.delta",
+                                                 sequence_number=next_sequence())
+            yield ResponseOutputItemDoneEvent(item=item, output_index=index, type="response.output_item.done",
+                                              sequence_number=next_sequence())
+
+        completed = response.model_copy()
+        completed.output = list(model_response.output)
+        completed.usage = ResponseUsage(
+            input_tokens=usage.input_tokens,
+            input_tokens_details=usage.input_tokens_details,
+            output_tokens=usage.output_tokens,
+            output_tokens_details=usage.output_tokens_details,
+            total_tokens=usage.total_tokens,
+        )
+        yield ResponseCompletedEvent(response=completed, type="response.completed", sequence_number=next_sequence())
+
+    # HELPERS
+
+    @staticmethod
+    def _current_turn(items: List[Any]) -> Tuple[str, List[Any]]:
+        """Latest user message and the items produced after it"""
+        for index in range(len(items) - 1, -1, -1):
+            item = items[index]
+            if isinstance(item, dict) and item.get("role") == "user":
+                content = item.get("content")
+                if isinstance(content, list):
+                    content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+                return str(content), items[index + 1:]
+        return "", items
+
+    @staticmethod
+    def _own_tool_output(turn_items: List[Any], tool_names: set) -> Optional[Tuple[str, Any]]:
+        calls = {
+            item.get("call_id"): item.get("name")
+            for item in turn_items
+            if isinstance(item, dict) and item.get("type") == "function_call"
+        }
+        for item in reversed(turn_items):
+            if isinstance(item, dict) and item.get("type") == "function_call_output":
+                name = calls.get(item.get("call_id"))
+                if name in tool_names:
+                    return name, item.get("output")
+        return None
+
+    def _route(self, query: str, handoffs: List[Any]):
+        text = query.lower()
+        by_agent = {handoff.agent_name: handoff for handoff in handoffs}
+        for agent_name, words in self.routes.items():
+            if agent_name in by_agent and any(word in text for word in words):
+                return by_agent[agent_name]
+        for agent_name, words in self.routes.items():
+            if agent_name in by_agent and not words:
+                return by_agent[agent_name]
+        return handoffs[0]
+
+    def _choose_tool(self, query: str, tools: List[Any]):
+        text = query.lower()
+        by_name = {tool.name: tool for tool in tools}
+        for name, words in self.tool_rules:
+            if name in by_name and any(word in text for word in words):
+                return by_name[name]
+        for tool in tools:
+            if "query" in getattr(tool, "params_json_schema", {}).get("properties", {}):
+                return tool
+        return tools[0]
+
+    @staticmethod
+    def _arguments(query: str, tool: Any) -> Dict[str, Any]:
+        schema = getattr(tool, "params_json_schema", {}) or {}
+        properties = schema.get("properties", {})
+        numbers = re.findall(r"\d+", query)
+        email = re.search(r"[\w.+-]+@[\w-]+\.[\w.-]+", query)
+        arguments = {}
+        for name in schema.get("required", []):
+            kind = properties.get(name, {}).get("type")
+            if kind == "integer":
+                arguments[name] = int(numbers[0]) if numbers else 1
+            elif kind == "number":
+                arguments[name] = float(numbers[0]) if numbers else 1.0
+            elif kind == "boolean":
+                arguments[name] = False
+            elif kind == "array":
+                arguments[name] = []
+            elif "email" in name and email:
+                arguments[name] = email.group(0)
+            else:
+                arguments[name] = query
+        return arguments
+
+    def _function_call(self, name: str, arguments: Dict[str, Any], query: str) -> ResponseFunctionToolCall:
+        digest = hashlib.sha256(f"{self.name}:{name}:{query}".encode()).hexdigest()[:16]
+        return ResponseFunctionToolCall(
+            id=f"fc_{digest}",
+            call_id=f"call_{digest}",
+            name=name,
+            arguments=json.dumps(arguments),
+            type="function_call",
+            status="completed",
+        )
+
+    def _message(self, text: str) -> ResponseOutputMessage:
+        digest = hashlib.sha256(text.encode()).hexdigest()[:16]
+        return ResponseOutputMessage(
+            id=f"msg_{digest}",
+            content=[ResponseOutputText(annotations=[], text=text, type="output_text")],
+            role="assistant",
+            status="completed",
+            type="message",
+        )
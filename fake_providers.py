@@ -0,0 +1,119 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from llm_provider import LLMProvider
+
+
+@dataclass
+class LatencyModel:
+    """Seeded latency distribution used by the offline stand-ins.
+
+    Parsed from specs such as "fixed:0.5", "uniform:0.2,0.8",
+    "normal:0.5,0.1" (mean, stddev) or "lognormal:-0.7,0.4" (mu, sigma).
+    """
+    distribution: str = "fixed"
+    params: List[float] = field(default_factory=lambda: [0.0])
+    seed: int = 0
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "LatencyModel":
+        distribution, _, params = spec.partition(":")
+        values = [float(value) for value in params.split(",") if value.strip()] or [0.0]
+        if distribution not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{distribution}'")
+        return cls(distribution=distribution, params=values, seed=seed)
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.distribution == "uniform":
+                value = self._random.uniform(self.params[0], self.params[1])
+            elif self.distribution == "normal":
+                value = self._random.gauss(self.params[0], self.params[1])
+            elif self.distribution == "lognormal":
+                value = self._random.lognormvariate(self.params[0], self.params[1])
+            else:
+                value = self.params[0]
+        return max(0.0, value)
+
+    def sleep(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+
+def _classify(prompt: str) -> dict:
+    """Deterministic stand-in for the planner's JSON classification"""
+    text = prompt.lower()
+    if any(word in text for word in ("ticket", "report", "customer", "statistic")):
+        task_type, domain = "analysis", "support operations"
+    elif any(word in text for word in ("latest", "current", "recent", "news", "who")):
+        task_type, domain = "generation", "general knowledge"
+    else:
+        task_type, domain = "troubleshooting", "technology"
+    return {"task_type": task_type, "prompt_strategy": "ReAct", "domain": domain, "action": "true"}
+
+
+class FakeLLMProvider(LLMProvider):
+    """Offline, deterministic stand-in for OpenAIProvider"""
+
+    def __init__(self, model: str = "gpt-3.5-turbo-0125", latency: LatencyModel = None):
+        self.model = model
+        self.latency = latency or LatencyModel()
+        self.use_real_api = False
+
+    def generate(self, prompt: str, context: str) -> str:
+        self.latency.sleep()
+        digest = hashlib.sha256(f"{prompt}\n{context}".encode()).hexdigest()[:8]
+        snippet = " ".join(context.split())[:300]
+        return f"[fake {self.model}:{digest}] Response to '{prompt}' based on context: {snippet}"
+
+    def query(self, prompt: str) -> str:
+        self.latency.sleep()
+        if '"task_type"' in prompt:
+            match = re.search(r"Prompt:\s*(.*?)\n", prompt)
+            return json.dumps(_classify(match.group(1) if match else prompt))
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return f"[fake {self.model}:{digest}] {' '.join(prompt.split())[:300]}"
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic feature-hashing embeddings.
+
+    Each token is hashed into one of `dimensions` buckets and the vector is
+    L2-normalized, so texts sharing words get similar vectors and the
+    retrieval path behaves sensibly without an embeddings API.
+    """
+
+    def __init__(self, dimensions: int = 256, latency: LatencyModel = None):
+        self.dimensions = dimensions
+        self.latency = latency or LatencyModel()
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode()).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.latency.sleep()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.latency.sleep()
+        return self._embed(text)
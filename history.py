@@ -0,0 +1,133 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+def estimate_tokens(items: List[Any]) -> int:
+    """Rough prompt size of Runner input items (about four characters per token)"""
+    return max(1, len(json.dumps(items, default=str, ensure_ascii=False)) // 4)
+
+
+def _is_user_message(item: Any) -> bool:
+    return isinstance(item, dict) and item.get("role") == "user" and item.get("type", "message") == "message"
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return " ".join(str(content or "").split())
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+@dataclass
+class HistoryManager:
+    """
+    Keeps the conversation resent to Runner.run within a token budget
+
+    The last `keep_turns` user turns are passed verbatim. In older turns every
+    tool output (ticket rows, PDF chunks, web results) is replaced by a short
+    reference naming the tool and its size. If the history still exceeds
+    `max_tokens`, the oldest turns are dropped and remembered as one line each
+    (question and final answer) in a summary message at the top.
+    """
+    keep_turns: int = 2
+    max_tokens: int = 6000
+    tool_output_chars: int = 200
+    summary_chars: int = 160
+    max_summary_turns: int = 10
+    last_stats: Dict[str, int] = field(default_factory=dict)
+
+    SUMMARY_PREFIX = "Summary of earlier turns:"
+
+    def compact(self, items: List[Any]) -> List[Any]:
+        """Bounded copy of `items` (as returned by RunResult.to_input_list)"""
+        tokens_before = estimate_tokens(items)
+        summary, turns = self._split_turns(items)
+
+        compacted = 0
+        for turn in turns[:-self.keep_turns] if self.keep_turns > 0 else turns:
+            compacted += self._compact_tool_outputs(turn)
+
+        dropped = 0
+        result = self._assemble(summary, turns)
+        while len(turns) > 1 and estimate_tokens(result) > self.max_tokens:
+            summary.append(self._summarize_turn(turns.pop(0)))
+            summary = summary[-self.max_summary_turns:]
+            dropped += 1
+            result = self._assemble(summary, turns)
+
+        self.last_stats = {
+            "items_before": len(items),
+            "items_after": len(result),
+            "tokens_before": tokens_before,
+            "tokens_after": estimate_tokens(result),
+            "compacted_outputs": compacted,
+            "dropped_turns": dropped,
+        }
+        return result
+
+    def _split_turns(self, items: List[Any]):
+        """Lines of an existing summary message, and the items grouped by user turn"""
+        summary: List[str] = []
+        turns: List[List[Any]] = []
+        for item in items:
+            if isinstance(item, dict) and item.get("role") == "system" and \
+                    _text(item.get("content")).startswith(self.SUMMARY_PREFIX):
+                summary.extend(line[2:] for line in item["content"].splitlines()[1:] if line.startswith("- "))
+            elif _is_user_message(item) or not turns:
+                turns.append([item])
+            else:
+                turns[-1].append(item)
+        return summary, turns
+
+    def _assemble(self, summary: List[str], turns: List[List[Any]]) -> List[Any]:
+        result = []
+        if summary:
+            content = "\n".join([self.SUMMARY_PREFIX] + [f"- {line}" for line in summary])
+            result.append({"role": "system", "content": content})
+        for turn in turns:
+            result.extend(turn)
+        return result
+
+    def _compact_tool_outputs(self, turn: List[Any]) -> int:
+        names = {item.get("call_id"): item.get("name") for item in turn
+                 if isinstance(item, dict) and item.get("type") == "function_call"}
+        compacted = 0
+        for index, item in enumerate(turn):
+            if not isinstance(item, dict) or item.get("type") != "function_call_output":
+                continue
+            output = item.get("output")
+            text = _text(output if isinstance(output, str) else json.dumps(output, default=str, ensure_ascii=False))
+            if len(text) <= self.tool_output_chars or text.startswith("[compacted "):
+                continue
+            name = names.get(item.get("call_id"), "tool")
+            # Same call_id, so the function_call it answers stays paired
+            turn[index] = {**item, "output": f"[compacted {name} output, {len(text)} chars] "
+                                             f"{_clip(text, self.tool_output_chars)}"}
+            compacted += 1
+        return compacted
+
+    def _summarize_turn(self, turn: List[Any]) -> str:
+        question = _text(turn[0].get("content")) if _is_user_message(turn[0]) else ""
+        answer = ""
+        for item in reversed(turn):
+            if isinstance(item, dict) and item.get("role") == "assistant":
+                answer = _text(item.get("content"))
+                break
+        return f"Q: {_clip(question, self.summary_chars)} A: {_clip(answer, self.summary_chars)}"
+
+
+def create_history_manager() -> Optional[HistoryManager]:
+    """History manager configured by HISTORY_* variables; HISTORY_MAX_TOKENS=0 disables compaction"""
+    max_tokens = int(os.getenv("HISTORY_MAX_TOKENS", "6000"))
+    if max_tokens <= 0:
+        return None
+    return HistoryManager(
+        keep_turns=int(os.getenv("HISTORY_KEEP_TURNS", "2")),
+        max_tokens=max_tokens,
+        tool_output_chars=int(os.getenv("HISTORY_TOOL_OUTPUT_CHARS", "200")),
+    )
@@ -1,10 +1,36 @@
 from abc import ABC, abstractmethod
 from openai import OpenAI
 import os
+import threading
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from cache import CompletionCache, completion_key
+from scheduler import estimate_tokens, get_scheduler
 
 load_dotenv()
 
+DEFAULT_MODEL = "gpt-3.5-turbo-0125"
+# Pipeline stage -> model tier; a tier's model is LLM_MODEL_<TIER>, falling back to LLM_MODEL
+STAGE_TIERS = {
+    "planner": "fast",
+    "router": "fast",
+    "generation": "fast",
+    "specialist": "default",
+}
+
+
+def get_tier_model(tier: str) -> str:
+    """Model name of a tier ("fast", "default" or "strong")"""
+    default = os.getenv("LLM_MODEL", DEFAULT_MODEL)
+    if tier == "default":
+        return default
+    return os.getenv(f"LLM_MODEL_{tier.upper()}") or default
+
+
+def get_stage_model(stage: str) -> str:
+    return get_tier_model(STAGE_TIERS.get(stage, "default"))
+
+
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
     
@@ -15,9 +41,15 @@ class LLMProvider(ABC):
 
 class OpenAIProvider(LLMProvider):
     """OpenAI provider implementation"""
+
+    COMPLETION_PARAMS = {"temperature": 0.1, "max_tokens": 500}
     
-    def __init__(self, model: str = "gpt-3.5-turbo-0125"):
+    def __init__(self, model: str = "gpt-3.5-turbo-0125", cache: Optional[CompletionCache] = None):
         self.model = model
+        # Exact-match completions on disk (LLM_CACHE_PATH); with LLM_CACHE_BYPASS=1 every call goes to the API
+        # and refreshes its entry
+        self.cache = cache
+        self.cache_bypass = os.getenv("LLM_CACHE_BYPASS", "0").strip().lower() in ("1", "true", "yes", "on")
         try:
             self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
             self.use_real_api = True
@@ -28,22 +60,45 @@ class OpenAIProvider(LLMProvider):
         except Exception as e:
             print(f"Error initializing OpenAI client: {e}. Using mock responses.")
             self.use_real_api = False
+
+    @staticmethod
+    def _generate_messages(prompt: str, context: str) -> List[Dict[str, str]]:
+        enhanced_prompt = f"Context: {context}\n\nUser Query: {prompt}\n\nPlease provide a helpful response based on the context."
+        return [
+            {"role": "system", "content": "You are a helpful assistant that answers questions based on provided context."},
+            {"role": "user", "content": enhanced_prompt}
+        ]
+
+    @staticmethod
+    def _query_messages(prompt: str) -> List[Dict[str, str]]:
+        return [{"role": "user", "content": prompt}]
+
+    def _cache_key(self, messages: List[Dict[str, str]]) -> str:
+        return completion_key(self.model, messages, self.COMPLETION_PARAMS)
+
+    def cached_response(self, method: str, *args) -> Optional[str]:
+        """Cached answer of generate/query for these arguments, without calling the API (None on a miss)"""
+        if self.cache is None or self.cache_bypass or not self.use_real_api:
+            return None
+        messages = self._generate_messages(*args) if method == "generate" else self._query_messages(*args)
+        return self.cache.get(self._cache_key(messages), count_miss=False)
+
+    def _complete(self, messages: List[Dict[str, str]]) -> str:
+        key = self._cache_key(messages) if self.cache is not None else None
+        if key is not None and not self.cache_bypass:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        response = self.client.chat.completions.create(model=self.model, messages=messages, **self.COMPLETION_PARAMS)
+        content = response.choices[0].message.content
+        if key is not None and content is not None:
+            self.cache.set(key, self.model, content)
+        return content
     
     def generate(self, prompt: str, context: str) -> str:
-        enhanced_prompt = f"Context: {context}\n\nUser Query: {prompt}\n\nPlease provide a helpful response based on the context."
-        
         if self.use_real_api:
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant that answers questions based on provided context."},
-                        {"role": "user", "content": enhanced_prompt}
-                    ],
-                    temperature=0.1,
-                    max_tokens=500
-                )
-                return response.choices[0].message.content
+                return self._complete(self._generate_messages(prompt, context))
             except Exception as e:
                 print(f"Error calling OpenAI API: {e}")
                 return f"Error generating response. Mock response for: {prompt}"
@@ -53,17 +108,107 @@ class OpenAIProvider(LLMProvider):
     def query(self, prompt: str) -> str:
         if self.use_real_api:
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.1,
-                    max_tokens=500
-                )
-                return response.choices[0].message.content
+                return self._complete(self._query_messages(prompt))
             except Exception as e:
                 print(f"Error calling OpenAI API: {e}")
                 return f"Error generating response. Mock response for: {prompt}"
         else:
             return f"Mock response based on context for: {prompt}"
+
+
+class ScheduledLLMProvider(LLMProvider):
+    """Runs every call of another provider through an LLMScheduler slot"""
+
+    def __init__(self, provider: LLMProvider, scheduler, max_output_tokens: int = 500):
+        self.provider = provider
+        self.scheduler = scheduler
+        self.max_output_tokens = max_output_tokens
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def _call(self, method, prompt_tokens: int, *args) -> str:
+        # A cached completion costs no API request, so it does not wait for one
+        lookup = getattr(self.provider, "cached_response", None)
+        cached = lookup(method.__name__, *args) if lookup is not None else None
+        if cached is not None:
+            return cached
+        ticket = self.scheduler.acquire(prompt_tokens + self.max_output_tokens)
+        response = None
+        try:
+            response = method(*args)
+            return response
+        finally:
+            used = prompt_tokens + estimate_tokens(response) if response is not None else None
+            self.scheduler.release(ticket, used)
+
+    def generate(self, prompt: str, context: str) -> str:
+        return self._call(self.provider.generate, estimate_tokens(prompt, context), prompt, context)
+
+    def query(self, prompt: str) -> str:
+        return self._call(self.provider.query, estimate_tokens(prompt), prompt)
+
+
+def create_llm_provider(model: str = "gpt-3.5-turbo-0125") -> LLMProvider:
+    """Build the chat provider selected by LLM_BACKEND ("openai" or "fake"), scheduled when LLM_RPM/LLM_TPM/LLM_MAX_CONCURRENCY is set"""
+    provider = _create_backend_provider(model)
+    scheduler = get_scheduler()
+    return ScheduledLLMProvider(provider, scheduler) if scheduler is not None else provider
+
+
+def _create_backend_provider(model: str) -> LLMProvider:
+    backend = os.getenv("LLM_BACKEND", "openai")
+    if backend == "fake":
+        from fake_providers import FakeLLMProvider, LatencyModel
+
+        latency = LatencyModel.parse(os.getenv("FAKE_LLM_LATENCY", "fixed:0"), seed=int(os.getenv("FAKE_LLM_SEED", "0")))
+        return FakeLLMProvider(model=model, latency=latency)
+    if backend == "openai":
+        return OpenAIProvider(model=model, cache=get_completion_cache())
+    raise ValueError(f"Unknown LLM_BACKEND '{backend}', expected 'openai' or 'fake'")
+
+
+_completion_caches: Dict[str, CompletionCache] = {}
+_completion_caches_lock = threading.Lock()
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """
+    Process-wide completion cache at LLM_CACHE_PATH (None when unset)
+    LLM_CACHE_TTL: seconds an entry stays valid (default one week, 0: forever)
+    LLM_CACHE_MAX_ENTRIES: entries kept, least recently used evicted first (default 10000)
+    """
+    path = os.getenv("LLM_CACHE_PATH")
+    if not path:
+        return None
+    with _completion_caches_lock:
+        if path not in _completion_caches:
+            ttl = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+            _completion_caches[path] = CompletionCache(path, ttl=ttl or None,
+                                                       max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")))
+        return _completion_caches[path]
+
+
+def create_agent_model(model: str = "gpt-3.5-turbo-0125"):
+    """Model for the agents SDK: the model name for OpenAI, or an offline FakeAgentModel; scheduled like create_llm_provider"""
+    scheduler = get_scheduler()
+    agent_model = _create_backend_agent_model(model)
+    if scheduler is None:
+        return agent_model
+
+    from scheduled_model import ScheduledModel
+    return ScheduledModel(agent_model, scheduler)
+
+
+def _create_backend_agent_model(model: str):
+    if os.getenv("LLM_BACKEND", "openai") != "fake":
+        return model
+
+    from agents import set_tracing_disabled
+    from fake_agent_model import FakeAgentModel
+    from fake_providers import LatencyModel
+
+    # Nothing to export traces to on an air-gapped box
+    set_tracing_disabled(True)
+    latency = LatencyModel.parse(os.getenv("FAKE_AGENT_LATENCY", "fixed:0"), seed=int(os.getenv("FAKE_LLM_SEED", "0")))
+    return FakeAgentModel(name=model, latency=latency)
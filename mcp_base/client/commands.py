@@ -0,0 +1,395 @@
+"""
+Deterministic command layer for structured helpdesk requests
+
+Requests such as "Make a report regarding all tickets" or "ticket
+APL-2024-004 status" need one tool call and no reasoning, yet the agent path
+spends two or three LLM turns (router, specialist, synthesis) on them. The
+command layer recognizes these intents with whole-request templates, calls the tool directly
+over a persistent McpClient session and formats the result with a template.
+Anything it does not recognize, or any request that would write, falls back
+to the agent path.
+
+    FAST_PATH=0                 # disable (every request goes through the agents)
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from mcp_base.client.mcp_client import McpClient
+
+SERVER_SCRIPT = "mcp_base/server/server_support_apple.py"
+
+TICKET_NUMBER_PATTERN = re.compile(r"\bAPL-\d{4}-\d{3,}\b", re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+# Requests that change data always take the agent path
+WRITE_PATTERN = re.compile(
+    r"\b(create|cri(e|ar|a)|add|adicion(e|ar)|update|atualiz(e|ar)|change|alter(e|ar)|set|mark|marc(ar|ue)|"
+    r"assign|atribu(a|ir)|close|fech(e|ar)|resolve|reopen|reabr(a|ir)|open (a|an|new)|abr(a|ir)|"
+    r"comment|coment(e|ar)|delete|exclu(a|ir)|remove|escalate|escal(e|ar)|register|cadastr(e|ar))\b", re.IGNORECASE)
+STATUS_WORDS = {
+    "open": "Open", "abertos": "Open", "aberto": "Open",
+    "in progress": "In Progress", "em andamento": "In Progress",
+    "pending": "Pending", "pendentes": "Pending", "pendente": "Pending",
+    "resolved": "Resolved", "resolvidos": "Resolved", "resolvido": "Resolved",
+    "closed": "Closed", "fechados": "Closed", "fechado": "Closed",
+}
+TICKET_DETAIL_COLUMNS = ["ticket_number", "subject", "status", "priority", "customer_name", "agent_name",
+                         "category_name", "created_at", "updated_at", "resolution"]
+TICKET_LIST_COLUMNS = ["ticket_number", "subject", "status", "priority", "created_at"]
+
+
+@dataclass
+class Command:
+    """A recognized intent and the tool call that answers it"""
+    intent: str
+    tool: str
+    arguments: Dict[str, Any]
+    formatter: Callable[[Any, "Command"], str]
+
+
+# FORMATTERS
+
+def _counts(title: str, counts: Dict[str, int]) -> List[str]:
+    lines = [f"{title}:"]
+    for key, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        lines.append(f"  - {key}: {count}")
+    return lines
+
+
+def format_statistics(stats: Dict[str, Any], command: Command) -> str:
+    total = sum(stats.get("by_status", {}).values())
+    lines = [f"Ticket report ({total} tickets)"]
+    lines += _counts("By status", stats.get("by_status", {}))
+    lines += _counts("By priority", stats.get("by_priority", {}))
+    lines += _counts("By category", stats.get("by_category", {}))
+    lines.append(f"Resolution rate: {stats.get('resolution_rate', 0):.1f}%")
+    return "\n".join(lines)
+
+
+def format_trends(trends: List[Dict[str, Any]], command: Command) -> str:
+    period = command.arguments["period"]
+    if not trends:
+        return f"No ticket activity per {period} yet."
+    lines = [f"Tickets per {period}:"]
+    for row in trends:
+        values = ", ".join(f"{key} {value}" for key, value in row.items() if key not in ("bucket", "period"))
+        lines.append(f"  - {row.get('bucket', '?')}: {values}")
+    return "\n".join(lines)
+
+
+def format_ticket(page: Dict[str, Any], command: Command) -> str:
+    tickets = page.get("tickets") or []
+    if not tickets:
+        return f"No ticket found with number {command.arguments['ticket_number']}."
+    t = tickets[0]
+    lines = [
+        f"Ticket {t['ticket_number']}: {t['subject']}",
+        f"Status: {t['status']} | Priority: {t['priority']}",
+        f"Customer: {t.get('customer_name') or '-'} | Agent: {t.get('agent_name') or 'unassigned'}",
+        f"Category: {t.get('category_name') or '-'}",
+        f"Created: {t['created_at']} | Updated: {t.get('updated_at') or '-'}",
+    ]
+    if t.get("resolution"):
+        lines.append(f"Resolution: {t['resolution']}")
+    return "\n".join(lines)
+
+
+def format_ticket_list(page: Dict[str, Any], command: Command) -> str:
+    tickets = page.get("tickets") or []
+    status = command.arguments["status"]
+    if not tickets:
+        return f"No {status} tickets."
+    more = " (more available)" if page.get("next_cursor") else ""
+    lines = [f"{len(tickets)} {status} tickets{more}:"]
+    for t in tickets:
+        lines.append(f"  - {t['ticket_number']} [{t['priority']}] {t['subject']} ({t['created_at']})")
+    return "\n".join(lines)
+
+
+def format_customer(customer: Optional[Dict[str, Any]], command: Command) -> str:
+    if not customer:
+        return f"No customer found with email {command.arguments['email']}."
+    return "\n".join([
+        f"Customer #{customer['id']}: {customer['first_name']} {customer['last_name']}",
+        f"Email: {customer['email']} | Phone: {customer.get('phone') or '-'} | Apple ID: {customer.get('apple_id') or '-'}",
+        f"Customer since: {customer.get('created_at') or '-'}",
+    ])
+
+
+def format_workload(workload: Dict[str, Any], command: Command) -> str:
+    agent = workload.get("agent")
+    if not agent:
+        return f"No agent found with id {command.arguments['agent_id']}."
+    lines = [f"Agent {agent['first_name']} {agent['last_name']} ({agent.get('specialization') or 'general'}): "
+             f"{workload.get('total_active_tickets', 0)} active tickets"]
+    for row in workload.get("workload", []):
+        lines.append(f"  - {row['status']} / {row['priority']}: {row['count']}")
+    return "\n".join(lines)
+
+
+# INTENT RECOGNITION
+#
+# Each intent is a template that must match the whole request, so anything it
+# cannot express (an agent, customer, priority or product filter, "my", a
+# count) makes the request miss every template and go to the agents.
+
+_STATUS = "|".join(sorted(STATUS_WORDS, key=len, reverse=True))
+_PREFIX = (r"(?:(?:please|pls|por favor)\s+)?"
+           r"(?:(?:can you|could you|pode|poderia)\s+)?"
+           r"(?:(?:show|list|get|give|display|fetch|make|generate|what is|what's|what are|"
+           r"mostre|me mostre|liste|exiba|traga|gere|fa[çc]a|qual [ée]|quais s[ãa]o)\s+(?:me\s+)?)?"
+           r"(?:(?:the|all|all the|a|an|o|a|os|as|um|uma|todos os|todas as)\s+)?")
+_TICKETS = r"(?:tickets?|chamados?)"
+_REGARDING = r"(?:of|on|for|about|regarding|de|do|dos|das|sobre)"
+
+TEMPLATES = [
+    ("ticket_lookup", re.compile(
+        rf"{_PREFIX}(?:(?:status|details|detalhes|info)\s+(?:of|for|do|da|de)\s+)?(?:(?:ticket|chamado)\s+)?#?"
+        rf"(?P<ticket>apl-\d{{4}}-\d{{3,}})(?:\s+(?:status|details|detalhes|info))?")),
+    ("ticket_trends", re.compile(
+        rf"{_PREFIX}(?:(?P<weekly>weekly|daily)\s+)?(?:(?:ticket|tickets|chamados?)\s+)?"
+        rf"(?:trends?|tend[êe]ncias?|evolu[çc][ãa]o)(?:\s+{_REGARDING}\s+(?:all\s+|todos os\s+)?{_TICKETS})?"
+        rf"(?:\s+(?:per|by|por)\s+(?P<period>day|week|dia|semana))?")),
+    ("ticket_trends", re.compile(
+        rf"{_PREFIX}{_TICKETS}\s+(?:per|by|por)\s+(?P<period>day|week|dia|semana)")),
+    ("ticket_statistics", re.compile(
+        rf"{_PREFIX}(?:{_TICKETS}\s+(?:report|statistics|stats|summary)"
+        rf"|(?:report|relat[óo]rio|statistics|stats|estat[íi]sticas|summary|resumo)\s+{_REGARDING}\s+"
+        rf"(?:all\s+|all the\s+|the\s+|todos os\s+|os\s+)?{_TICKETS})")),
+    ("agent_workload", re.compile(
+        rf"{_PREFIX}(?:(?:workload|carga(?: de trabalho)?)\s+(?:of|for|do|da|de)\s+(?:agent|agente)\s*#?\s*(?P<agent>\d+)"
+        rf"|(?:agent|agente)\s*#?\s*(?P<agent2>\d+)(?:'s)?\s+workload)")),
+    ("customer_lookup", re.compile(
+        rf"{_PREFIX}(?:(?:customer|client|cliente|user|usu[áa]rio)\s+(?:(?:profile|details|info|information|perfil|dados)\s+)?"
+        rf"|(?:profile|details|info|information|perfil|dados)\s+(?:of|for|do|da|de)\s+(?:customer|client|cliente|user|usu[áa]rio)\s+)"
+        rf"(?:(?:for|of|with email|do|da|de|com e-?mail)\s+)?(?P<email>[\w.+-]+@[\w-]+\.[\w.-]+)")),
+    ("ticket_list", re.compile(
+        rf"{_PREFIX}(?:(?P<status>{_STATUS})\s+{_TICKETS}"
+        rf"|{_TICKETS}\s+(?:(?:that are|with status|em status|que est[ãa]o)\s+)?(?P<status2>{_STATUS}))")),
+]
+
+
+def _normalize(query: str) -> str:
+    text = " ".join(query.lower().split())
+    return text.strip(" ?!.;:")
+
+
+def match_command(query: str) -> Optional[Command]:
+    """Command for a structured read-only request, or None for the agent path"""
+    text = _normalize(query)
+    if WRITE_PATTERN.search(text):
+        return None
+
+    for intent, template in TEMPLATES:
+        match = template.fullmatch(text)
+        if match is None:
+            continue
+        slots = match.groupdict()
+        if intent == "ticket_lookup":
+            return Command(intent, "search_tickets_page",
+                           {"ticket_number": slots["ticket"].upper(), "page_size": 1, "columns": TICKET_DETAIL_COLUMNS},
+                           format_ticket)
+        if intent == "ticket_trends":
+            weekly = slots.get("weekly") == "weekly" or slots.get("period") in ("week", "semana")
+            return Command(intent, "get_ticket_trends", {"period": "week" if weekly else "day", "limit": 30},
+                           format_trends)
+        if intent == "ticket_statistics":
+            return Command(intent, "get_ticket_statistics", {}, format_statistics)
+        if intent == "agent_workload":
+            return Command(intent, "get_agent_workload", {"agent_id": int(slots["agent"] or slots["agent2"])},
+                           format_workload)
+        if intent == "customer_lookup":
+            # The original spelling: emails are matched on the lowercased text
+            email = EMAIL_PATTERN.search(query)
+            return Command(intent, "get_customer_by_email", {"email": email.group(0) if email else slots["email"]},
+                           format_customer)
+        if intent == "ticket_list":
+            return Command(intent, "search_tickets_page",
+                           {"status": STATUS_WORDS[slots["status"] or slots["status2"]], "page_size": 20,
+                            "columns": TICKET_LIST_COLUMNS},
+                           format_ticket_list)
+    return None
+
+
+def tool_payload(result) -> Any:
+    """Python value of a CallToolResult (structured content when present, else the JSON text)"""
+    if getattr(result, "isError", False):
+        raise RuntimeError(" ".join(getattr(part, "text", "") for part in result.content) or "tool error")
+    structured = getattr(result, "structuredContent", None)
+    if structured is not None:
+        # FastMCP wraps non-object return values as {"result": value}
+        return structured["result"] if set(structured) == {"result"} else structured
+    texts = [part.text for part in result.content if getattr(part, "type", None) == "text"]
+    if not texts:
+        return None
+    try:
+        values = [json.loads(text) for text in texts]
+    except ValueError:
+        return "\n".join(texts)
+    # FastMCP sends each element of a list result as its own content part
+    return values[0] if len(values) == 1 and not isinstance(values[0], list) else values
+
+
+# DIRECT TOOL CLIENT
+
+class DirectToolClient:
+    """McpClient kept connected on a background loop, so tools can be called from synchronous code"""
+
+    def __init__(self, url: Optional[str] = None, timeout: float = 30.0):
+        self.url = url
+        self.timeout = timeout
+        self._client: Optional[McpClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._owner: Optional[asyncio.Task] = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-direct-tools", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    async def _hold(self, ready: asyncio.Future, closing: asyncio.Event):
+        # McpClient's exit stack must be closed by the task that opened it
+        client = McpClient()
+        try:
+            if self.url:
+                if self.url.rstrip("/").endswith("/sse"):
+                    await client.initialize_with_sse(self.url)
+                else:
+                    await client.initialize_with_streamable_http(self.url)
+            else:
+                # Forward the environment so backend selection reaches the server. This
+                # server outlives the per-query agent-path servers whose writes it never
+                # sees, so it must not cache results across them
+                env = dict(os.environ, HELPDESK_RESULT_CACHE_SIZE="0")
+                await client.initialize_with_stdio("mcp", ["run", SERVER_SCRIPT], env=env)
+        except Exception as e:
+            ready.set_exception(e)
+            try:
+                await client.cleanup()
+            except Exception:
+                pass
+            return
+        ready.set_result(client)
+        await closing.wait()
+        await client.cleanup()
+
+    async def _connect(self) -> McpClient:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._client is None:
+                ready = asyncio.get_running_loop().create_future()
+                self._closing = asyncio.Event()
+                self._owner = asyncio.create_task(self._hold(ready, self._closing))
+                self._client = await ready
+        return self._client
+
+    async def _disconnect(self):
+        closing, owner = self._closing, self._owner
+        self._client, self._closing, self._owner = None, None, None
+        if closing is not None:
+            closing.set()
+            try:
+                await owner
+            except Exception as e:
+                print(f"Error closing MCP client: {e}")
+
+    async def _call(self, tool: str, arguments: Dict[str, Any]):
+        client = await self._connect()
+        try:
+            return await asyncio.wait_for(client.call_tool(tool, arguments), self.timeout)
+        except Exception:
+            # Start from a fresh session next time rather than reuse a broken one
+            await self._disconnect()
+            raise
+
+    def call_tool(self, tool: str, arguments: Dict[str, Any]):
+        """Call an MCP tool and wait for its CallToolResult"""
+        return asyncio.run_coroutine_threadsafe(self._call(tool, arguments), self._ensure_loop()).result()
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._disconnect(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+@dataclass
+class CommandLayer:
+    """Answers recognized requests with one direct tool call; None means "use the agents" """
+    client: Any
+    handled: int = 0
+    fallbacks: int = 0
+    errors: int = 0
+    by_intent: Dict[str, int] = field(default_factory=dict)
+
+    def try_handle(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            {"intent", "tool", "arguments", "response", "seconds"} when the request was answered, else None
+        """
+        command = match_command(query)
+        if command is None:
+            self.fallbacks += 1
+            return None
+        start = time.perf_counter()
+        try:
+            payload = tool_payload(self.client.call_tool(command.tool, command.arguments))
+            response = command.formatter(payload, command)
+        except Exception as e:
+            print(f"Fast path {command.intent} failed, using the agents: {e}")
+            self.errors += 1
+            return None
+        self.handled += 1
+        self.by_intent[command.intent] = self.by_intent.get(command.intent, 0) + 1
+        return {"intent": command.intent, "tool": command.tool, "arguments": command.arguments,
+                "response": response, "seconds": time.perf_counter() - start}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"handled": self.handled, "fallbacks": self.fallbacks, "errors": self.errors,
+                "by_intent": dict(self.by_intent)}
+
+
+_command_layer: Optional[CommandLayer] = None
+_command_layer_lock = threading.Lock()
+
+
+def get_command_layer() -> Optional[CommandLayer]:
+    """Process-wide command layer (one persistent MCP client), or None when FAST_PATH=0"""
+    global _command_layer
+    if os.getenv("FAST_PATH", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _command_layer_lock:
+        if _command_layer is None:
+            _command_layer = CommandLayer(DirectToolClient(os.getenv("MCP_SERVER_URL")))
+        return _command_layer
+
+
+def close_command_layer():
+    global _command_layer
+    with _command_layer_lock:
+        layer, _command_layer = _command_layer, None
+    if layer is not None:
+        layer.client.close()
+
+
+# Stop the persistent server process with the interpreter rather than leaving it to the loop thread
+atexit.register(close_command_layer)
@@ -10,10 +10,11 @@ class McpClient:
         self.session: ClientSession = None                
         self.exit_stack = AsyncExitStack()               
 
-    async def initialize_with_stdio(self, command: str, args: list):
+    async def initialize_with_stdio(self, command: str, args: list, env: dict = None):
         self.server_params = StdioServerParameters(
             command=command,
             args=args,
+            env=env,
         )
 
         self.client = await self.exit_stack.enter_async_context(stdio_client(self.server_params))
@@ -31,6 +32,16 @@ class McpClient:
 
         await self.session.initialize()
 
+    async def initialize_with_streamable_http(self, url: str):
+        from mcp.client.streamable_http import streamablehttp_client
+
+        self.client = await self.exit_stack.enter_async_context(streamablehttp_client(url))
+        read, write, _ = self.client
+
+        self.session = await self.exit_stack.enter_async_context(ClientSession(read, write))
+
+        await self.session.initialize()
+
     async def get_tools(self) -> list[Tool]:
         response = await self.session.list_tools()
         return response.tools
@@ -0,0 +1,295 @@
+"""
+Persistent connection to a network MCP server, shared by aggregator workers
+
+In stdio mode every query spawns its own server process, with its own
+database connections and vector index. When MCP_SERVER_URL points at a
+long-lived server (MCP_TRANSPORT=sse or streamable-http on the server side),
+every AggregatorAgent in the process shares a small pool of persistent
+sessions to it instead: they live on a background event loop, are opened on
+first use, reused by every query and reopened after a connection failure.
+
+    MCP_SERVER_URL=http://127.0.0.1:4200/mcp    # streamable HTTP (/sse selects SSE)
+    MCP_SERVER_TRANSPORT=streamable-http        # optional, overrides the guess from the URL
+    MCP_CLIENT_CONCURRENCY=8                    # agent runs in flight across the sessions
+    MCP_CLIENT_SESSIONS=4                       # persistent sessions per process
+    MCP_CLIENT_TIMEOUT=30                       # seconds per MCP request
+"""
+
+import asyncio
+import atexit
+import contextlib
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+NETWORK_TRANSPORTS = ("sse", "streamable-http")
+SERVER_SCRIPT = "mcp_base/server/server_support_apple.py"
+
+
+def get_transport(url: str, transport: Optional[str] = None) -> str:
+    transport = (transport or os.getenv("MCP_SERVER_TRANSPORT") or "").strip().lower()
+    if not transport:
+        transport = "sse" if url.rstrip("/").endswith("/sse") else "streamable-http"
+    if transport not in NETWORK_TRANSPORTS:
+        raise ValueError(f"Unknown MCP transport: {transport}, expected one of {', '.join(NETWORK_TRANSPORTS)}")
+    return transport
+
+
+def create_network_server(url: str, transport: Optional[str] = None, cache_tools_list: bool = True,
+                          timeout: Optional[float] = None):
+    """agents SDK server object for a network MCP server (not connected yet)"""
+    from agents.mcp import MCPServerSse, MCPServerStreamableHttp
+
+    timeout = timeout if timeout is not None else float(os.getenv("MCP_CLIENT_TIMEOUT", "30"))
+    if get_transport(url, transport) == "sse":
+        return MCPServerSse(params={"url": url}, cache_tools_list=cache_tools_list,
+                            client_session_timeout_seconds=timeout)
+    return MCPServerStreamableHttp(params={"url": url}, cache_tools_list=cache_tools_list,
+                                   client_session_timeout_seconds=timeout)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_url(transport: str, port: int) -> str:
+    return f"http://127.0.0.1:{port}/{'sse' if transport == 'sse' else 'mcp'}"
+
+
+@contextlib.contextmanager
+def local_network_server(transport: str, port: int, timeout: float = 60.0, env: Optional[Dict[str, str]] = None):
+    """Run the support server on 127.0.0.1:`port` until the block exits"""
+    env = dict(env if env is not None else os.environ, MCP_TRANSPORT=transport, MCP_HOST="127.0.0.1",
+               MCP_PORT=str(port))
+    env.pop("MCP_SERVER_URL", None)
+    # A file rather than a pipe: nothing drains the server's log while it runs
+    log = tempfile.TemporaryFile(mode="w+")
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT], env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            if process.poll() is not None:
+                log.seek(0)
+                last_line = (log.read().strip().splitlines() or ["no output"])[-1]
+                raise RuntimeError(f"MCP server exited: {last_line}")
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"MCP server did not listen on port {port} within {timeout:.0f}s")
+            time.sleep(0.2)
+        yield process
+    finally:
+        # SIGINT lets the server shut down gracefully and run its atexit handlers
+        # (buffered KB view counts); escalate only if it does not exit
+        process.send_signal(signal.SIGINT)
+        with contextlib.suppress(subprocess.TimeoutExpired):
+            process.wait(timeout=10)
+        if process.poll() is None:
+            process.terminate()
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                process.wait(timeout=5)
+        if process.poll() is None:
+            process.kill()
+        log.close()
+
+
+def _connection_errors() -> Tuple[type, ...]:
+    import anyio
+    import httpx
+
+    return (ConnectionError, OSError, anyio.ClosedResourceError, anyio.BrokenResourceError,
+            anyio.EndOfStream, httpx.TransportError)
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """True when `error`, or an exception it was raised from, is a lost connection"""
+    from mcp.types import CONNECTION_CLOSED
+
+    errors = _connection_errors()
+    seen = set()
+    while error is not None and id(error) not in seen:
+        # The MCP session reports a dropped transport as an McpError with this code
+        if isinstance(error, errors) or getattr(getattr(error, "error", None), "code", None) == CONNECTION_CLOSED:
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class _Connection:
+    """One connected server object, owned by the task that opened it"""
+
+    def __init__(self, server):
+        self.server = server
+        self.in_flight = 0
+        self.closing = asyncio.Event()
+        self.owner: Optional[asyncio.Task] = None
+
+
+class SharedMcpSession:
+    """
+    Persistent MCP sessions on a background loop, usable from any thread
+
+    The agents SDK sends one request at a time per streamable HTTP session, so
+    up to `pool_size` sessions are opened (lazily, when every open one is busy)
+    and each run goes to the least busy one; `max_concurrency` caps the runs in
+    flight across all of them.
+    """
+
+    def __init__(self, url: str, transport: Optional[str] = None, max_concurrency: int = 8, pool_size: int = 4,
+                 timeout: Optional[float] = None):
+        self.url = url
+        self.transport = get_transport(url, transport)
+        self.max_concurrency = max_concurrency
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self._connections: List[_Connection] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self.connects = 0
+        self.calls = 0
+        self.failures = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="mcp-shared-session", daemon=True)
+                self._thread.start()
+                self._loop = loop
+        return self._loop
+
+    async def _acquire(self) -> _Connection:
+        """Least busy open connection, opening another when all are busy and the pool has room"""
+        async with self._connect_lock:
+            idle = [connection for connection in self._connections if connection.in_flight == 0]
+            if idle:
+                connection = idle[0]
+            elif len(self._connections) < self.pool_size:
+                connection = await self._open()
+                self._connections.append(connection)
+            else:
+                connection = min(self._connections, key=lambda connection: connection.in_flight)
+            connection.in_flight += 1
+            return connection
+
+    async def _open(self) -> _Connection:
+        ready = asyncio.get_running_loop().create_future()
+        connection = _Connection(None)
+        connection.owner = asyncio.create_task(self._hold(connection, ready))
+        await ready
+        return connection
+
+    async def _hold(self, connection: _Connection, ready: asyncio.Future):
+        # The transport's task group must be entered and exited by the same task,
+        # so one task owns each connection for its whole life
+        server = create_network_server(self.url, self.transport, timeout=self.timeout)
+        try:
+            await server.connect()
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        connection.server = server
+        self.connects += 1
+        print(f"Connected to MCP server at {self.url} ({self.transport})")
+        ready.set_result(None)
+        await connection.closing.wait()
+        try:
+            await server.cleanup()
+        except Exception as e:
+            print(f"Error closing MCP session: {e}")
+
+    async def _close(self, connection: _Connection):
+        if connection in self._connections:
+            self._connections.remove(connection)
+        connection.closing.set()
+        if connection.owner is not None:
+            await connection.owner
+
+    async def _run(self, function: Callable[[Any], Awaitable[T]]) -> T:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._connect_lock = asyncio.Lock()
+        async with self._semaphore:
+            connection = await self._acquire()
+            self.calls += 1
+            try:
+                return await function(connection.server)
+            except Exception as e:
+                if is_connection_error(e):
+                    # Reopened on demand; the failed run is not retried, it may have written
+                    self.failures += 1
+                    await self._close(connection)
+                raise
+            finally:
+                connection.in_flight -= 1
+
+    def run(self, function: Callable[[Any], Awaitable[T]]) -> T:
+        """
+        Run `function(server)` on the sessions' loop and wait for its result
+        Args:
+            function: Coroutine function taking a connected agents SDK MCP server
+        """
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._run(function), loop).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"url": self.url, "transport": self.transport, "open_sessions": len(self._connections),
+                "connects": self.connects, "calls": self.calls, "failures": self.failures}
+
+    async def _close_all(self):
+        for connection in list(self._connections):
+            await self._close(connection)
+
+    def close(self):
+        """Close every session and stop the loop"""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_all(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+_sessions: Dict[Tuple[str, str], SharedMcpSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_shared_session(url: Optional[str] = None) -> Optional[SharedMcpSession]:
+    """Process-wide session for MCP_SERVER_URL (or `url`); None in stdio mode"""
+    url = url or os.getenv("MCP_SERVER_URL")
+    if not url:
+        return None
+    key = (url, get_transport(url))
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = SharedMcpSession(url, key[1], max_concurrency=int(os.getenv("MCP_CLIENT_CONCURRENCY", "8")),
+                                              pool_size=int(os.getenv("MCP_CLIENT_SESSIONS", "4")))
+        return _sessions[key]
+
+
+def close_shared_sessions():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+# Close the sessions cleanly instead of leaving their tasks to die with the loop thread
+atexit.register(close_shared_sessions)
@@ -6,21 +6,377 @@ Generates SQLite database and provides utility functions for ITSM operations
 
 import sqlite3
 import os
+import re
+import base64
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 import json
 
+HELPDESK_SCHEMA_SQL = """
+-- Apple Authorized Support Help Desk Database Schema
+-- SQLite Database for Agentic RAG POC
+
+-- Enable foreign key constraints
+PRAGMA foreign_keys = ON;
+
+-- Categories for organizing tickets
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Product lines and models
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_line VARCHAR(50) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    release_year INTEGER,
+    is_active BOOLEAN DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Customer information
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name VARCHAR(100) NOT NULL,
+    last_name VARCHAR(100) NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    phone VARCHAR(20),
+    apple_id VARCHAR(255),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Support agents
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name VARCHAR(100) NOT NULL,
+    last_name VARCHAR(100) NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    employee_id VARCHAR(50) UNIQUE NOT NULL,
+    specialization VARCHAR(100),
+    is_active BOOLEAN DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Support tickets/cases
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_number VARCHAR(20) UNIQUE NOT NULL,
+    customer_id INTEGER NOT NULL,
+    agent_id INTEGER,
+    category_id INTEGER NOT NULL,
+    product_id INTEGER,
+    subject VARCHAR(255) NOT NULL,
+    description TEXT NOT NULL,
+    priority VARCHAR(20) DEFAULT 'Medium',
+    status VARCHAR(20) DEFAULT 'Open',
+    serial_number VARCHAR(100),
+    ios_version VARCHAR(20),
+    resolution TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    resolved_at DATETIME,
+    closed_at DATETIME,
+    FOREIGN KEY (customer_id) REFERENCES customers(id),
+    FOREIGN KEY (agent_id) REFERENCES agents(id),
+    FOREIGN KEY (category_id) REFERENCES categories(id),
+    FOREIGN KEY (product_id) REFERENCES products(id)
+);
+
+-- Ticket comments/notes
+CREATE TABLE IF NOT EXISTS ticket_comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id INTEGER NOT NULL,
+    agent_id INTEGER,
+    comment_type VARCHAR(20) DEFAULT 'note',
+    content TEXT NOT NULL,
+    is_public BOOLEAN DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (ticket_id) REFERENCES tickets(id),
+    FOREIGN KEY (agent_id) REFERENCES agents(id)
+);
+
+-- Knowledge base articles
+CREATE TABLE IF NOT EXISTS knowledge_base (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR(255) NOT NULL,
+    content TEXT NOT NULL,
+    category_id INTEGER,
+    product_id INTEGER,
+    tags VARCHAR(500),
+    is_published BOOLEAN DEFAULT 1,
+    view_count INTEGER DEFAULT 0,
+    created_by INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (category_id) REFERENCES categories(id),
+    FOREIGN KEY (product_id) REFERENCES products(id),
+    FOREIGN KEY (created_by) REFERENCES agents(id)
+);
+
+-- SLA definitions
+CREATE TABLE IF NOT EXISTS sla_policies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    priority VARCHAR(20) NOT NULL,
+    response_time_hours INTEGER NOT NULL,
+    resolution_time_hours INTEGER NOT NULL,
+    is_active BOOLEAN DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_tickets_customer ON tickets(customer_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_agent ON tickets(agent_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
+CREATE INDEX IF NOT EXISTS idx_tickets_priority ON tickets(priority);
+CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at);
+CREATE INDEX IF NOT EXISTS idx_ticket_comments_ticket ON ticket_comments(ticket_id);
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_category ON knowledge_base(category_id);
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_product ON knowledge_base(product_id);
+
+-- Create a view for ticket summary
+CREATE VIEW IF NOT EXISTS ticket_summary AS
+SELECT 
+    t.id,
+    t.ticket_number,
+    c.first_name || ' ' || c.last_name AS customer_name,
+    c.email AS customer_email,
+    a.first_name || ' ' || a.last_name AS agent_name,
+    cat.name AS category,
+    p.product_line || ' ' || p.model AS product,
+    t.subject,
+    t.priority,
+    t.status,
+    t.created_at,
+    t.updated_at
+FROM tickets t
+LEFT JOIN customers c ON t.customer_id = c.id
+LEFT JOIN agents a ON t.agent_id = a.id
+LEFT JOIN categories cat ON t.category_id = cat.id
+LEFT JOIN products p ON t.product_id = p.id;
+"""
+
+# Materialized ticket statistics, kept up to date by triggers on `tickets`.
+# Counters hold one row per (dimension, key); NULL keys are stored as '' since
+# they are part of the primary key. Buckets hold daily/weekly trend counters.
+TICKET_STATS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS ticket_stats_counters (
+    dimension VARCHAR(20) NOT NULL,
+    stat_key VARCHAR(100) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, stat_key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS ticket_stats_buckets (
+    period VARCHAR(10) NOT NULL,
+    bucket VARCHAR(20) NOT NULL,
+    metric VARCHAR(20) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, bucket, metric)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_ticket_stats_insert
+AFTER INSERT ON tickets
+BEGIN
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('status', IFNULL(NEW.status, ''), 1)
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('priority', IFNULL(NEW.priority, ''), 1)
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('category', CAST(NEW.category_id AS TEXT), 1)
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('total', '', 1)
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('resolved', '', IFNULL(NEW.status = 'Resolved' AND NEW.resolved_at IS NOT NULL, 0))
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ticket_stats_update
+AFTER UPDATE OF status, priority, category_id, resolved_at ON tickets
+BEGIN
+    UPDATE ticket_stats_counters SET count = count - 1
+    WHERE dimension = 'status' AND stat_key = IFNULL(OLD.status, '');
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('status', IFNULL(NEW.status, ''), 1)
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + 1;
+    UPDATE ticket_stats_counters SET count = count - 1
+    WHERE dimension = 'priority' AND stat_key = IFNULL(OLD.priority, '');
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('priority', IFNULL(NEW.priority, ''), 1)
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + 1;
+    UPDATE ticket_stats_counters SET count = count - 1
+    WHERE dimension = 'category' AND stat_key = CAST(OLD.category_id AS TEXT);
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('category', CAST(NEW.category_id AS TEXT), 1)
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+    VALUES ('resolved', '', IFNULL(NEW.status = 'Resolved' AND NEW.resolved_at IS NOT NULL, 0)
+                          - IFNULL(OLD.status = 'Resolved' AND OLD.resolved_at IS NOT NULL, 0))
+    ON CONFLICT (dimension, stat_key) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ticket_stats_delete
+AFTER DELETE ON tickets
+BEGIN
+    UPDATE ticket_stats_counters SET count = count - 1
+    WHERE (dimension = 'status' AND stat_key = IFNULL(OLD.status, ''))
+       OR (dimension = 'priority' AND stat_key = IFNULL(OLD.priority, ''))
+       OR (dimension = 'category' AND stat_key = CAST(OLD.category_id AS TEXT))
+       OR (dimension = 'total' AND stat_key = '');
+    UPDATE ticket_stats_counters
+    SET count = count - IFNULL(OLD.status = 'Resolved' AND OLD.resolved_at IS NOT NULL, 0)
+    WHERE dimension = 'resolved' AND stat_key = '';
+END;
+
+-- Trend buckets: tickets created/resolved/closed per day and per week
+CREATE TRIGGER IF NOT EXISTS trg_ticket_buckets_created
+AFTER INSERT ON tickets
+WHEN NEW.created_at IS NOT NULL
+BEGIN
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('day', date(NEW.created_at), 'created', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('week', strftime('%Y-W%W', NEW.created_at), 'created', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ticket_buckets_resolved_insert
+AFTER INSERT ON tickets
+WHEN NEW.resolved_at IS NOT NULL
+BEGIN
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('day', date(NEW.resolved_at), 'resolved', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('week', strftime('%Y-W%W', NEW.resolved_at), 'resolved', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ticket_buckets_resolved
+AFTER UPDATE OF resolved_at ON tickets
+WHEN OLD.resolved_at IS NULL AND NEW.resolved_at IS NOT NULL
+BEGIN
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('day', date(NEW.resolved_at), 'resolved', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('week', strftime('%Y-W%W', NEW.resolved_at), 'resolved', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ticket_buckets_closed_insert
+AFTER INSERT ON tickets
+WHEN NEW.closed_at IS NOT NULL
+BEGIN
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('day', date(NEW.closed_at), 'closed', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('week', strftime('%Y-W%W', NEW.closed_at), 'closed', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ticket_buckets_closed
+AFTER UPDATE OF closed_at ON tickets
+WHEN OLD.closed_at IS NULL AND NEW.closed_at IS NOT NULL
+BEGIN
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('day', date(NEW.closed_at), 'closed', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+    INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+    VALUES ('week', strftime('%Y-W%W', NEW.closed_at), 'closed', 1)
+    ON CONFLICT (period, bucket, metric) DO UPDATE SET count = count + 1;
+END;
+"""
+
+# Columns selectable through search_tickets projections: name -> (SQL expression, table alias)
+TICKET_SEARCH_COLUMNS = {
+    'id': ('t.id', 't'),
+    'ticket_number': ('t.ticket_number', 't'),
+    'customer_id': ('t.customer_id', 't'),
+    'agent_id': ('t.agent_id', 't'),
+    'category_id': ('t.category_id', 't'),
+    'product_id': ('t.product_id', 't'),
+    'subject': ('t.subject', 't'),
+    'description': ('t.description', 't'),
+    'priority': ('t.priority', 't'),
+    'status': ('t.status', 't'),
+    'serial_number': ('t.serial_number', 't'),
+    'ios_version': ('t.ios_version', 't'),
+    'resolution': ('t.resolution', 't'),
+    'created_at': ('t.created_at', 't'),
+    'updated_at': ('t.updated_at', 't'),
+    'resolved_at': ('t.resolved_at', 't'),
+    'closed_at': ('t.closed_at', 't'),
+    'customer_name': ("c.first_name || ' ' || c.last_name", 'c'),
+    'customer_email': ('c.email', 'c'),
+    'agent_name': ("a.first_name || ' ' || a.last_name", 'a'),
+    'category_name': ('cat.name', 'cat'),
+    'product_line': ('p.product_line', 'p'),
+    'model': ('p.model', 'p'),
+}
+
+TICKET_SEARCH_JOINS = {
+    'c': "LEFT JOIN customers c ON t.customer_id = c.id",
+    'a': "LEFT JOIN agents a ON t.agent_id = a.id",
+    'cat': "LEFT JOIN categories cat ON t.category_id = cat.id",
+    'p': "LEFT JOIN products p ON t.product_id = p.id",
+}
+
+# Composite/covering indexes for the hot query paths, applied by ensure_indexes()
+PERFORMANCE_INDEXES = {
+    # search_tickets filters + (created_at, id) ordering
+    'idx_tickets_status_created': "CREATE INDEX IF NOT EXISTS idx_tickets_status_created ON tickets(status, created_at)",
+    'idx_tickets_priority_created': "CREATE INDEX IF NOT EXISTS idx_tickets_priority_created ON tickets(priority, created_at)",
+    'idx_tickets_status_priority_created': "CREATE INDEX IF NOT EXISTS idx_tickets_status_priority_created ON tickets(status, priority, created_at)",
+    'idx_tickets_agent_created': "CREATE INDEX IF NOT EXISTS idx_tickets_agent_created ON tickets(agent_id, created_at)",
+    'idx_tickets_customer_created': "CREATE INDEX IF NOT EXISTS idx_tickets_customer_created ON tickets(customer_id, created_at)",
+    # get_agent_workload: agent_id + status IN (...) grouped by status, priority
+    'idx_tickets_agent_status_priority': "CREATE INDEX IF NOT EXISTS idx_tickets_agent_status_priority ON tickets(agent_id, status, priority)",
+    # search_tickets by complete email address, compared case-insensitively
+    'idx_customers_email_nocase': "CREATE INDEX IF NOT EXISTS idx_customers_email_nocase ON customers(email COLLATE NOCASE)",
+}
+
+AGENT_WORKLOAD_QUERY = """
+SELECT 
+    status,
+    priority,
+    COUNT(*) as count
+FROM tickets 
+WHERE agent_id = ? AND status IN ('Open', 'In Progress', 'Pending')
+GROUP BY status, priority
+"""
+
+# A complete address takes the exact-match path on idx_customers_email_nocase
+EMAIL_ADDRESS_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Hot queries allowed to sort their index-selected rows. The email index is not unique
+# (case variants of an address can be separate customers), so the planner cannot take
+# the order from idx_tickets_customer_created; the sort only covers the matching
+# customers' tickets
+SORTED_HOT_QUERIES = {'search_tickets_by_customer_email'}
+
 class AppleHelpDeskDB:
-    def __init__(self, db_path: str = "mcp_base/server/apple_helpdesk.db"):
+    def __init__(self, db_path: str = "mcp_base/server/apple_helpdesk.db", check_same_thread: bool = True):
         """Initialize database connection and create tables if needed"""
         self.db_path = db_path
+        self.check_same_thread = check_same_thread
         self.conn = None
         self.connect()
         
     def connect(self):
         """Establish database connection"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=self.check_same_thread)
             self.conn.execute("PRAGMA foreign_keys = ON")
             self.conn.row_factory = sqlite3.Row  # Enable dict-like access
             print(f"Connected to database: {self.db_path}")
@@ -36,158 +392,12 @@ class AppleHelpDeskDB:
     
     def create_database(self):
         """Create database schema with sample data"""
-        schema_sql = """
-        -- Apple Authorized Support Help Desk Database Schema
-        -- SQLite Database for Agentic RAG POC
-
-        -- Enable foreign key constraints
-        PRAGMA foreign_keys = ON;
-
-        -- Categories for organizing tickets
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name VARCHAR(100) NOT NULL,
-            description TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        -- Product lines and models
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_line VARCHAR(50) NOT NULL,
-            model VARCHAR(100) NOT NULL,
-            release_year INTEGER,
-            is_active BOOLEAN DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        -- Customer information
-        CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name VARCHAR(100) NOT NULL,
-            last_name VARCHAR(100) NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            phone VARCHAR(20),
-            apple_id VARCHAR(255),
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        -- Support agents
-        CREATE TABLE IF NOT EXISTS agents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name VARCHAR(100) NOT NULL,
-            last_name VARCHAR(100) NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            employee_id VARCHAR(50) UNIQUE NOT NULL,
-            specialization VARCHAR(100),
-            is_active BOOLEAN DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        -- Support tickets/cases
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticket_number VARCHAR(20) UNIQUE NOT NULL,
-            customer_id INTEGER NOT NULL,
-            agent_id INTEGER,
-            category_id INTEGER NOT NULL,
-            product_id INTEGER,
-            subject VARCHAR(255) NOT NULL,
-            description TEXT NOT NULL,
-            priority VARCHAR(20) DEFAULT 'Medium',
-            status VARCHAR(20) DEFAULT 'Open',
-            serial_number VARCHAR(100),
-            ios_version VARCHAR(20),
-            resolution TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            resolved_at DATETIME,
-            closed_at DATETIME,
-            FOREIGN KEY (customer_id) REFERENCES customers(id),
-            FOREIGN KEY (agent_id) REFERENCES agents(id),
-            FOREIGN KEY (category_id) REFERENCES categories(id),
-            FOREIGN KEY (product_id) REFERENCES products(id)
-        );
-
-        -- Ticket comments/notes
-        CREATE TABLE IF NOT EXISTS ticket_comments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticket_id INTEGER NOT NULL,
-            agent_id INTEGER,
-            comment_type VARCHAR(20) DEFAULT 'note',
-            content TEXT NOT NULL,
-            is_public BOOLEAN DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (ticket_id) REFERENCES tickets(id),
-            FOREIGN KEY (agent_id) REFERENCES agents(id)
-        );
-
-        -- Knowledge base articles
-        CREATE TABLE IF NOT EXISTS knowledge_base (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title VARCHAR(255) NOT NULL,
-            content TEXT NOT NULL,
-            category_id INTEGER,
-            product_id INTEGER,
-            tags VARCHAR(500),
-            is_published BOOLEAN DEFAULT 1,
-            view_count INTEGER DEFAULT 0,
-            created_by INTEGER,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (category_id) REFERENCES categories(id),
-            FOREIGN KEY (product_id) REFERENCES products(id),
-            FOREIGN KEY (created_by) REFERENCES agents(id)
-        );
-
-        -- SLA definitions
-        CREATE TABLE IF NOT EXISTS sla_policies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name VARCHAR(100) NOT NULL,
-            priority VARCHAR(20) NOT NULL,
-            response_time_hours INTEGER NOT NULL,
-            resolution_time_hours INTEGER NOT NULL,
-            is_active BOOLEAN DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        -- Create indexes for better performance
-        CREATE INDEX IF NOT EXISTS idx_tickets_customer ON tickets(customer_id);
-        CREATE INDEX IF NOT EXISTS idx_tickets_agent ON tickets(agent_id);
-        CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
-        CREATE INDEX IF NOT EXISTS idx_tickets_priority ON tickets(priority);
-        CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at);
-        CREATE INDEX IF NOT EXISTS idx_ticket_comments_ticket ON ticket_comments(ticket_id);
-        CREATE INDEX IF NOT EXISTS idx_knowledge_base_category ON knowledge_base(category_id);
-        CREATE INDEX IF NOT EXISTS idx_knowledge_base_product ON knowledge_base(product_id);
-
-        -- Create a view for ticket summary
-        CREATE VIEW IF NOT EXISTS ticket_summary AS
-        SELECT 
-            t.id,
-            t.ticket_number,
-            c.first_name || ' ' || c.last_name AS customer_name,
-            c.email AS customer_email,
-            a.first_name || ' ' || a.last_name AS agent_name,
-            cat.name AS category,
-            p.product_line || ' ' || p.model AS product,
-            t.subject,
-            t.priority,
-            t.status,
-            t.created_at,
-            t.updated_at
-        FROM tickets t
-        LEFT JOIN customers c ON t.customer_id = c.id
-        LEFT JOIN agents a ON t.agent_id = a.id
-        LEFT JOIN categories cat ON t.category_id = cat.id
-        LEFT JOIN products p ON t.product_id = p.id;
-        """
-        
+        # Imported here since the migrations module builds on this one
+        from mcp_base.server.helpdesk_migrations import MigrationRunner
+
         try:
-            # Execute schema creation
-            self.conn.executescript(schema_sql)
-            self.conn.commit()
+            # Bring the schema up to the latest version
+            MigrationRunner(self).migrate()
             print("Database schema created successfully")
             
             # Insert sample data
@@ -311,61 +521,145 @@ class AppleHelpDeskDB:
         """
         Search tickets with various filters
         Args:
+            ticket_number: Filter by ticket number (exact, e.g. APL-2024-004)
             customer_email: Filter by customer email
             agent_id: Filter by agent ID
             status: Filter by status
             priority: Filter by priority
             category: Filter by category name
             product_line: Filter by product line
+            columns: Columns to return (default all, see TICKET_SEARCH_COLUMNS)
+            cursor: Continue after the position returned by search_tickets_page
             limit: Limit results (default 50)
         """
-        query = """
-        SELECT t.*, c.first_name || ' ' || c.last_name as customer_name, 
-               c.email as customer_email, a.first_name || ' ' || a.last_name as agent_name,
-               cat.name as category_name, p.product_line, p.model
-        FROM tickets t
-        LEFT JOIN customers c ON t.customer_id = c.id
-        LEFT JOIN agents a ON t.agent_id = a.id
-        LEFT JOIN categories cat ON t.category_id = cat.id
-        LEFT JOIN products p ON t.product_id = p.id
-        WHERE 1=1
-        """
-        params = []
-        
-        if 'customer_email' in kwargs:
-            query += " AND c.email LIKE ?"
-            params.append(f"%{kwargs['customer_email']}%")
-        
-        if 'agent_id' in kwargs:
-            query += " AND t.agent_id = ?"
-            params.append(kwargs['agent_id'])
-            
-        if 'status' in kwargs:
-            query += " AND t.status = ?"
-            params.append(kwargs['status'])
-            
-        if 'priority' in kwargs:
-            query += " AND t.priority = ?"
-            params.append(kwargs['priority'])
-            
-        if 'category' in kwargs:
-            query += " AND cat.name LIKE ?"
-            params.append(f"%{kwargs['category']}%")
-            
-        if 'product_line' in kwargs:
-            query += " AND p.product_line LIKE ?"
-            params.append(f"%{kwargs['product_line']}%")
-        
-        query += " ORDER BY t.created_at DESC"
-        
-        if 'limit' in kwargs:
-            query += " LIMIT ?"
-            params.append(kwargs['limit'])
-        else:
-            query += " LIMIT 50"
+        columns = kwargs.pop('columns', None)
+        cursor = kwargs.pop('cursor', None)
+        limit = kwargs.pop('limit', 50)
+
+        query, params = self._build_ticket_search(kwargs, columns, cursor)
+        query += " LIMIT ?"
+        params.append(limit)
         
         cursor = self.conn.execute(query, params)
         return [dict(row) for row in cursor.fetchall()]
+
+    def search_tickets_page(self, page_size: int = 50, cursor: Optional[str] = None,
+                            columns: Optional[List[str]] = None, **filters) -> Dict:
+        """
+        Fetch one page of tickets using keyset pagination on (created_at, id)
+        Args:
+            page_size: Number of tickets per page (default 50)
+            cursor: Opaque cursor from a previous page's 'next_cursor'
+            columns: Columns to return (default all, see TICKET_SEARCH_COLUMNS)
+            **filters: Same filters as search_tickets
+        Returns:
+            Dict with 'tickets' and 'next_cursor' (None on the last page)
+        """
+        query, params = self._build_ticket_search(filters, columns, cursor)
+        # Fetch one extra row to know whether another page exists
+        query += " LIMIT ?"
+        params.append(page_size + 1)
+
+        rows = [dict(row) for row in self.conn.execute(query, params).fetchall()]
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = self._encode_ticket_cursor(rows[-1])
+
+        return {'tickets': rows, 'next_cursor': next_cursor}
+
+    def iter_tickets(self, batch_size: int = 500, columns: Optional[List[str]] = None,
+                     **filters) -> Iterator[Dict]:
+        """Stream all tickets matching the filters, one keyset page at a time"""
+        cursor = None
+        while True:
+            page = self.search_tickets_page(page_size=batch_size, cursor=cursor, columns=columns, **filters)
+            yield from page['tickets']
+            cursor = page['next_cursor']
+            if cursor is None:
+                return
+
+    def _build_ticket_search(self, filters: Dict[str, Any], columns: Optional[List[str]] = None,
+                             cursor: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Build the ticket search query, joining only the tables the projection and filters need"""
+        if columns is None:
+            columns = list(TICKET_SEARCH_COLUMNS)
+        unknown = [name for name in columns if name not in TICKET_SEARCH_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown ticket columns: {', '.join(unknown)}")
+
+        # id and created_at form the pagination key, so they are always returned
+        selected = list(columns) + [name for name in ('id', 'created_at') if name not in columns]
+        aliases = {TICKET_SEARCH_COLUMNS[name][1] for name in selected}
+
+        conditions = []
+        params = []
+
+        if filters.get('ticket_number') is not None:
+            conditions.append("t.ticket_number = ?")
+            params.append(str(filters['ticket_number']).strip().upper())
+
+        if filters.get('customer_email') is not None:
+            email = str(filters['customer_email']).strip()
+            if EMAIL_ADDRESS_PATTERN.match(email):
+                conditions.append("c.email = ? COLLATE NOCASE")
+                params.append(email)
+            else:
+                conditions.append("c.email LIKE ?")
+                params.append(f"%{email}%")
+            aliases.add('c')
+
+        if filters.get('agent_id') is not None:
+            conditions.append("t.agent_id = ?")
+            params.append(filters['agent_id'])
+
+        if filters.get('status') is not None:
+            conditions.append("t.status = ?")
+            params.append(filters['status'])
+
+        if filters.get('priority') is not None:
+            conditions.append("t.priority = ?")
+            params.append(filters['priority'])
+
+        if filters.get('category') is not None:
+            conditions.append("cat.name LIKE ?")
+            params.append(f"%{filters['category']}%")
+            aliases.add('cat')
+
+        if filters.get('product_line') is not None:
+            conditions.append("p.product_line LIKE ?")
+            params.append(f"%{filters['product_line']}%")
+            aliases.add('p')
+
+        if cursor:
+            created_at, ticket_id = self._decode_ticket_cursor(cursor)
+            conditions.append("(t.created_at, t.id) < (?, ?)")
+            params.extend([created_at, ticket_id])
+
+        select_list = ", ".join(f"{TICKET_SEARCH_COLUMNS[name][0]} AS {name}" for name in selected)
+        joins = " ".join(TICKET_SEARCH_JOINS[alias] for alias in TICKET_SEARCH_JOINS if alias in aliases)
+
+        query = f"SELECT {select_list} FROM tickets t {joins} WHERE 1=1"
+        for condition in conditions:
+            query += f" AND {condition}"
+        query += " ORDER BY t.created_at DESC, t.id DESC"
+
+        return query, params
+
+    @staticmethod
+    def _encode_ticket_cursor(row: Dict) -> str:
+        """Encode the pagination key of a ticket row as an opaque cursor"""
+        payload = json.dumps([row['created_at'], row['id']])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def _decode_ticket_cursor(cursor: str) -> Tuple[str, int]:
+        """Decode a cursor produced by _encode_ticket_cursor"""
+        try:
+            created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid ticket cursor: {cursor}") from e
+        return created_at, int(ticket_id)
     
     def search_knowledge_base(self, search_term: str, category_id: Optional[int] = None, limit: int = 10) -> List[Dict]:
         """Search knowledge base articles by content or tags"""
@@ -400,21 +694,13 @@ class AppleHelpDeskDB:
     
     def get_agent_workload(self, agent_id: int) -> Dict:
         """Get agent's current workload statistics"""
-        query = """
-        SELECT 
-            status,
-            priority,
-            COUNT(*) as count
-        FROM tickets 
-        WHERE agent_id = ? AND status IN ('Open', 'In Progress', 'Pending')
-        GROUP BY status, priority
-        """
-        cursor = self.conn.execute(query, (agent_id,))
+        cursor = self.conn.execute(AGENT_WORKLOAD_QUERY, (agent_id,))
         workload = cursor.fetchall()
         
         # Get agent info
         agent_cursor = self.conn.execute("SELECT * FROM agents WHERE id = ?", (agent_id,))
-        agent = dict(agent_cursor.fetchone()) if agent_cursor.fetchone() else None
+        agent_row = agent_cursor.fetchone()
+        agent = dict(agent_row) if agent_row else None
         
         return {
             'agent': agent,
@@ -422,6 +708,89 @@ class AppleHelpDeskDB:
             'total_active_tickets': sum(row['count'] for row in workload)
         }
     
+    # INDEX ADVISOR
+
+    def ensure_indexes(self) -> List[str]:
+        """Create any missing PERFORMANCE_INDEXES and return the names created"""
+        existing = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        created = []
+        for name, statement in PERFORMANCE_INDEXES.items():
+            if name not in existing:
+                self.conn.execute(statement)
+                created.append(name)
+        if created:
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+            print(f"Created indexes: {', '.join(created)}")
+        return created
+
+    def explain_query_plan(self, query: str, params: Tuple = ()) -> List[str]:
+        """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+        cursor = self.conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row[3] for row in cursor.fetchall()]
+
+    def _hot_queries(self) -> Dict[str, Tuple[str, List[Any]]]:
+        """Queries on the hot paths that must be served by index searches"""
+        queries = {}
+        for name, filters in {
+            'search_tickets_by_status': {'status': 'Open'},
+            'search_tickets_by_priority': {'priority': 'High'},
+            'search_tickets_by_status_priority': {'status': 'Open', 'priority': 'High'},
+            'search_tickets_by_agent': {'agent_id': 1},
+            'search_tickets_by_customer_email': {'customer_email': 'john.smith@email.com'},
+        }.items():
+            query, params = self._build_ticket_search(filters)
+            queries[name] = (query + " LIMIT ?", params + [50])
+
+        queries['get_agent_workload'] = (AGENT_WORKLOAD_QUERY, [1])
+        queries['get_customer_by_email'] = ("SELECT * FROM customers WHERE email = ?", ['john.smith@email.com'])
+        return queries
+
+    def check_hot_query_plans(self) -> Dict[str, List[str]]:
+        """
+        Run EXPLAIN QUERY PLAN over the hot queries
+        Returns:
+            Mapping of query name to offending plan lines (full scans or temp
+            B-tree sorts); empty when every hot query is index-driven
+        """
+        problems = {}
+        for name, (query, params) in self._hot_queries().items():
+            offending = [
+                detail for detail in self.explain_query_plan(query, tuple(params))
+                if detail.startswith('SCAN') or ('TEMP B-TREE' in detail and name not in SORTED_HOT_QUERIES)
+            ]
+            if offending:
+                problems[name] = offending
+        return problems
+
+    def advise_indexes(self) -> Dict:
+        """Report missing recommended indexes, redundant prefix indexes and hot-query full scans"""
+        existing = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+        # An index is redundant when its columns are a leading prefix of another index on the same table
+        columns_by_index = {}
+        for table_row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            table = table_row[0]
+            for index_row in self.conn.execute(f"PRAGMA index_list('{table}')").fetchall():
+                if index_row['unique']:
+                    continue
+                columns = [info['name'] for info in self.conn.execute(f"PRAGMA index_info('{index_row['name']}')")]
+                columns_by_index[index_row['name']] = (table, columns)
+
+        redundant = []
+        for name, (table, columns) in columns_by_index.items():
+            for other, (other_table, other_columns) in columns_by_index.items():
+                if other != name and other_table == table and len(other_columns) > len(columns) \
+                        and other_columns[:len(columns)] == columns:
+                    redundant.append({'index': name, 'covered_by': other})
+                    break
+
+        return {
+            'missing': [name for name in PERFORMANCE_INDEXES if name not in existing],
+            'redundant': redundant,
+            'full_scans': self.check_hot_query_plans(),
+        }
+
     # PERSISTENCE UTILITY FUNCTIONS
     
     def create_ticket(self, customer_id: int, category_id: int, subject: str, description: str, 
@@ -527,26 +896,90 @@ class AppleHelpDeskDB:
         self.conn.execute("UPDATE knowledge_base SET view_count = view_count + 1 WHERE id = ?", 
                          (article_id,))
         self.conn.commit()
+
+    def add_kb_view_counts(self, counts: Dict[int, int]):
+        """Add buffered view counts ({article_id: views}) in one transaction"""
+        self.conn.executemany("UPDATE knowledge_base SET view_count = view_count + ? WHERE id = ?",
+                              [(views, article_id) for article_id, views in counts.items()])
+        self.conn.commit()
     
     # REPORTING FUNCTIONS
     
+    def _ensure_ticket_statistics(self):
+        """Create the materialized statistics tables and triggers if missing"""
+        cursor = self.conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'ticket_stats_counters'"
+        )
+        if cursor.fetchone()[0] > 0:
+            return
+
+        self.conn.executescript(TICKET_STATS_SCHEMA_SQL)
+        self.rebuild_ticket_statistics()
+
+    def replace_ticket_statistics_triggers(self):
+        """Swap the statistics triggers for the current TICKET_STATS_SCHEMA_SQL and recount, in one transaction"""
+        drops = "".join(f"DROP TRIGGER IF EXISTS {name};\n"
+                        for name in re.findall(r"CREATE TRIGGER IF NOT EXISTS (\w+)", TICKET_STATS_SCHEMA_SQL))
+        # executescript leaves the transaction open; rebuild_ticket_statistics commits it
+        self.conn.executescript("BEGIN;\n" + drops + TICKET_STATS_SCHEMA_SQL)
+        self.rebuild_ticket_statistics()
+
+    def rebuild_ticket_statistics(self):
+        """Recompute the materialized statistics from the tickets table"""
+        self.conn.execute("DELETE FROM ticket_stats_counters")
+        self.conn.execute("DELETE FROM ticket_stats_buckets")
+
+        self.conn.execute("""
+            INSERT INTO ticket_stats_counters (dimension, stat_key, count)
+            SELECT 'status', IFNULL(status, ''), COUNT(*) FROM tickets GROUP BY IFNULL(status, '')
+            UNION ALL
+            SELECT 'priority', IFNULL(priority, ''), COUNT(*) FROM tickets GROUP BY IFNULL(priority, '')
+            UNION ALL
+            SELECT 'category', CAST(category_id AS TEXT), COUNT(*) FROM tickets GROUP BY category_id
+            UNION ALL
+            SELECT 'total', '', COUNT(*) FROM tickets
+            UNION ALL
+            SELECT 'resolved', '', COUNT(CASE WHEN status = 'Resolved' AND resolved_at IS NOT NULL THEN 1 END)
+            FROM tickets
+        """)
+
+        for metric, column in (('created', 'created_at'), ('resolved', 'resolved_at'), ('closed', 'closed_at')):
+            self.conn.execute(f"""
+                INSERT INTO ticket_stats_buckets (period, bucket, metric, count)
+                SELECT 'day', date({column}), '{metric}', COUNT(*)
+                FROM tickets WHERE {column} IS NOT NULL GROUP BY date({column})
+                UNION ALL
+                SELECT 'week', strftime('%Y-W%W', {column}), '{metric}', COUNT(*)
+                FROM tickets WHERE {column} IS NOT NULL GROUP BY strftime('%Y-W%W', {column})
+            """)
+
+        self.conn.commit()
+
     def get_ticket_statistics(self) -> Dict:
-        """Get overall ticket statistics"""
+        """Get overall ticket statistics from the materialized counters"""
+        self._ensure_ticket_statistics()
         stats = {}
         
         # Status distribution
-        cursor = self.conn.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status")
+        cursor = self.conn.execute("""
+            SELECT NULLIF(stat_key, ''), count FROM ticket_stats_counters
+            WHERE dimension = 'status' AND count > 0
+        """)
         stats['by_status'] = dict(cursor.fetchall())
         
         # Priority distribution
-        cursor = self.conn.execute("SELECT priority, COUNT(*) FROM tickets GROUP BY priority")
+        cursor = self.conn.execute("""
+            SELECT NULLIF(stat_key, ''), count FROM ticket_stats_counters
+            WHERE dimension = 'priority' AND count > 0
+        """)
         stats['by_priority'] = dict(cursor.fetchall())
         
-        # Category distribution
+        # Category distribution (every category is reported, even without tickets)
         cursor = self.conn.execute("""
-            SELECT c.name, COUNT(t.id) 
+            SELECT c.name, IFNULL(SUM(s.count), 0)
             FROM categories c 
-            LEFT JOIN tickets t ON c.id = t.category_id 
+            LEFT JOIN ticket_stats_counters s
+                ON s.dimension = 'category' AND s.stat_key = CAST(c.id AS TEXT)
             GROUP BY c.name
         """)
         stats['by_category'] = dict(cursor.fetchall())
@@ -554,15 +987,41 @@ class AppleHelpDeskDB:
         # SLA compliance (simplified)
         cursor = self.conn.execute("""
             SELECT 
-                COUNT(CASE WHEN status = 'Resolved' AND resolved_at IS NOT NULL THEN 1 END) as resolved,
-                COUNT(*) as total
-            FROM tickets
+                IFNULL(SUM(CASE WHEN dimension = 'resolved' THEN count END), 0) as resolved,
+                IFNULL(SUM(CASE WHEN dimension = 'total' THEN count END), 0) as total
+            FROM ticket_stats_counters
+            WHERE dimension IN ('resolved', 'total')
         """)
         row = cursor.fetchone()
         stats['resolution_rate'] = (row[0] / row[1] * 100) if row[1] > 0 else 0
         
         return stats
 
+    def get_ticket_trends(self, period: str = 'day', limit: int = 30) -> List[Dict]:
+        """
+        Get created/resolved/closed ticket counts per time bucket
+        Args:
+            period: Bucket size, 'day' or 'week'
+            limit: Number of most recent buckets to return (default 30)
+        """
+        if period not in ('day', 'week'):
+            raise ValueError(f"Invalid period '{period}', expected 'day' or 'week'")
+
+        self._ensure_ticket_statistics()
+        query = """
+        SELECT bucket,
+               SUM(CASE WHEN metric = 'created' THEN count ELSE 0 END) as created,
+               SUM(CASE WHEN metric = 'resolved' THEN count ELSE 0 END) as resolved,
+               SUM(CASE WHEN metric = 'closed' THEN count ELSE 0 END) as closed
+        FROM ticket_stats_buckets
+        WHERE period = ?
+        GROUP BY bucket
+        ORDER BY bucket DESC
+        LIMIT ?
+        """
+        cursor = self.conn.execute(query, (period, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
 def main():
     """Main function to demonstrate database creation and usage"""
     print("=== Apple Help Desk Database Manager ===\n")
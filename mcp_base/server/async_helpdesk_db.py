@@ -0,0 +1,511 @@
+"""
+Async access layer for the Apple Help Desk database
+
+Runs the blocking sqlite3 calls of AppleHelpDeskDB off the event loop:
+reads go to a pool of reader threads, each with its own connection, and
+writes are serialized on a single writer thread. The database is switched
+to WAL mode so readers keep running while a write is in progress.
+
+With a result cache, the read-only lookups (search_tickets,
+get_customer_by_email, get_agent_workload, search_knowledge_base) are served
+from memory until a write touches what they read. Each result is tagged with
+scopes such as "agent:3" or "customer:ana@example.com"; the write methods
+invalidate exactly the scopes they change, after their commit:
+
+    create_ticket          tickets, customer_tickets:<email>
+    update_ticket_status   tickets, agent:<old and new id>, customer_tickets:<email>
+    create_customer        customer:<email>
+    create_kb_article      knowledge_base
+    increment_kb_view_count  kb_views, kb_article:<id>
+    add_ticket_comment     ticket_comments (no cached lookup reads comments)
+
+The address in customer_tickets:<email> is ASCII case-folded, matching the
+case-insensitive exact-email search.
+
+HELPDESK_RESULT_CACHE_SIZE sets the number of cached results (default 1024,
+0 disables the cache); HELPDESK_RESULT_CACHE_TTL optionally bounds their age
+in seconds, for databases that are also written outside this process.
+
+Writes are group-committed: the writer thread runs every write queued while
+the previous commit was in progress in one transaction (each inside its own
+savepoint, so a failing write does not undo the others) and commits once.
+A write's await still returns only after the commit that contains it.
+Knowledge base view counts are write-behind: increments are summed in memory
+and flushed in one transaction every HELPDESK_VIEW_FLUSH_INTERVAL seconds,
+so a crash loses at most that window of views.
+
+    HELPDESK_GROUP_COMMIT_MAX=256        # writes per commit (1: commit every write)
+    HELPDESK_GROUP_COMMIT_WINDOW_MS=0    # wait this long for more writes before committing
+    HELPDESK_VIEW_FLUSH_INTERVAL=1       # seconds between view count flushes (0: write-through)
+    HELPDESK_SYNCHRONOUS=NORMAL          # PRAGMA synchronous of the writer (default: SQLite's FULL)
+"""
+
+import asyncio
+import copy
+import functools
+import json
+import os
+import string
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from cache import MISSING, VersionedCache
+from mcp_base.server.apple_helpdesk_manager import EMAIL_ADDRESS_PATTERN, AppleHelpDeskDB
+
+DEFAULT_DB_PATH = "mcp_base/server/apple_helpdesk.db"
+DEFAULT_RESULT_CACHE_SIZE = 1024
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def create_result_cache() -> Optional[VersionedCache]:
+    """Result cache configured by HELPDESK_RESULT_CACHE_SIZE / HELPDESK_RESULT_CACHE_TTL, or None when disabled"""
+    size = int(os.getenv("HELPDESK_RESULT_CACHE_SIZE", DEFAULT_RESULT_CACHE_SIZE))
+    if size <= 0:
+        return None
+    ttl = os.getenv("HELPDESK_RESULT_CACHE_TTL")
+    return VersionedCache(max_size=size, ttl=float(ttl) if ttl else None)
+
+
+def write_options_from_env() -> Dict[str, Any]:
+    """AsyncAppleHelpDeskDB write settings from HELPDESK_GROUP_COMMIT_* / HELPDESK_VIEW_FLUSH_INTERVAL / HELPDESK_SYNCHRONOUS"""
+    return {
+        "max_group_size": int(os.getenv("HELPDESK_GROUP_COMMIT_MAX", "256")),
+        "group_commit_window": float(os.getenv("HELPDESK_GROUP_COMMIT_WINDOW_MS", "0")) / 1000,
+        "view_flush_interval": float(os.getenv("HELPDESK_VIEW_FLUSH_INTERVAL", "1")),
+        "synchronous": os.getenv("HELPDESK_SYNCHRONOUS") or None,
+    }
+
+
+_NOCASE_FOLD = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _fold(value: Any) -> Any:
+    """SQLite LIKE ignores case for ASCII text only, so only ASCII patterns share a cache entry across cases"""
+    if isinstance(value, str) and value.isascii():
+        return value.casefold()
+    return value
+
+
+def _fold_email(email: Any) -> str:
+    """Fold a complete address the way the exact-email path compares it (COLLATE NOCASE: ASCII letters only)"""
+    return str(email).translate(_NOCASE_FOLD)
+
+
+def _ticket_search_key(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """search_tickets arguments with defaults bound and LIKE filters case-folded"""
+    args = {name: value for name, value in kwargs.items() if value is not None}
+    args.setdefault('limit', 50)
+    for name in ('category', 'product_line'):
+        if name in args:
+            args[name] = _fold(args[name])
+    if 'customer_email' in args:
+        email = str(args['customer_email']).strip()
+        args['customer_email'] = _fold_email(email) if EMAIL_ADDRESS_PATTERN.match(email) else _fold(email)
+    return args
+
+
+def _ticket_search_scopes(args: Dict[str, Any], result: Any) -> List[str]:
+    if 'agent_id' in args:
+        return [f"agent:{args['agent_id']}"]
+    if 'customer_email' in args and EMAIL_ADDRESS_PATTERN.match(args['customer_email']):
+        return [f"customer_tickets:{args['customer_email']}"]
+    return ["tickets"]
+
+
+def _kb_search_scopes(args: Dict[str, Any], result: Any) -> List[str]:
+    # A full page can change membership when any view count changes; a partial
+    # page holds every match, so only the returned articles' counts matter
+    if len(result) >= args['limit']:
+        return ["knowledge_base", "kb_views"]
+    return ["knowledge_base"] + [f"kb_article:{article['id']}" for article in result]
+
+
+class _DeferredCommitConnection:
+    """The writer's sqlite3 connection with commit() left to the group commit running the write"""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def commit(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+@dataclass
+class _WriteJob:
+    run: Callable[[AppleHelpDeskDB], Any]
+    scopes: Callable[[AppleHelpDeskDB], List[str]]
+    future: Future
+
+
+class AsyncAppleHelpDeskDB:
+    """Async facade over AppleHelpDeskDB with a reader pool and a single group-committing writer"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, readers: int = 4, busy_timeout_ms: int = 5000,
+                 result_cache: Optional[VersionedCache] = None, max_group_size: int = 256,
+                 group_commit_window: float = 0.0, view_flush_interval: float = 0.0,
+                 max_pending_views: int = 10_000, synchronous: Optional[str] = None):
+        if synchronous is not None and synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unknown synchronous mode {synchronous}, expected one of {', '.join(SYNCHRONOUS_MODES)}")
+        self.db_path = db_path
+        self.result_cache = result_cache
+        self.busy_timeout_ms = busy_timeout_ms
+        self.reader_count = readers
+        self.max_group_size = max(1, max_group_size)
+        self.group_commit_window = group_commit_window
+        self.view_flush_interval = view_flush_interval
+        self.max_pending_views = max_pending_views
+        self.synchronous = synchronous.upper() if synchronous else None
+        self._pending_writes: List[_WriteJob] = []
+        self._write_lock = threading.Lock()
+        self._drain_scheduled = False
+        self._pending_views: Counter = Counter()
+        self._views_lock = threading.Lock()
+        self._view_flusher: Optional[threading.Thread] = None
+        self._closing = threading.Event()
+        self._write_stats = Counter()
+        self._max_group_seen = 0
+        self._local = threading.local()
+        self._reader_dbs: List[AppleHelpDeskDB] = []
+        self._reader_lock = threading.Lock()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="helpdesk-reader")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="helpdesk-writer",
+                                          initializer=self._open_writer)
+        # Opening the writer enables WAL and creates the statistics tables; readers wait for it
+        self._ready = self._writer.submit(lambda: None)
+
+    # CONNECTION MANAGEMENT
+
+    def _configure(self, db: AppleHelpDeskDB):
+        db.conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+
+    def _open_writer(self):
+        db = AppleHelpDeskDB(self.db_path, check_same_thread=False)
+        self._configure(db)
+        db.conn.execute("PRAGMA journal_mode = WAL")
+        if self.synchronous:
+            db.conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        # Create the materialized statistics up front so reads never have to write
+        db._ensure_ticket_statistics()
+        db.conn = _DeferredCommitConnection(db.conn)
+        self._writer_db = db
+
+    def _reader_db(self) -> AppleHelpDeskDB:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = AppleHelpDeskDB(self.db_path, check_same_thread=False)
+            self._configure(db)
+            db.conn.execute("PRAGMA query_only = ON")
+            self._local.db = db
+            with self._reader_lock:
+                self._reader_dbs.append(db)
+        return db
+
+    def _call_reader(self, method: str, *args, **kwargs):
+        return getattr(self._reader_db(), method)(*args, **kwargs)
+
+    async def _read(self, method: str, *args, **kwargs):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(self._call_reader, method, *args, **kwargs))
+
+    async def _cached_read(self, tool: str, method: str, args: Dict[str, Any],
+                           scopes: Callable[[Dict[str, Any], Any], List[str]]):
+        """Read through the result cache; `scopes` names what the result depends on"""
+        if self.result_cache is None:
+            return await self._read(method, **args)
+        key = (tool, json.dumps(args, sort_keys=True, default=str))
+        value = self.result_cache.get(key, tool)
+        if value is not MISSING:
+            return copy.deepcopy(value)
+        # Taken before the read, so a write committed during it leaves the result uncached
+        sequence = self.result_cache.begin()
+        result = await self._read(method, **args)
+        self.result_cache.set(key, copy.deepcopy(result), sequence, scopes(args, result))
+        return result
+
+    # GROUP COMMIT
+
+    def _submit_write(self, run: Callable[[AppleHelpDeskDB], Any],
+                      scopes: Callable[[AppleHelpDeskDB], List[str]]) -> Future:
+        """Queue a write for the next group commit; the future resolves once it is committed"""
+        job = _WriteJob(run, scopes, Future())
+        with self._write_lock:
+            self._pending_writes.append(job)
+            schedule, self._drain_scheduled = not self._drain_scheduled, True
+        if schedule:
+            try:
+                self._writer.submit(self._drain_writes)
+            except RuntimeError:
+                # The writer is already shut down (interpreter exit stops executors
+                # before atexit handlers run): commit on this thread instead
+                self._drain_writes()
+        return job.future
+
+    def _drain_writes(self):
+        if self.group_commit_window > 0:
+            time.sleep(self.group_commit_window)
+        while True:
+            with self._write_lock:
+                jobs = self._pending_writes[:self.max_group_size]
+                del self._pending_writes[:self.max_group_size]
+                if not jobs:
+                    self._drain_scheduled = False
+                    return
+            self._commit_group(jobs)
+
+    def _commit_group(self, jobs: List[_WriteJob]):
+        db = self._writer_db
+        conn = db.conn.raw
+        start = time.perf_counter()
+        outcomes = []
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        for job in jobs:
+            # Scopes are looked up before the write (e.g. the ticket's previous agent)
+            # and invalidated after the commit, both on the writer thread
+            try:
+                names = job.scopes(db) if self.result_cache is not None else []
+            except Exception as e:
+                outcomes.append((job, [], None, e))
+                continue
+            conn.execute("SAVEPOINT helpdesk_write")
+            try:
+                result = job.run(db)
+            except Exception as e:
+                conn.execute("ROLLBACK TO helpdesk_write")
+                conn.execute("RELEASE helpdesk_write")
+                outcomes.append((job, names, None, e))
+            else:
+                conn.execute("RELEASE helpdesk_write")
+                outcomes.append((job, names, result, None))
+        try:
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            outcomes = [(job, names, None, e) for job, names, _, _ in outcomes]
+        if self.result_cache is not None:
+            self.result_cache.invalidate([name for _, names, _, error in outcomes if error is None for name in names])
+
+        self._write_stats["commits"] += 1
+        self._write_stats["writes"] += len(jobs)
+        self._write_stats["commit_seconds"] += time.perf_counter() - start
+        self._max_group_seen = max(self._max_group_seen, len(jobs))
+        for job, _, result, error in outcomes:
+            if error is not None:
+                self._write_stats["failed_writes"] += 1
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+    async def _write_invalidating(self, scopes: Callable[[AppleHelpDeskDB], List[str]], method: str, *args, **kwargs):
+        future = self._submit_write(lambda db: getattr(db, method)(*args, **kwargs), scopes)
+        return await asyncio.wrap_future(future)
+
+    # WRITE-BEHIND VIEW COUNTS
+
+    def _start_view_flusher(self):
+        with self._views_lock:
+            if self._view_flusher is not None or self._closing.is_set():
+                return
+            self._view_flusher = threading.Thread(target=self._flush_views_periodically, name="helpdesk-view-flusher",
+                                                  daemon=True)
+            self._view_flusher.start()
+
+    def _flush_views_periodically(self):
+        while not self._closing.wait(self.view_flush_interval):
+            self.flush_views().result()
+
+    def flush_views(self) -> Future:
+        """Write the buffered view counts now; the future resolves once they are committed"""
+        with self._views_lock:
+            counts, self._pending_views = dict(self._pending_views), Counter()
+        if not counts:
+            done = Future()
+            done.set_result(0)
+            return done
+
+        def scopes(db: AppleHelpDeskDB) -> List[str]:
+            return ["kb_views"] + [f"kb_article:{article_id}" for article_id in counts]
+
+        def run(db: AppleHelpDeskDB) -> int:
+            db.add_kb_view_counts(counts)
+            return sum(counts.values())
+
+        future = self._submit_write(run, scopes)
+        future.add_done_callback(functools.partial(self._after_view_flush, counts))
+        return future
+
+    def _after_view_flush(self, counts: Dict[int, int], future: Future):
+        if future.exception() is not None:
+            print(f"Error flushing KB view counts, keeping them for the next flush: {future.exception()}")
+            with self._views_lock:
+                self._pending_views.update(counts)
+            return
+        self._write_stats["view_flushes"] += 1
+        self._write_stats["views_flushed"] += sum(counts.values())
+
+    def write_stats(self) -> Dict[str, Any]:
+        """Group commit and write-behind counters"""
+        stats = dict(self._write_stats)
+        commits = stats.get("commits", 0)
+        with self._write_lock:
+            pending_writes = len(self._pending_writes)
+        with self._views_lock:
+            pending_views = sum(self._pending_views.values())
+        return {
+            "writes": stats.get("writes", 0),
+            "failed_writes": stats.get("failed_writes", 0),
+            "commits": commits,
+            "avg_group_size": stats.get("writes", 0) / commits if commits else 0.0,
+            "max_group_size": self._max_group_seen,
+            "avg_commit_ms": stats.get("commit_seconds", 0.0) / commits * 1000 if commits else 0.0,
+            "pending_writes": pending_writes,
+            "view_increments": stats.get("view_increments", 0),
+            "view_flushes": stats.get("view_flushes", 0),
+            "views_flushed": stats.get("views_flushed", 0),
+            "pending_views": pending_views,
+            "settings": {"max_group_size": self.max_group_size, "group_commit_window": self.group_commit_window,
+                         "view_flush_interval": self.view_flush_interval, "synchronous": self.synchronous or "FULL"},
+        }
+
+    def result_cache_stats(self) -> Dict[str, Any]:
+        """Size, hit rates per tool, evictions and invalidations of the result cache"""
+        if self.result_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.result_cache.stats()}
+
+    async def start(self):
+        """Wait until the writer connection is open (WAL enabled)"""
+        if not self._ready.done():
+            await asyncio.wrap_future(self._ready)
+
+    def _read_file_pages(self, block_size: int = 1 << 20) -> int:
+        """Read the database and WAL files once so their pages are in the OS page cache"""
+        total = 0
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    total += len(block)
+        return total
+
+    def _open_reader(self, barrier: threading.Barrier):
+        self._reader_db().conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        # Hold this thread until every reader has opened, so each gets its own connection
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+
+    async def warm_up(self) -> Dict[str, Any]:
+        """
+        Open the writer and every reader connection and pull the database
+        file into the page cache, so the first tool calls skip that work
+        """
+        await self.start()
+        loop = asyncio.get_running_loop()
+        barrier = threading.Barrier(self.reader_count)
+        await asyncio.gather(*(loop.run_in_executor(self._readers, self._open_reader, barrier)
+                               for _ in range(self.reader_count)))
+        cached_bytes = await loop.run_in_executor(self._readers, self._read_file_pages)
+        return {"reader_connections": len(self._reader_dbs), "cached_bytes": cached_bytes}
+
+    def close(self):
+        """Flush buffered view counts, wait for pending work and close every connection"""
+        self._closing.set()
+        if self._view_flusher is not None:
+            self._view_flusher.join()
+        self.flush_views()
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        if getattr(self, '_writer_db', None):
+            self._writer_db.close()
+        for db in self._reader_dbs:
+            db.close()
+        self._reader_dbs = []
+
+    # SEARCH UTILITY FUNCTIONS
+
+    async def search_tickets(self, **kwargs) -> List[Dict]:
+        return await self._cached_read('search_tickets', 'search_tickets', _ticket_search_key(kwargs),
+                                       _ticket_search_scopes)
+
+    async def search_tickets_page(self, **kwargs) -> Dict:
+        return await self._read('search_tickets_page', **kwargs)
+
+    async def search_knowledge_base(self, search_term: str, category_id: Optional[int] = None, limit: int = 10) -> List[Dict]:
+        args = {"search_term": _fold(search_term), "category_id": category_id or None, "limit": limit}
+        return await self._cached_read('search_knowledge_base', 'search_knowledge_base', args, _kb_search_scopes)
+
+    async def get_customer_by_email(self, email: str) -> Optional[Dict]:
+        return await self._cached_read('get_customer_by_email', 'get_customer_by_email', {"email": email},
+                                       lambda args, result: [f"customer:{email}"])
+
+    async def get_agent_workload(self, agent_id: int) -> Dict:
+        return await self._cached_read('get_agent_workload', 'get_agent_workload', {"agent_id": agent_id},
+                                       lambda args, result: [f"agent:{agent_id}"])
+
+    # PERSISTENCE UTILITY FUNCTIONS
+
+    async def create_ticket(self, **kwargs) -> str:
+        def scopes(db: AppleHelpDeskDB) -> List[str]:
+            row = db.conn.execute("SELECT email FROM customers WHERE id = ?", (kwargs.get('customer_id'),)).fetchone()
+            return ["tickets"] + ([f"customer_tickets:{_fold_email(row[0])}"] if row else [])
+
+        return await self._write_invalidating(scopes, 'create_ticket', **kwargs)
+
+    async def update_ticket_status(self, **kwargs) -> bool:
+        def scopes(db: AppleHelpDeskDB) -> List[str]:
+            row = db.conn.execute("SELECT t.agent_id, c.email FROM tickets t LEFT JOIN customers c ON t.customer_id = c.id "
+                                  "WHERE t.id = ?", (kwargs.get('ticket_id'),)).fetchone()
+            names = ["tickets"]
+            if row:
+                names += [f"agent:{row[0]}", f"customer_tickets:{_fold_email(row[1])}"]
+            if kwargs.get('agent_id'):
+                names.append(f"agent:{kwargs['agent_id']}")
+            return names
+
+        return await self._write_invalidating(scopes, 'update_ticket_status', **kwargs)
+
+    async def add_ticket_comment(self, **kwargs) -> int:
+        return await self._write_invalidating(lambda db: ["ticket_comments"], 'add_ticket_comment', **kwargs)
+
+    async def create_customer(self, first_name: str, last_name: str, email: str,
+                              phone: Optional[str] = None, apple_id: Optional[str] = None) -> int:
+        return await self._write_invalidating(lambda db: [f"customer:{email}"], 'create_customer',
+                                              first_name, last_name, email, phone, apple_id)
+
+    async def create_kb_article(self, *args: Any, **kwargs) -> int:
+        return await self._write_invalidating(lambda db: ["knowledge_base"], 'create_kb_article', *args, **kwargs)
+
+    async def increment_kb_view_count(self, article_id: int):
+        if self.view_flush_interval <= 0 or self._closing.is_set():
+            return await self._write_invalidating(lambda db: ["kb_views", f"kb_article:{article_id}"],
+                                                  'increment_kb_view_count', article_id)
+        # Counted in memory and written with the next flush
+        with self._views_lock:
+            self._pending_views[article_id] += 1
+            self._write_stats["view_increments"] += 1
+            pending = sum(self._pending_views.values())
+        self._start_view_flusher()
+        if pending >= self.max_pending_views:
+            self.flush_views()
+
+    # REPORTING FUNCTIONS
+
+    async def get_ticket_statistics(self) -> Dict:
+        return await self._read('get_ticket_statistics')
+
+    async def get_ticket_trends(self, period: str = 'day', limit: int = 30) -> List[Dict]:
+        return await self._read('get_ticket_trends', period=period, limit=limit)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Apple Help Desk Schema Migrations
+Versioned, resumable schema upgrades for existing apple_helpdesk.db files
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from mcp_base.server.apple_helpdesk_manager import (
+    AppleHelpDeskDB,
+    HELPDESK_SCHEMA_SQL,
+    PERFORMANCE_INDEXES,
+)
+
+SCHEMA_VERSION_SQL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class MigrationStep(ABC):
+    """A single unit of work inside a migration.
+
+    Steps commit on their own and must be idempotent, so a migration that is
+    interrupted half way can simply be run again.
+    """
+
+    description: str
+
+    @abstractmethod
+    def estimate(self, db: AppleHelpDeskDB) -> Dict[str, Any]:
+        """Estimate the cost of the step without changing the database"""
+        pass
+
+    @abstractmethod
+    def apply(self, db: AppleHelpDeskDB) -> None:
+        pass
+
+    def _count(self, db: AppleHelpDeskDB, table: str, where: str = "1=1") -> int:
+        # A table an earlier pending step has not created yet holds no rows
+        cursor = db.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if cursor.fetchone()[0] == 0:
+            return 0
+        cursor = db.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}")
+        return cursor.fetchone()[0]
+
+
+class SqlScriptStep(MigrationStep):
+    """DDL script made of CREATE ... IF NOT EXISTS statements; touches no rows"""
+
+    def __init__(self, description: str, sql: str):
+        self.description = description
+        self.sql = sql
+
+    def estimate(self, db: AppleHelpDeskDB) -> Dict[str, Any]:
+        return {'rows': 0, 'transactions': 1, 'max_rows_per_transaction': 0}
+
+    def apply(self, db: AppleHelpDeskDB) -> None:
+        db.conn.executescript(self.sql)
+        db.conn.commit()
+
+
+class CreateIndexStep(MigrationStep):
+    """Build one index in its own transaction.
+
+    SQLite cannot build an index incrementally, so the write lock is held for
+    one full scan of the table; keeping each index in its own step bounds the
+    lock to a single index build instead of the whole migration.
+    """
+
+    def __init__(self, name: str, table: str, pause: float = 0.05):
+        self.name = name
+        self.table = table
+        self.pause = pause
+        self.description = f"Create index {name} on {table}"
+
+    def _exists(self, db: AppleHelpDeskDB) -> bool:
+        cursor = db.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = ?", (self.name,))
+        return cursor.fetchone()[0] > 0
+
+    def estimate(self, db: AppleHelpDeskDB) -> Dict[str, Any]:
+        if self._exists(db):
+            return {'rows': 0, 'transactions': 0, 'max_rows_per_transaction': 0}
+        rows = self._count(db, self.table)
+        return {'rows': rows, 'transactions': 1, 'max_rows_per_transaction': rows}
+
+    def apply(self, db: AppleHelpDeskDB) -> None:
+        if self._exists(db):
+            return
+        db.conn.execute(PERFORMANCE_INDEXES[self.name])
+        db.conn.execute(f"ANALYZE {self.name}")
+        db.conn.commit()
+        # Give waiting readers/writers a chance before the next index build
+        time.sleep(self.pause)
+
+
+class CallableStep(MigrationStep):
+    """Run a Python callable against the database in a single transaction
+
+    Used for the statistics backfill: the counters are aggregates that the
+    triggers keep up to date from the moment they exist, so they must be
+    computed from one snapshot of the table rather than in batches that
+    concurrent writes could change in between.
+    """
+
+    def __init__(self, description: str, func: Callable[[AppleHelpDeskDB], None],
+                 table: Optional[str] = None):
+        self.description = description
+        self.func = func
+        self.table = table
+
+    def estimate(self, db: AppleHelpDeskDB) -> Dict[str, Any]:
+        rows = self._count(db, self.table) if self.table else 0
+        return {'rows': rows, 'transactions': 1, 'max_rows_per_transaction': rows}
+
+    def apply(self, db: AppleHelpDeskDB) -> None:
+        self.func(db)
+        db.conn.commit()
+
+
+@dataclass
+class Migration:
+    """A versioned schema change made of one or more steps"""
+    version: int
+    description: str
+    steps: List[MigrationStep]
+
+
+# Migrations are append-only: never edit one that has shipped, add a new version instead
+MIGRATIONS = [
+    Migration(1, "Base helpdesk schema", [
+        SqlScriptStep("Create helpdesk tables, indexes and views", HELPDESK_SCHEMA_SQL),
+    ]),
+    Migration(2, "Composite and covering indexes for hot queries", [
+        CreateIndexStep(name, 'tickets') for name in (
+            'idx_tickets_status_created',
+            'idx_tickets_priority_created',
+            'idx_tickets_status_priority_created',
+            'idx_tickets_agent_created',
+            'idx_tickets_customer_created',
+            'idx_tickets_agent_status_priority',
+        )
+    ]),
+    Migration(3, "Materialized ticket statistics", [
+        CallableStep(
+            "Create statistics tables and triggers, backfill from tickets",
+            lambda db: db._ensure_ticket_statistics(),
+            table='tickets',
+        ),
+    ]),
+    Migration(4, "Case-insensitive customer email index", [
+        CreateIndexStep('idx_customers_email_nocase', 'customers'),
+    ]),
+    Migration(5, "Count tickets inserted already resolved or closed in the trend buckets", [
+        CallableStep(
+            "Replace the statistics triggers and recount from tickets",
+            lambda db: db.replace_ticket_statistics_triggers(),
+            table='tickets',
+        ),
+    ]),
+]
+
+
+class MigrationRunner:
+    """Applies pending MIGRATIONS and records them in the schema_version table"""
+
+    def __init__(self, db: AppleHelpDeskDB, migrations: List[Migration] = MIGRATIONS):
+        self.db = db
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+
+    def current_version(self) -> int:
+        """Highest applied version, 0 for a database that has never been migrated"""
+        cursor = self.db.conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        )
+        if cursor.fetchone()[0] == 0:
+            return 0
+        cursor = self.db.conn.execute("SELECT MAX(version) FROM schema_version")
+        return cursor.fetchone()[0] or 0
+
+    def pending(self, target: Optional[int] = None) -> List[Migration]:
+        current = self.current_version()
+        return [
+            migration for migration in self.migrations
+            if migration.version > current and (target is None or migration.version <= target)
+        ]
+
+    def migrate(self, target: Optional[int] = None, dry_run: bool = False) -> List[Dict]:
+        """
+        Apply pending migrations up to `target` (default: latest)
+        Args:
+            target: Highest version to apply
+            dry_run: Only report the estimated cost of each step
+        Returns:
+            One report per migration with per-step row counts, number of
+            transactions, largest transaction and (when applied) elapsed time
+        """
+        if not dry_run:
+            self.db.conn.executescript(SCHEMA_VERSION_SQL)
+
+        reports = []
+        for migration in self.pending(target):
+            report = {'version': migration.version, 'description': migration.description, 'steps': []}
+
+            for step in migration.steps:
+                step_report = {'description': step.description, **step.estimate(self.db)}
+                if not dry_run:
+                    start = time.perf_counter()
+                    step.apply(self.db)
+                    step_report['seconds'] = round(time.perf_counter() - start, 4)
+                report['steps'].append(step_report)
+
+            if not dry_run:
+                self.db.conn.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (migration.version, migration.description),
+                )
+                self.db.conn.commit()
+                print(f"Applied migration {migration.version}: {migration.description}")
+
+            reports.append(report)
+
+        return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply Apple Help Desk schema migrations")
+    parser.add_argument("--db", default="mcp_base/server/apple_helpdesk.db", help="Path to the SQLite database")
+    parser.add_argument("--target", type=int, default=None, help="Highest version to apply (default: latest)")
+    parser.add_argument("--dry-run", action="store_true", help="Report the estimated cost of each step only")
+    args = parser.parse_args()
+
+    db = AppleHelpDeskDB(args.db)
+    try:
+        runner = MigrationRunner(db)
+        print(f"Current schema version: {runner.current_version()}")
+        reports = runner.migrate(target=args.target, dry_run=args.dry_run)
+        print(json.dumps(reports, indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
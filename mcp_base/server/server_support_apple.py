@@ -1,26 +1,84 @@
+import asyncio
+import atexit
+import contextlib
 import json
+import signal
+import threading
 from typing import Any, Dict, List, Optional
 from mcp.server.fastmcp import FastMCP
 import os, sys
-from langchain_tavily import TavilySearch
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from mcp_base.server.apple_helpdesk_manager import AppleHelpDeskDB
-from rag.load import get_query
+from mcp_base.server.async_helpdesk_db import (AsyncAppleHelpDeskDB, DEFAULT_DB_PATH, create_result_cache,
+                                              write_options_from_env)
+from mcp_base.server.web_search import WebSearchService, create_search_service
+# rag.load defers langchain/Chroma/OpenAI imports to the first RAG call
+from rag.load import get_compact_query
 
-mcp = FastMCP("AssistantSupportApple")
+_warmed_up = False
+_warmup_lock = asyncio.Lock()
+
+@contextlib.asynccontextmanager
+async def _lifespan(server):
+    """Opt-in preload (MCP_WARMUP, see warmup.py) before the first request, however the server was started"""
+    global _warmed_up
+    # SSE enters the lifespan once per connection; warm up only the first time
+    async with _warmup_lock:
+        if not _warmed_up:
+            _warmed_up = True
+            from mcp_base.server.warmup import parse_warmup, warm_up
+
+            components = parse_warmup(os.getenv("MCP_WARMUP", ""))
+            if components:
+                await warm_up(helpdesk_db, components, web_search_factory=get_web_search)
+    yield {}
+
+# The lifespan also runs under `mcp run`, which imports this module and never reaches __main__
+mcp = FastMCP("AssistantSupportApple", lifespan=_lifespan)
+
+# Shared by every helpdesk tool: reads run on a thread pool, writes on a single
+# writer thread, so blocking sqlite3 calls never stall the server loop. Lookups
+# are cached until a write through this server changes what they read
+helpdesk_db = AsyncAppleHelpDeskDB(os.getenv("HELPDESK_DB_PATH", DEFAULT_DB_PATH), result_cache=create_result_cache(),
+                                   **write_options_from_env())
+# Writes the buffered KB view counts on shutdown
+atexit.register(helpdesk_db.close)
+
+def _exit_on_sigterm(signum, frame):
+    # The default SIGTERM action skips atexit, and with it the buffered view counts
+    sys.exit(128 + signum)
+
+if threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+
+# Cached, deduplicated web search; WEB_SEARCH_BACKEND=fixture runs it offline.
+# Created on the first search so the Tavily client is not imported at startup
+_web_search: Optional[WebSearchService] = None
+_web_search_lock = threading.Lock()
+
+def get_web_search() -> WebSearchService:
+    global _web_search
+    with _web_search_lock:
+        if _web_search is None:
+            _web_search = create_search_service()
+        return _web_search
+
+# Retrieval is blocking (embeddings, index search); run it off the server loop, a
+# bounded number at a time, so one shared server keeps answering other tools
+_rag_slots = asyncio.Semaphore(int(os.getenv("MCP_RAG_CONCURRENCY", "4")))
 
 @mcp.tool()
-def get_info_support_apple(query: str):
+async def get_info_support_apple(query: str):
     """Tool to get information about Apple support"""
     print("...")
-    response = get_query(query)
+    async with _rag_slots:
+        response = await asyncio.to_thread(get_compact_query, query)
     #return "Apple support information"
     return response
 
 # creating tool search
 @mcp.tool()
-def search_web(query: str):
+async def search_web(query: str):
     """
     Searches for information on the web based on the given query.
 
@@ -30,65 +88,81 @@ def search_web(query: str):
     Returns:
     The information found on the web or a message below that no information was found
     """
-    tavily_search = TavilySearch(max_results=3)
-    search_docs = tavily_search.invoke(query)
-
-    return search_docs["results"]
+    try:
+        return await get_web_search().search(query)
+    except asyncio.TimeoutError:
+        print(f"Web search timed out for: {query}")
+        return "No information was found on the web (search timed out)"
 
 ##################################################################
 ####
 ## SEARCH UTILITY FUNCTIONS
 ##################################################################
 @mcp.tool()
-def search_tickets(**kwargs) -> List[Dict]:
+async def search_tickets(**kwargs) -> List[Dict]:
     try:
-        db = AppleHelpDeskDB()
-        return db.search_tickets(**kwargs)
+        return await helpdesk_db.search_tickets(**kwargs)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def search_knowledge_base(search_term: str, category_id: Optional[int] = None, limit: int = 10) -> List[Dict]:
+async def search_tickets_page(status: Optional[str] = None, priority: Optional[str] = None,
+                              agent_id: Optional[int] = None, customer_email: Optional[str] = None,
+                              category: Optional[str] = None, product_line: Optional[str] = None,
+                              page_size: int = 20, cursor: Optional[str] = None,
+                              columns: Optional[List[str]] = None, ticket_number: Optional[str] = None) -> Dict:
+    """
+    Pages through tickets newest first. Pass the returned 'next_cursor' back as
+    'cursor' to get the next page; restrict 'columns' (e.g. ["ticket_number",
+    "subject", "status"]) to avoid returning full descriptions. 'ticket_number'
+    (e.g. "APL-2024-004") looks up a single ticket.
+    """
     try:
-        db = AppleHelpDeskDB()
-        return db.search_knowledge_base(search_term=search_term, category_id=category_id, limit=limit)
+        return await helpdesk_db.search_tickets_page(
+            page_size=page_size,
+            cursor=cursor,
+            columns=columns,
+            status=status,
+            priority=priority,
+            agent_id=agent_id,
+            customer_email=customer_email,
+            category=category,
+            product_line=product_line,
+            ticket_number=ticket_number,
+        )
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def get_customer_by_email(email: str) -> Optional[Dict]:
+async def search_knowledge_base(search_term: str, category_id: Optional[int] = None, limit: int = 10) -> List[Dict]:
     try:
-        db = AppleHelpDeskDB()
-        return db.get_customer_by_email(email=email)
+        return await helpdesk_db.search_knowledge_base(search_term=search_term, category_id=category_id, limit=limit)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def get_agent_workload(agent_id: int) -> Dict:
+async def get_customer_by_email(email: str) -> Optional[Dict]:
     try:
-        db = AppleHelpDeskDB()
-        return db.get_agent_workload(agent_id)
+        return await helpdesk_db.get_customer_by_email(email=email)
+    except Exception as e:
+        print(f"Error: {e}")
+
+@mcp.tool()
+async def get_agent_workload(agent_id: int) -> Dict:
+    try:
+        return await helpdesk_db.get_agent_workload(agent_id)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 ##################################################################
 # PERSISTENCE UTILITY FUNCTIONS
 ##################################################################
 @mcp.tool()
-def create_ticket(customer_id: int, category_id: int, subject: str, description: str, 
+async def create_ticket(customer_id: int, category_id: int, subject: str, description: str, 
                      priority: str = 'Medium', product_id: Optional[int] = None, 
                      serial_number: Optional[str] = None, ios_version: Optional[str] = None) -> str:
     try:
-        db = AppleHelpDeskDB()
-        return db.create_ticket(
+        return await helpdesk_db.create_ticket(
             customer_id=customer_id, 
             category_id=category_id, 
             subject=subject, 
@@ -100,26 +174,20 @@ def create_ticket(customer_id: int, category_id: int, subject: str, description:
         )
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def update_ticket_status(ticket_id: int, status: str, agent_id: Optional[int] = None, 
+async def update_ticket_status(ticket_id: int, status: str, agent_id: Optional[int] = None, 
                            resolution: Optional[str] = None) -> bool:
     try:
-        db = AppleHelpDeskDB()
-        return db.update_ticket_status(ticket_id=ticket_id, status=status, agent_id=agent_id, resolution=resolution)
+        return await helpdesk_db.update_ticket_status(ticket_id=ticket_id, status=status, agent_id=agent_id, resolution=resolution)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def add_ticket_comment(ticket_id: int, content: str, agent_id: Optional[int] = None, 
+async def add_ticket_comment(ticket_id: int, content: str, agent_id: Optional[int] = None, 
                           comment_type: str = 'note', is_public: bool = False) -> int:
     try:
-        db = AppleHelpDeskDB()
-        return db.add_ticket_comment(
+        return await helpdesk_db.add_ticket_comment(
             ticket_id=ticket_id,
             content=content,
             agent_id=agent_id,
@@ -128,64 +196,74 @@ def add_ticket_comment(ticket_id: int, content: str, agent_id: Optional[int] = N
         )
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def create_customer(first_name: str, last_name: str, email: str, 
+async def create_customer(first_name: str, last_name: str, email: str, 
                        phone: Optional[str] = None, apple_id: Optional[str] = None) -> int:
     try:
-        db = AppleHelpDeskDB()
-        return db.create_customer(first_name, last_name, email, phone, apple_id)
+        return await helpdesk_db.create_customer(first_name, last_name, email, phone, apple_id)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def create_kb_article(title: str, content: str, category_id: int, 
+async def create_kb_article(title: str, content: str, category_id: int, 
                          created_by: int, product_id: Optional[int] = None, 
                          tags: Optional[str] = None) -> int:
     try:
-        db = AppleHelpDeskDB()
-        return db.create_kb_article(title, content, category_id, created_by, product_id, tags)
+        return await helpdesk_db.create_kb_article(title, content, category_id, created_by, product_id, tags)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 @mcp.tool()
-def increment_kb_view_count(article_id: int):
+async def increment_kb_view_count(article_id: int):
     try:
-        db = AppleHelpDeskDB()
-        return db.increment_kb_view_count(article_id)
+        return await helpdesk_db.increment_kb_view_count(article_id)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 ##################################################################
 # Reporting functions
 ##################################################################
 @mcp.tool()
-def get_ticket_statistics() -> Dict:
+async def get_ticket_statistics() -> Dict:
     try:
-        db = AppleHelpDeskDB()
-        return db.get_ticket_statistics()
+        return await helpdesk_db.get_ticket_statistics()
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
-if __name__ == "__main__":
-    # Para desenvolvimento local, usar stdio
-    mcp.run(transport="stdio")
-    
-    # Para servidor remoto, usar HTTP streamable (recomendado para produção)
-    # mcp.run(
-    #     transport="http",
-    #     host="127.0.0.1",
-    #     port=4200,
-    #     log_level="info"
-    # )
+@mcp.tool()
+async def get_ticket_trends(period: str = 'day', limit: int = 30) -> List[Dict]:
+    try:
+        return await helpdesk_db.get_ticket_trends(period=period, limit=limit)
+    except Exception as e:
+        print(f"Error: {e}")
+
+@mcp.tool()
+def get_result_cache_stats() -> Dict:
+    """Hit rates, size, evictions and invalidations of the helpdesk lookup cache"""
+    try:
+        return helpdesk_db.result_cache_stats()
+    except Exception as e:
+        print(f"Error: {e}")
 
+@mcp.tool()
+def get_write_stats() -> Dict:
+    """Group commit sizes, commit latency and buffered KB view counts of the helpdesk database"""
+    try:
+        return helpdesk_db.write_stats()
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    # Para desenvolvimento local, usar stdio (um processo por cliente).
+    # Para servidor compartilhado, MCP_TRANSPORT=streamable-http (ou sse): um processo
+    # de longa duração, com um banco e um índice, atende todos os workers (MCP_SERVER_URL)
+    transport = os.getenv("MCP_TRANSPORT", "stdio")
+    if transport not in ("stdio", "sse", "streamable-http"):
+        raise ValueError(f"Unknown MCP_TRANSPORT: {transport}, expected stdio, sse or streamable-http")
+    if transport != "stdio":
+        mcp.settings.host = os.getenv("MCP_HOST", "127.0.0.1")
+        mcp.settings.port = int(os.getenv("MCP_PORT", "4200"))
+        path = mcp.settings.sse_path if transport == "sse" else mcp.settings.streamable_http_path
+        print(f"Serving MCP over {transport} at http://{mcp.settings.host}:{mcp.settings.port}{path}", file=sys.stderr)
+    mcp.run(transport=transport)
@@ -0,0 +1,109 @@
+"""
+Opt-in warm-up for the MCP support server
+
+The server imports langchain, Chroma and the search client only when a tool
+first needs them, so it starts quickly but the first RAG or web search call
+pays for those imports, for opening the index and for connecting the
+embedding client. MCP_WARMUP moves that work before the server reports
+ready:
+
+    MCP_WARMUP=all                       # every component
+    MCP_WARMUP=vectordb,db               # a subset of embeddings, vectordb, db, web_search
+"""
+
+import asyncio
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+WARMUP_COMPONENTS = ("embeddings", "vectordb", "db", "web_search")
+
+
+def parse_warmup(value: str) -> List[str]:
+    """Components named by MCP_WARMUP; empty, "0" or "false" disables warm-up"""
+    value = (value or "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return []
+    if value in ("1", "true", "yes", "on", "all"):
+        return list(WARMUP_COMPONENTS)
+    components = [part.strip() for part in value.split(",") if part.strip()]
+    unknown = [part for part in components if part not in WARMUP_COMPONENTS]
+    if unknown:
+        raise ValueError(f"Unknown MCP_WARMUP component(s) {', '.join(unknown)}, expected {', '.join(WARMUP_COMPONENTS)}")
+    return components
+
+
+def warm_embeddings() -> Dict[str, Any]:
+    """Create the embedding client and embed one query (opens the HTTP connection for OpenAI)"""
+    from rag.load import get_embeddings
+
+    return {"dimensions": len(get_embeddings().embed_query("warm up"))}
+
+
+def warm_vector_store() -> Dict[str, Any]:
+    """Open the index and run one retrieval with the configured strategy (builds lexical/rerank state)"""
+    from rag.load import get_retrieval_strategy, get_vectordb
+
+    strategy = get_retrieval_strategy()
+    docs = strategy.retrieve(get_vectordb(), "warm up")
+    return {"strategy": strategy.describe(), "documents": len(docs)}
+
+
+def _timed(name: str, function: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        result = function() or {}
+    except Exception as e:
+        print(f"Warm-up of {name} failed: {e}", file=sys.stderr)
+        result = {"error": str(e)}
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+async def warm_up(helpdesk_db, components: List[str], web_search_factory: Callable[[], Any] = None) -> Dict[str, Any]:
+    """
+    Preload the given components; the database runs concurrently with the RAG components
+    Args:
+        helpdesk_db: The server's AsyncAppleHelpDeskDB
+        components: Names from WARMUP_COMPONENTS
+        web_search_factory: Returns the server's search service (creates the backend client)
+    Returns:
+        Per-component timings and details, plus the total seconds
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+
+    def warm_rag() -> Dict[str, Any]:
+        results = {}
+        # Embeddings first: opening the vector store reuses the same client
+        if "embeddings" in components:
+            results["embeddings"] = _timed("embeddings", warm_embeddings)
+        if "vectordb" in components:
+            results["vectordb"] = _timed("vectordb", warm_vector_store)
+        if "web_search" in components and web_search_factory is not None:
+            results["web_search"] = _timed("web_search", lambda: {"backend": type(web_search_factory().backend).__name__})
+        return results
+
+    async def warm_db() -> Dict[str, Any]:
+        db_start = time.perf_counter()
+        try:
+            result = await helpdesk_db.warm_up()
+        except Exception as e:
+            print(f"Warm-up of db failed: {e}", file=sys.stderr)
+            result = {"error": str(e)}
+        result["seconds"] = round(time.perf_counter() - db_start, 4)
+        return {"db": result}
+
+    tasks = [loop.run_in_executor(None, warm_rag)]
+    if "db" in components:
+        tasks.append(warm_db())
+
+    results: Dict[str, Any] = {}
+    for part in await asyncio.gather(*tasks):
+        results.update(part)
+
+    total = round(time.perf_counter() - start, 4)
+    summary = ", ".join(f"{name} {result['seconds']:.2f}s" for name, result in results.items())
+    # stderr: stdout carries the MCP stdio protocol
+    print(f"Warm-up finished in {total:.2f}s ({summary})", file=sys.stderr)
+    return {"components": results, "seconds": total}
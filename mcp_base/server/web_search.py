@@ -0,0 +1,155 @@
+"""
+Web search layer for the search_web MCP tool
+
+Wraps a pluggable search backend with a TTL + LRU cache keyed on the
+normalized query and coalesces concurrent identical searches into a single
+backend call. The fixture backend answers from a local JSON file so the
+search path can be exercised and load-tested without network access.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from cache import TTLCache
+
+DEFAULT_FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "web_search.json")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so near-identical queries share a key"""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+class SearchBackend(ABC):
+    """Abstract base class for web search backends"""
+
+    @abstractmethod
+    def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        pass
+
+
+class TavilySearchBackend(SearchBackend):
+    """Tavily backend; one client is reused for every search"""
+
+    def __init__(self, max_results: int = 3):
+        from langchain_tavily import TavilySearch
+
+        self.client = TavilySearch(max_results=max_results)
+
+    def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        return self.client.invoke(query)["results"][:max_results]
+
+
+class FixtureSearchBackend(SearchBackend):
+    """Offline backend answering from a JSON fixture file.
+
+    The file maps queries to Tavily-shaped results ({url, title, content,
+    score}). Queries without an exact entry get the results of the entry
+    sharing the most words with them. `latency` (seconds) simulates the
+    round-trip so load tests see realistic timings.
+    """
+
+    def __init__(self, path: str = DEFAULT_FIXTURES_PATH, latency: float = 0.0):
+        with open(path, encoding="utf-8") as f:
+            fixtures = json.load(f)
+        self.fixtures = {normalize_query(query): results for query, results in fixtures.items()}
+        self.latency = latency
+
+    def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        if self.latency:
+            time.sleep(self.latency)
+
+        key = normalize_query(query)
+        if key not in self.fixtures:
+            words = set(key.split())
+            key = max(self.fixtures, key=lambda candidate: len(words & set(candidate.split())), default=None)
+            if key is None or not words & set(key.split()):
+                return []
+        return self.fixtures[key][:max_results]
+
+
+class WebSearchService:
+    """Cached, deduplicated front end for a SearchBackend"""
+
+    def __init__(self, backend: SearchBackend, max_results: int = 3, timeout: float = 15.0,
+                 cache_ttl: float = 3600.0, cache_size: int = 512):
+        self.backend = backend
+        self.max_results = max_results
+        self.timeout = timeout
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.backend_calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def search(self, query: str) -> List[Dict[str, Any]]:
+        """Return results for the query, sharing cached and in-flight results"""
+        key = normalize_query(query)
+        results = self.cache.get(key)
+        if results is not None:
+            return results
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._fetch(key, query))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so one caller giving up does not cancel the search for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, query: str) -> List[Dict[str, Any]]:
+        self.backend_calls += 1
+        loop = asyncio.get_running_loop()
+        try:
+            results = await asyncio.wait_for(
+                loop.run_in_executor(None, self.backend.search, query, self.max_results),
+                timeout=self.timeout,
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+        self.cache.set(key, results)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend_calls": self.backend_calls,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "cache": self.cache.stats(),
+        }
+
+
+def create_search_service() -> WebSearchService:
+    """Build the search service from WEB_SEARCH_* environment variables"""
+    backend_name = os.getenv("WEB_SEARCH_BACKEND", "tavily")
+    max_results = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "3"))
+
+    backend: Optional[SearchBackend] = None
+    if backend_name == "fixture":
+        backend = FixtureSearchBackend(
+            path=os.getenv("WEB_SEARCH_FIXTURES", DEFAULT_FIXTURES_PATH),
+            latency=float(os.getenv("WEB_SEARCH_FIXTURE_LATENCY", "0")),
+        )
+    elif backend_name == "tavily":
+        backend = TavilySearchBackend(max_results=max_results)
+    else:
+        raise ValueError(f"Unknown WEB_SEARCH_BACKEND '{backend_name}', expected 'tavily' or 'fixture'")
+
+    return WebSearchService(
+        backend,
+        max_results=max_results,
+        timeout=float(os.getenv("WEB_SEARCH_TIMEOUT", "15")),
+        cache_ttl=float(os.getenv("WEB_SEARCH_CACHE_TTL", "3600")),
+        cache_size=int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512")),
+    )
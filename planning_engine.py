@@ -1,6 +1,6 @@
 import json
 from typing import Dict, Any
-from llm_provider import OpenAIProvider
+from llm_provider import create_llm_provider, get_stage_model
 from reasoning import ReasoningType
 from plan import Plan
 
@@ -28,7 +28,7 @@ Return ONLY valid JSON in this exact format (no additional text, explanations, o
     "action": "true|false"
 }}
         """
-        llm_provider = OpenAIProvider()
+        llm_provider = create_llm_provider(get_stage_model("planner"))
         response = llm_provider.query(prompt=prompt)
         response = json.loads(response)
 
@@ -0,0 +1,385 @@
+"""
+Pre-fork multi-process serving for AgenticRAGSystem
+
+One AgenticRAGSystem is capped at one core by the GIL and its synchronous
+planning and generation steps. PreforkPool serves with several processes
+instead, without paying the start-up cost once per process: the master
+imports the pipeline (agents SDK, OpenAI client, aggregator) and reads the
+configuration (.env) once, freezes that heap so the collector does not dirty its
+pages, and forks workers that share it copy-on-write. The vector index and
+the helpdesk/knowledge base database are loaded once as well, by a single
+network MCP server the master starts for its workers (the shared server mode
+of mcp_base/client/shared_session.py), instead of by a stdio server per query.
+
+Workers pull queries from a shared queue and send BatchResults back, so a
+slow query only holds up its own worker. A worker that fails to start or dies
+leaves the others serving; a query it died on comes back as an error result,
+and the pool only fails once no worker is left. Per-worker RSS, PSS (RSS with shared
+pages divided among the processes sharing them) and private memory, and the
+aggregate throughput, are in PreforkPool.stats().
+
+    PREFORK_WORKERS=4            # worker processes (default: CPU count)
+    PREFORK_MCP_SERVER=1         # start one network MCP server when MCP_SERVER_URL is unset (0: stdio per query)
+
+The LLM_RPM, LLM_TPM and LLM_MAX_CONCURRENCY limits (see scheduler.py) are
+for the whole pool: each worker schedules against its share of them.
+
+Usage (from the repository root):
+    python prefork.py --workers 4 < queries.txt
+"""
+
+import argparse
+import contextlib
+import gc
+import importlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from batch import BatchProgress, BatchResult
+
+# Imported by the master so every worker inherits them instead of importing its own copy
+PRELOAD_MODULES = ("openai", "agents", "agents.mcp", "llm_provider", "cascade", "scheduled_model", "aggregator",
+                   "agenticRagSystem", "mcp_base.client.commands", "mcp_base.client.shared_session")
+SHARED_LIMITS = ("LLM_RPM", "LLM_TPM", "LLM_MAX_CONCURRENCY")
+
+
+def memory_kb(pid: Any = "self") -> Dict[str, int]:
+    """RSS, PSS, shared and private memory of a process in KiB (RSS only where smaps_rollup is unavailable)"""
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+              "Private_Clean": "private", "Private_Dirty": "private"}
+    usage = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    usage[fields[name]] += int(value.split()[0])
+        return usage
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            usage["rss"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        pass
+    return usage
+
+
+@dataclass
+class WorkerStats:
+    """Queries served by one worker and its memory when it was last measured"""
+    worker: int
+    pid: int
+    queries: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    memory_kb: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def update(self, result: BatchResult):
+        self.queries += 1
+        self.busy_seconds += result.seconds
+        if not result.ok:
+            self.errors += 1
+
+
+def preload(modules: Iterable[str] = PRELOAD_MODULES) -> Dict[str, float]:
+    """Import `modules` in this process; seconds per module (modules that fail to import are skipped)"""
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Preload of {name} skipped: {e}", file=sys.stderr)
+            continue
+        timings[name] = round(time.perf_counter() - start, 4)
+    return timings
+
+
+def create_system(flag_queries_loop: bool = True):
+    """Default worker system: one AgenticRAGSystem per worker process"""
+    from agenticRagSystem import AgenticRAGSystem
+
+    return AgenticRAGSystem(flag_queries_loop)
+
+
+def _share_limits(workers: int):
+    """Give this worker its share of the pool-wide LLM limits"""
+    for name in SHARED_LIMITS:
+        value = float(os.getenv(name, "0"))
+        if value:
+            share = value / workers
+            os.environ[name] = str(max(1, int(share)) if name == "LLM_MAX_CONCURRENCY" else share)
+
+
+def _close_worker_clients():
+    # Worker processes end with os._exit, which skips these atexit handlers
+    from mcp_base.client.commands import close_command_layer
+    from mcp_base.client.shared_session import close_shared_sessions
+
+    close_command_layer()
+    close_shared_sessions()
+
+
+def _worker_main(worker: int, workers: int, tasks, results, system_factory: Callable[[], Any]):
+    # The pipeline prints its progress; stdout belongs to the master (e.g. the JSON lines of main())
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            _serve(worker, workers, tasks, results, system_factory)
+        finally:
+            results.close()
+
+
+def _serve(worker: int, workers: int, tasks, results, system_factory: Callable[[], Any]):
+    """Serve queries from `tasks`, sending messages to the master over the `results` pipe"""
+    stats = WorkerStats(worker, os.getpid())
+    try:
+        _share_limits(workers)
+        system = system_factory()
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, query = task
+            # Lets the master answer the query with an error if this process dies on it
+            results.send(("start", worker, task))
+            result = BatchResult(index=index, query=query)
+            start = time.perf_counter()
+            try:
+                result.response = system.query(query)
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+            result.seconds = time.perf_counter() - start
+            aggregator = getattr(system, "aggregator", None)
+            result.timings = dict(getattr(aggregator, "last_timings", None) or {})
+            stats.update(result)
+            results.send(("result", worker, result))
+    except Exception as e:
+        stats.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _close_worker_clients()
+        finally:
+            stats.memory_kb = memory_kb()
+            results.send(("worker", worker, stats))
+
+
+class PreforkPool:
+    """
+    Master of `workers` forked query-serving processes
+
+    start() preloads the shared resources and forks the workers; map() feeds
+    them queries and yields results as they complete; close() stops them and
+    collects their final stats. Also usable as a context manager.
+    """
+
+    def __init__(self, workers: Optional[int] = None, system_factory: Callable[[], Any] = create_system,
+                 mcp_server: Optional[bool] = None, preload_modules: Iterable[str] = PRELOAD_MODULES,
+                 max_pending: Optional[int] = None):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("Pre-fork serving needs the fork start method, which this platform does not have")
+        self.workers = workers or int(os.getenv("PREFORK_WORKERS", "0")) or os.cpu_count() or 1
+        self.system_factory = system_factory
+        self.mcp_server = mcp_server if mcp_server is not None else os.getenv("PREFORK_MCP_SERVER", "1") != "0"
+        self.preload_modules = tuple(preload_modules)
+        # Queries handed to the queue ahead of the results, so map() consumes its input lazily
+        self.max_pending = max_pending or self.workers * 2
+        self._context = multiprocessing.get_context("fork")
+        self._processes: Dict[int, Any] = {}
+        self._tasks = None
+        # One pipe per worker rather than a Queue: sends are synchronous, so nothing
+        # a worker sent is lost if it dies, and its pipe reports EOF once it has
+        self._pipes: Dict[int, Any] = {}
+        self._resources = contextlib.ExitStack()
+        self._worker_stats: Dict[int, WorkerStats] = {}
+        # (index, query) each worker is serving right now
+        self._serving: Dict[int, Any] = {}
+        self._next_index = 0
+        self.preload_timings: Dict[str, float] = {}
+        self.server_url: Optional[str] = None
+        self.progress: Optional[BatchProgress] = None
+        self.seconds = 0.0
+
+    def __enter__(self) -> "PreforkPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # MASTER
+
+    def _start_mcp_server(self):
+        if not self.mcp_server or os.getenv("MCP_SERVER_URL"):
+            return
+        from mcp_base.client.shared_session import free_port, local_network_server, server_url
+
+        port = free_port()
+        # The server preloads the index and database pages before it listens
+        env = dict(os.environ)
+        env.setdefault("MCP_WARMUP", "all")
+        try:
+            self._resources.enter_context(local_network_server("streamable-http", port, env=env))
+        except RuntimeError as e:
+            print(f"Shared MCP server unavailable ({e}); workers start a stdio server per query", file=sys.stderr)
+            return
+        self.server_url = server_url("streamable-http", port)
+        os.environ["MCP_SERVER_URL"] = self.server_url
+        self._resources.callback(os.environ.pop, "MCP_SERVER_URL", None)
+
+    def start(self):
+        """Load the shared resources once and fork the workers"""
+        if self._processes:
+            return
+        start = time.perf_counter()
+        self._start_mcp_server()
+        self.preload_timings = preload(self.preload_modules)
+        self._tasks = self._context.Queue()
+        # Objects created so far are never collected, so collections in the
+        # workers do not write to (and un-share) the pages holding them
+        gc.collect()
+        gc.freeze()
+        # Unflushed output would be written again by every worker
+        sys.stdout.flush()
+        try:
+            for worker in range(self.workers):
+                reader, writer = self._context.Pipe(duplex=False)
+                process = self._context.Process(target=_worker_main, name=f"prefork-worker-{worker}", daemon=True,
+                                                args=(worker, self.workers, self._tasks, writer, self.system_factory))
+                process.start()
+                writer.close()
+                self._processes[worker] = process
+                self._pipes[worker] = reader
+                self._worker_stats[worker] = WorkerStats(worker, process.pid)
+        finally:
+            gc.unfreeze()
+        self.preload_timings["total"] = round(time.perf_counter() - start, 4)
+        print(f"Pre-fork pool: {self.workers} workers started in {self.preload_timings['total']:.2f}s",
+              file=sys.stderr)
+
+    def _receive(self) -> Optional[tuple]:
+        """Next message from any worker; None when no worker is left"""
+        while self._pipes:
+            workers = {pipe: worker for worker, pipe in self._pipes.items()}
+            for pipe in multiprocessing.connection.wait(list(workers)):
+                try:
+                    return pipe.recv()
+                except EOFError:
+                    # Everything the worker sent has been read: it has exited
+                    worker = workers[pipe]
+                    pipe.close()
+                    del self._pipes[worker]
+                    self._processes[worker].join()
+                    if worker in self._serving:
+                        # It died on this query; answer it with an error, the other workers carry on
+                        index, query = self._serving[worker]
+                        process = self._processes[worker]
+                        return "result", worker, BatchResult(
+                            index=index, query=query, error=f"Worker {process.name} exited with code {process.exitcode}")
+        return None
+
+    def map(self, queries: Iterable[str]) -> Iterator[BatchResult]:
+        """Serve `queries` on the workers, yielding results as they complete"""
+        self.start()
+        self.progress = BatchProgress()
+        queries = iter(queries)
+        pending = 0
+        exhausted = False
+        while True:
+            while not exhausted and pending < self.max_pending:
+                query = next(queries, None)
+                if query is None:
+                    exhausted = True
+                    break
+                self._tasks.put((self._next_index, query))
+                self._next_index += 1
+                pending += 1
+            if not pending:
+                self.seconds = self.progress.elapsed
+                return
+            message = self._receive()
+            if message is None:
+                raise RuntimeError(f"Every pre-fork worker has exited with {pending} queries unanswered")
+            kind, worker, payload = message
+            if kind == "start":
+                self._serving[worker] = payload
+                continue
+            if kind == "worker":
+                # A worker that stopped early (e.g. its system failed to start); the others carry on
+                self._worker_stats[worker] = payload
+                print(f"Pre-fork worker {worker} stopped: {payload.error}", file=sys.stderr)
+                continue
+            del self._serving[worker]
+            pending -= 1
+            self._worker_stats[worker].update(payload)
+            self.progress.update(payload)
+            yield payload
+
+    def close(self):
+        """Stop the workers after their current query, collect their stats and stop the MCP server"""
+        for _ in self._pipes:
+            self._tasks.put(None)
+        # Read until every worker has exited (its pipe reports EOF)
+        while (message := self._receive()) is not None:
+            kind, worker, payload = message
+            if kind == "worker":
+                self._worker_stats[worker] = payload
+            elif kind == "start":
+                self._serving[worker] = payload
+            else:
+                self._serving.pop(worker, None)
+        for process in self._processes.values():
+            process.join(timeout=10)
+            if process.exitcode is None:
+                process.terminate()
+        self._resources.close()
+
+    # METRICS
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-worker queries and memory (live workers are measured now), master memory and throughput"""
+        workers = []
+        for worker, stats in sorted(self._worker_stats.items()):
+            row = asdict(stats)
+            if self._processes[worker].exitcode is None:
+                row["memory_kb"] = memory_kb(stats.pid)
+            row["busy_seconds"] = round(row["busy_seconds"], 3)
+            workers.append(row)
+        progress = self.progress
+        return {
+            "workers": workers,
+            "master_memory_kb": memory_kb(),
+            "total_pss_kb": sum(row["memory_kb"].get("pss", 0) for row in workers),
+            "preload_seconds": self.preload_timings,
+            "mcp_server_url": self.server_url,
+            "queries": progress.completed if progress else 0,
+            "errors": progress.failed if progress else 0,
+            "seconds": round(self.seconds, 3),
+            "qps": round(progress.completed / self.seconds, 3) if progress and self.seconds else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve queries (one per line on stdin) from pre-forked workers")
+    parser.add_argument("--workers", type=int, help="Worker processes (default PREFORK_WORKERS or the CPU count)")
+    parser.add_argument("--no-mcp-server", action="store_true", help="Let each query start its own stdio server")
+    args = parser.parse_args()
+
+    queries = (line.strip() for line in sys.stdin if line.strip())
+    with PreforkPool(args.workers, mcp_server=False if args.no_mcp_server else None) as pool:
+        for result in pool.map(queries):
+            print(json.dumps({"index": result.index, "query": result.query, "response": result.response,
+                              "error": result.error, "seconds": round(result.seconds, 3)}, ensure_ascii=False))
+    print(json.dumps(pool.stats(), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
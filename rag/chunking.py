@@ -0,0 +1,331 @@
+"""
+Chunkers for the PDF manuals
+
+The structure-aware chunker follows the layout of the support guides:
+product sections (headings rendered with a leading icon), sub-headings ending
+in ":", numbered troubleshooting steps and "Topic: advice" lines. Chunks are
+packed from whole sections and never split a step; each chunk starts with
+its heading path, so no character overlap is needed. Text that is too long
+for one chunk is split at sentence boundaries using per-language
+abbreviation lists. Page headers repeated by the browser print are removed.
+
+Chunkers are selected with a spec string such as "structure:chunk_size=1000"
+or "recursive:chunk_size=1000,chunk_overlap=100" (RAG_CHUNKER); the recursive
+splitter is the chunking used before the structure-aware one. Run
+benchmarks/tune_chunking.py to compare configurations.
+"""
+
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+DEFAULT_CHUNKER = "structure:chunk_size=1000,min_chunk_size=500"
+
+PAGE_HEADER_PATTERNS = [
+    re.compile(r"^\d{2}/\d{2}/\d{4}, \d{2}:\d{2}"),
+    re.compile(r"^P[áa]gina \d+ de \d+"),
+    re.compile(r"^file:///"),
+]
+STEP_PATTERN = re.compile(r"^\d+\.\s+")
+TOPIC_PATTERN = re.compile(r"^[A-ZÀ-Ý0-9][^:.]{1,60}:\s+\S")
+SUBHEADING_PATTERN = re.compile(r"^[^.]{2,80}:$")
+# Lowercase start of a wrapped line; product names such as iPhone or macOS are not
+STARTS_LOWER_PATTERN = re.compile(r"^(?!(?:i|mac|watch|tv)[A-Z])[a-zà-ÿ]")
+
+ABBREVIATIONS = {
+    "en": {"e.g", "i.e", "etc", "vs", "approx", "no", "min", "max", "inc", "dr", "mr", "mrs"},
+    "pt": {"ex", "p.ex", "etc", "aprox", "sr", "sra", "dr", "dra", "nº", "min", "máx", "pág"},
+}
+LANGUAGE_WORDS = {
+    "en": {"the", "and", "to", "of", "with", "for", "your", "if", "check", "on", "device"},
+    "pt": {"de", "da", "do", "para", "não", "com", "que", "em", "se", "ou", "dispositivo"},
+}
+
+
+def detect_language(text: str) -> str:
+    """'en' or 'pt' by stopword counts"""
+    words = re.findall(r"\w+", text.lower())
+    counts = {language: sum(1 for word in words if word in vocabulary) for language, vocabulary in LANGUAGE_WORDS.items()}
+    return max(counts, key=counts.get)
+
+
+def split_sentences(text: str, language: str = "en") -> List[str]:
+    """Sentence split that does not break after the language's common abbreviations"""
+    abbreviations = ABBREVIATIONS.get(language, set())
+    sentences, start = [], 0
+    for match in re.finditer(r"[.!?]+(?=\s+[A-ZÀ-Ý0-9\"(])", text):
+        previous_word = re.findall(r"[\w.º]+$", text[start:match.start()])
+        if previous_word and previous_word[0].lower().rstrip(".") in abbreviations:
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+@dataclass
+class Section:
+    """Heading path plus the blocks (steps, topic lines, paragraphs) under it"""
+    headings: List[str]
+    page: Any
+    blocks: List[str] = field(default_factory=list)
+
+
+class Chunker(ABC):
+    """Abstract splitter from loaded PDF pages to chunks"""
+    name = "base"
+
+    @abstractmethod
+    def split_documents(self, pages: Sequence[Document]) -> List[Document]:
+        pass
+
+    def params(self) -> Dict[str, Any]:
+        return {}
+
+    def describe(self) -> str:
+        return f"{self.name}:" + ",".join(f"{key}={value}" for key, value in self.params().items())
+
+
+class RecursiveChunker(Chunker):
+    """The original fixed-size character splitter"""
+    name = "recursive"
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_documents(self, pages: Sequence[Document]) -> List[Document]:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            separators=["\n\n", "\n", ".", " ", ""]
+        )
+        return splitter.split_documents(pages)
+
+    def params(self) -> Dict[str, Any]:
+        return {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+
+
+class StructureAwareChunker(Chunker):
+    """Section-packing chunker for the support guides"""
+    name = "structure"
+
+    def __init__(self, chunk_size: int = 1000, min_chunk_size: int = 500):
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+
+    def params(self) -> Dict[str, Any]:
+        return {"chunk_size": self.chunk_size, "min_chunk_size": self.min_chunk_size}
+
+    def split_documents(self, pages: Sequence[Document]) -> List[Document]:
+        by_source: Dict[str, List[Document]] = {}
+        for page in pages:
+            by_source.setdefault(page.metadata.get("source", ""), []).append(page)
+
+        chunks = []
+        for source, source_pages in by_source.items():
+            language = detect_language(" ".join(page.page_content for page in source_pages))
+            sections = self._sections(source_pages)
+            chunks.extend(self._pack(sections, source, language))
+        return chunks
+
+    # PARSING
+
+    @staticmethod
+    def _lines(pages: Sequence[Document]) -> List[Tuple[str, Any]]:
+        """Non-empty (raw line, page) pairs of every page in order, without the printed page headers"""
+        lines = []
+        for page in pages:
+            for line in page.page_content.split("\n"):
+                stripped = line.strip()
+                if stripped and not any(pattern.match(stripped) for pattern in PAGE_HEADER_PATTERNS):
+                    lines.append((line, page.metadata.get("page")))
+        return lines
+
+    @staticmethod
+    def _is_structural(line: str) -> bool:
+        return bool(STEP_PATTERN.match(line) or TOPIC_PATTERN.match(line) or SUBHEADING_PATTERN.match(line))
+
+    def _heading_level(self, raw_line: str, next_line: Optional[str]) -> int:
+        """
+        0 for body text, 1 for a product section, 2 for a topic section
+        Both are printed with a leading icon; a product section opens with an
+        overview title ("Supported Models"), a topic section with steps or
+        "Topic: advice" lines. One-word icon lines followed by one word are
+        status cells of a table ("Full / Support").
+        """
+        line = raw_line.strip()
+        if not raw_line.startswith(" ") or len(line) > 80 or STEP_PATTERN.match(line):
+            return 0
+        if next_line is None:
+            return 1
+        if len(line.split()) == 1 and len(next_line.split()) == 1:
+            return 0
+        return 2 if self._is_structural(next_line) else 1
+
+    def _sections(self, pages: Sequence[Document]) -> List[Section]:
+        """Walk every page in order; sections and steps continue across page breaks"""
+        sections: List[Section] = []
+        lines = self._lines(pages)
+        current = Section(headings=[], page=lines[0][1] if lines else None)
+        # Product section, then topic section inside it
+        parents: List[str] = []
+
+        def start(headings: List[str], page: Any) -> Section:
+            if current.blocks:
+                sections.append(current)
+            return Section(headings=headings, page=page)
+
+        for index, (raw_line, page_number) in enumerate(lines):
+            line = raw_line.strip()
+            next_line = lines[index + 1][0].strip() if index + 1 < len(lines) else None
+            level = self._heading_level(raw_line, next_line)
+
+            if level == 1 or (level == 2 and not parents):
+                parents = [line]
+                current = start(list(parents), page_number)
+            elif level == 2:
+                parents = [parents[0], line]
+                current = start(list(parents), page_number)
+            elif self._is_title(line, next_line, current.blocks):
+                parents = parents[:1] + [line]
+                current = start(list(parents), page_number)
+            elif SUBHEADING_PATTERN.match(line) and len(line) <= 60:
+                current = start(parents + [line.rstrip(":")], page_number)
+            elif STEP_PATTERN.match(line) or TOPIC_PATTERN.match(line) or not current.blocks:
+                current.blocks.append(line)
+            elif self._continues(current.blocks[-1], line, next_line):
+                current.blocks[-1] += " " + line
+            else:
+                current.blocks.append(line)
+
+        if current.blocks:
+            sections.append(current)
+        return sections
+
+    @staticmethod
+    def _is_title(line: str, next_line: Optional[str], blocks: List[str]) -> bool:
+        """
+        Plain topic heading ("Remote Control Troubleshooting"): a short title-case
+        line without digits or punctuation that opens a run of topic lines or
+        restarts the step numbering. A line between step N and step N + 1 is a
+        wrapped step.
+        """
+        words = [word for word in line.split() if len(word) > 3]
+        if not next_line or len(line) > 60 or len(line.split()) < 2 or any(char.isdigit() for char in line):
+            return False
+        if not words or not all(word[:1].isupper() or not word[:1].isalpha() for word in words):
+            return False
+        if line.endswith((".", "!", "?", ",", ":", ">", "&")) or STARTS_LOWER_PATTERN.match(line) or TOPIC_PATTERN.match(line):
+            return False
+        if blocks and blocks[-1].endswith((">", "&", ",", "+", "(", "-", "/")):
+            return False
+        if TOPIC_PATTERN.match(next_line):
+            return True
+        return next_line.startswith("1. ")
+
+    @staticmethod
+    def _continues(previous: str, line: str, next_line: Optional[str]) -> bool:
+        """Whether `line` is the wrapped tail of `previous` rather than a new block"""
+        if previous.endswith((">", "&", ",", "+", "(", "-", "/")):
+            return True
+        if STARTS_LOWER_PATTERN.match(line) or line[:1] in "()&+":
+            return True
+        # A capitalised fragment after an unfinished step or topic line, before the next one
+        return bool(STEP_PATTERN.match(previous) or TOPIC_PATTERN.match(previous)) \
+            and not previous.endswith((".", "!", "?")) and len(line.split()) <= 3 \
+            and (next_line is None or bool(STEP_PATTERN.match(next_line) or TOPIC_PATTERN.match(next_line)))
+
+    # PACKING
+
+    def _split_block(self, block: str, budget: int, language: str) -> List[str]:
+        if len(block) <= budget:
+            return [block]
+        pieces, current = [], ""
+        for sentence in split_sentences(block, language):
+            while len(sentence) > budget:
+                cut = sentence.rfind(" ", 0, budget)
+                cut = cut if cut > 0 else budget
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if current and len(current) + 1 + len(sentence) > budget:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def _pack(self, sections: List[Section], source: str, language: str) -> List[Document]:
+        chunks: List[Document] = []
+        pending: Optional[Dict[str, Any]] = None
+
+        def emit(entry: Dict[str, Any]):
+            chunks.append(Document(page_content=entry["text"], metadata={
+                "source": source,
+                "page": entry["page"],
+                "section": entry["section"],
+                "language": language,
+            }))
+
+        for section in sections:
+            title = " > ".join(section.headings)
+            header = f"{title}\n" if title else ""
+            budget = max(self.chunk_size - len(header), self.chunk_size // 2)
+            bodies, body = [], ""
+            for block in section.blocks:
+                for piece in self._split_block(block, budget, language):
+                    if body and len(body) + 1 + len(piece) > budget:
+                        bodies.append(body)
+                        body = piece
+                    else:
+                        body = f"{body}\n{piece}" if body else piece
+            if body:
+                bodies.append(body)
+
+            for body in bodies:
+                entry = {"text": header + body, "page": section.page, "section": title}
+                # Small neighbouring sections share a chunk rather than producing fragments
+                if pending and len(pending["text"]) < self.min_chunk_size \
+                        and len(pending["text"]) + 2 + len(entry["text"]) <= self.chunk_size:
+                    pending["text"] += "\n\n" + entry["text"]
+                    continue
+                if pending:
+                    emit(pending)
+                pending = entry
+        if pending:
+            emit(pending)
+        return chunks
+
+
+CHUNKERS = {
+    RecursiveChunker.name: RecursiveChunker,
+    StructureAwareChunker.name: StructureAwareChunker,
+}
+
+
+def parse_chunker(spec: str) -> Chunker:
+    """
+    Build a chunker from a spec string
+    Args:
+        spec: "<name>" or "<name>:key=value,..." e.g. "structure:chunk_size=800"
+    """
+    name, _, params = spec.strip().partition(":")
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunker '{name}', expected one of {', '.join(CHUNKERS)}")
+    kwargs = {}
+    for pair in filter(None, (part.strip() for part in params.split(","))):
+        key, _, value = pair.partition("=")
+        kwargs[key.strip()] = int(value)
+    return CHUNKERS[name](**kwargs)
@@ -0,0 +1,130 @@
+"""
+Compact retrieval payloads
+
+Turns the Documents returned by get_query into small JSON-ready hits for the
+MCP tool response: chunks that overlap (the splitter keeps chunk_overlap
+characters of context on both sides) are merged, metadata is reduced to
+source and page, long texts are cut to a window around the query terms and
+the best-matching sentences can be returned as highlights.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.documents import Document
+
+from rag.retrieval import tokenize
+
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+[.!?]?")
+MIN_OVERLAP = 20
+MAX_OVERLAP = 300
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`"""
+    longest = min(len(left), len(right), MAX_OVERLAP)
+    for size in range(longest, MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge(hit: Dict[str, Any], text: str) -> bool:
+    """Fold `text` into the hit when one contains or continues the other"""
+    current = hit["text"]
+    if text in current:
+        return True
+    if current in text:
+        hit["text"] = text
+        return True
+    size = _overlap(current, text)
+    if size:
+        hit["text"] = current + text[size:]
+        return True
+    size = _overlap(text, current)
+    if size:
+        hit["text"] = text + current[size:]
+        return True
+    return False
+
+
+def dedupe_chunks(docs: Sequence[Document]) -> List[Dict[str, Any]]:
+    """Merge duplicate and overlapping chunks from the same source, keeping retrieval order"""
+    hits: List[Dict[str, Any]] = []
+    for doc in docs:
+        source = os.path.basename(str(doc.metadata.get("source", "")))
+        page = doc.metadata.get("page")
+        text = " ".join(doc.page_content.split())
+        if any(hit["source"] == source and _merge(hit, text) for hit in hits):
+            continue
+        hits.append({"source": source, "page": page, "text": text})
+    return hits
+
+
+def _term_positions(text: str, terms: set) -> List[int]:
+    return [match.start() for match in re.finditer(r"\w+", text.lower()) if match.group(0) in terms]
+
+
+def trim_text(text: str, terms: set, max_chars: int) -> str:
+    """Cut text to max_chars, centred on the window with the most query terms"""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+
+    positions = _term_positions(text, terms)
+    start = 0
+    if positions:
+        best = 0
+        for index, position in enumerate(positions):
+            count = sum(1 for other in positions[index:] if other < position + max_chars)
+            if count > best:
+                best, start = count, position
+        # Leave a little leading context before the first match
+        start = max(0, min(start - max_chars // 5, len(text) - max_chars))
+        if start:
+            space = text.find(" ", start)
+            start = space + 1 if 0 <= space < start + 40 else start
+
+    end = min(len(text), start + max_chars)
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start + max_chars // 2 else end
+    return ("…" if start else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+
+def highlight_spans(text: str, terms: set, limit: int = 2, max_chars: int = 200) -> List[str]:
+    """Sentences with the most query terms, best first"""
+    scored = []
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentence = match.group(0).strip()
+        found = terms & set(tokenize(sentence))
+        if found:
+            scored.append((len(found), -match.start(), sentence[:max_chars]))
+    scored.sort(reverse=True)
+    return [sentence for _, _, sentence in scored[:limit]]
+
+
+def compact_results(docs: Sequence[Document], query: str = "", max_chars: int = 800,
+                    highlights: bool = False) -> List[Dict[str, Any]]:
+    """
+    Compact, JSON-ready form of retrieved chunks
+    Args:
+        docs: Documents in retrieval order
+        query: Used to centre trimmed text and pick highlights
+        max_chars: Maximum characters of text per hit (0 keeps the full text)
+        highlights: Add the best-matching sentences of each hit
+    Returns:
+        List of {source, page, text[, highlights]}
+    """
+    terms = set(tokenize(query))
+    results = []
+    for hit in dedupe_chunks(docs):
+        full_text = hit["text"]
+        hit["text"] = trim_text(full_text, terms, max_chars)
+        if hit["page"] is None:
+            del hit["page"]
+        spans = highlight_spans(full_text, terms) if highlights else []
+        if spans:
+            hit["highlights"] = spans
+        results.append(hit)
+    return results
@@ -1,81 +1,174 @@
-from langchain_openai import OpenAIEmbeddings
-#from langchain_community.vectorstores.chroma import Chroma
-from langchain_chroma import Chroma
-
-from langchain_community.document_loaders.pdf import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-from langchain_openai.chat_models import ChatOpenAI
-from langchain.chains.retrieval_qa.base import RetrievalQA
-
+# langchain, Chroma, OpenAI and the PDF loader are imported inside the functions that
+# use them: importing this module is cheap, so tools that never touch RAG (and the
+# MCP server's startup) do not pay for them
 from dotenv import load_dotenv
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Tuple
+
+if TYPE_CHECKING:
+    from rag.chunking import Chunker
+    from rag.retrieval import RetrievalStrategy
 
 load_dotenv()
 
-def load_vectordb():
-    paths = [
-        "rag/docs/apple_technical_support_guide_en.pdf",
-        "rag/docs/guia_de_assistencia_tecnica_apple_pt.pdf"
-    ]
+# Embedding clients and opened vector stores, reused across queries
+_embeddings: Dict[Tuple, Any] = {}
+_vectordbs: Dict[Tuple, Any] = {}
+_handles_lock = threading.Lock()
+
+def _create_embeddings(backend: str):
+    if backend == "fake":
+        from fake_providers import FakeEmbeddings, LatencyModel
+
+        latency = LatencyModel.parse(os.getenv("FAKE_EMBEDDING_LATENCY", "fixed:0"), seed=int(os.getenv("FAKE_LLM_SEED", "0")))
+        return FakeEmbeddings(latency=latency)
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings()
+    raise ValueError(f"Unknown EMBEDDINGS_BACKEND '{backend}', expected 'openai' or 'fake'")
+
+def get_embeddings():
+    """Embeddings selected by EMBEDDINGS_BACKEND ("openai" or "fake", defaults to LLM_BACKEND); one client per configuration"""
+    backend = os.getenv("EMBEDDINGS_BACKEND", os.getenv("LLM_BACKEND", "openai"))
+    key = (backend, os.getenv("FAKE_EMBEDDING_LATENCY"), os.getenv("FAKE_LLM_SEED"))
+    with _handles_lock:
+        if key not in _embeddings:
+            _embeddings[key] = _create_embeddings(backend)
+        return _embeddings[key]
+
+def get_vector_store_backend() -> str:
+    """RAG_VECTOR_STORE: "chroma" (default) or "mmap" (quantized, memory-mapped, see rag.mmap_store)"""
+    backend = os.getenv("RAG_VECTOR_STORE", "chroma")
+    if backend not in ("chroma", "mmap"):
+        raise ValueError(f"Unknown RAG_VECTOR_STORE '{backend}', expected 'chroma' or 'mmap'")
+    return backend
+
+def get_persist_directory() -> str:
+    """Index directory per store backend; fake embeddings get their own index since vector sizes differ"""
+    backend = os.getenv("EMBEDDINGS_BACKEND", os.getenv("LLM_BACKEND", "openai"))
+    default = 'rag/files/mmap_index' if get_vector_store_backend() == "mmap" else 'rag/files/chat_retrieval_db'
+    if backend == "fake":
+        default += '_fake'
+    return os.getenv("RAG_PERSIST_DIRECTORY", default)
+
+PDF_PATHS = [
+    "rag/docs/apple_technical_support_guide_en.pdf",
+    "rag/docs/guia_de_assistencia_tecnica_apple_pt.pdf"
+]
+
+def load_pages():
+    from langchain_community.document_loaders.pdf import PyPDFLoader
 
     pages = []
-    for path in paths:
+    for path in PDF_PATHS:
         loader = PyPDFLoader(path)
         pages.extend(loader.load())
+    return pages
 
-    recur_split = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", ".", " ", ""]
-    )
+def get_chunker(chunker=None) -> "Chunker":
+    """Chunker object, spec string (see rag.chunking) or RAG_CHUNKER"""
+    from rag.chunking import DEFAULT_CHUNKER, Chunker, parse_chunker
 
-    documents = recur_split.split_documents(pages)
+    if isinstance(chunker, Chunker):
+        return chunker
+    return parse_chunker(chunker or os.getenv("RAG_CHUNKER", DEFAULT_CHUNKER))
+
+def split_pages(pages, chunker=None):
+    documents = get_chunker(chunker).split_documents(pages)
 
     for i, doc in enumerate(documents):
         doc.metadata['source'] = doc.metadata['source'].replace('rag/files/', '')
         doc.metadata['doc_id'] = i
+    return documents
 
+def load_vectordb(chunker=None, directory=None, pages=None):
+    """Build the index; `pages` lets callers building several indexes reuse one PDF parse"""
+    documents = split_pages(pages if pages is not None else load_pages(), chunker)
 
-    directory = 'rag/files/chat_retrieval_db'
+    directory = directory or get_persist_directory()
+    # A handle opened before the rebuild would keep serving the old index
+    with _handles_lock:
+        _vectordbs.pop((get_vector_store_backend(), directory), None)
 
-    embeddings_model = OpenAIEmbeddings()
+    embeddings_model = get_embeddings()
 
-    return Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings_model,
-        persist_directory=directory
-    )
+    if get_vector_store_backend() == "mmap":
+        from rag.mmap_store import MmapVectorStore
 
-def get_query(query: str):
-    embedding_model = OpenAIEmbeddings()
-    directory = 'rag/files/chat_retrieval_db'
+        vectordb = MmapVectorStore.from_documents(
+            documents=documents,
+            embedding=embeddings_model,
+            persist_directory=directory,
+            dtype=os.getenv("RAG_MMAP_DTYPE", "float16"),
+            nlist=int(os.getenv("RAG_MMAP_NLIST", "0")),
+            nprobe=int(os.getenv("RAG_MMAP_NPROBE", "0")) or None
+        )
+    else:
+        from langchain_chroma import Chroma
 
-    vectordb = Chroma(
-        embedding_function=embedding_model,
-        persist_directory=directory
-    )
+        vectordb = Chroma.from_documents(
+            documents=documents,
+            embedding=embeddings_model,
+            persist_directory=directory
+        )
 
-    if 1==0:
-        chat = ChatOpenAI(model="gpt-4o-mini")
+    # Likewise the BM25 index hybrid retrieval built over the old chunks
+    from rag.retrieval import invalidate_lexical_index
 
-        chat_chain = RetrievalQA.from_chain_type(
-            llm=chat,
-            retriever=vectordb.as_retriever(search_type='mmr'),
-        )
+    invalidate_lexical_index(directory)
+    return vectordb
+
+def _open_vectordb(backend: str, directory: str):
+    if backend == "mmap":
+        from rag.mmap_store import MmapVectorStore
+
+        return MmapVectorStore(get_embeddings(), directory,
+                               nprobe=int(os.getenv("RAG_MMAP_NPROBE", "0")) or None)
+
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        embedding_function=get_embeddings(),
+        persist_directory=directory
+    )
 
-        response = chat_chain.invoke({"query": query})
-        return response["result"]
-
-    if 1==0:
-        docs = vectordb.similarity_search(query, k=3)
-        for doc in docs:
-            print(doc.page_content)
-            print(f"========{doc.metadata}\n")
-            return docs
-
-    if 1==1: 
-        docs = vectordb.max_marginal_relevance_search(query, k=3, fetch_k=10)
-        for doc in docs:
-            print(doc.page_content)
-            print(f"========{doc.metadata}\n")
-            return docs
+def get_vectordb(directory=None):
+    """Vector store for the directory, opened once and reused by later queries"""
+    directory = directory or get_persist_directory()
+    key = (get_vector_store_backend(), directory)
+    with _handles_lock:
+        vectordb = _vectordbs.get(key)
+    if vectordb is None:
+        vectordb = _open_vectordb(*key)
+        with _handles_lock:
+            vectordb = _vectordbs.setdefault(key, vectordb)
+    return vectordb
+
+def get_retrieval_strategy(strategy=None) -> "RetrievalStrategy":
+    """Strategy object, spec string (see rag.retrieval) or RAG_RETRIEVAL_STRATEGY"""
+    from rag.retrieval import DEFAULT_RETRIEVAL_STRATEGY, RetrievalStrategy, parse_retrieval_strategy
+
+    if isinstance(strategy, RetrievalStrategy):
+        return strategy
+    return parse_retrieval_strategy(strategy or os.getenv("RAG_RETRIEVAL_STRATEGY", DEFAULT_RETRIEVAL_STRATEGY))
+
+def get_query(query: str, strategy=None):
+    vectordb = get_vectordb()
+
+    docs = get_retrieval_strategy(strategy).retrieve(vectordb, query)
+    for doc in docs:
+        print(doc.page_content)
+        print(f"========{doc.metadata}\n")
+    return docs
+
+def get_compact_query(query: str, strategy=None, max_chars: int = None, highlights: bool = None):
+    """get_query results as compact hits (see rag.compact); defaults from RAG_RESULT_MAX_CHARS and RAG_RESULT_HIGHLIGHTS"""
+    from rag.compact import compact_results
+
+    if max_chars is None:
+        max_chars = int(os.getenv("RAG_RESULT_MAX_CHARS", "800"))
+    if highlights is None:
+        highlights = os.getenv("RAG_RESULT_HIGHLIGHTS", "false").lower() in ("1", "true", "yes")
+    return compact_results(get_query(query, strategy), query, max_chars=max_chars, highlights=highlights)
@@ -0,0 +1,292 @@
+"""
+Quantized, memory-mapped vector store
+
+An alternative to Chroma for serving the PDF index. Embeddings are stored
+L2-normalized and quantized (float16, or int8 with a per-row scale) in .npy
+files opened with mmap, so every process reading the same directory shares a
+single copy through the page cache and opening the index is just an mmap.
+Search is a NumPy brute-force scan in fixed-size blocks, or an IVF scan of
+the nprobe closest clusters when the index was built with nlist > 0.
+"""
+
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+DOCUMENTS_FILE = "documents.json"
+CENTROIDS_FILE = "centroids.npy"
+OFFSETS_FILE = "offsets.npy"
+DTYPES = ("float32", "float16", "int8")
+BLOCK_ROWS = 65536
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _quantize(block: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Quantized rows and, for int8, the per-row scale that restores them"""
+    if dtype == "int8":
+        scales = np.abs(block).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(block / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return block.astype(dtype), None
+
+
+def _kmeans(sample: np.ndarray, clusters: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: centroids are re-normalized so cosine similarity picks the cluster"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(clusters):
+            members = sample[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+class MmapIndex:
+    """Read-only view of an index directory; vectors and scales stay memory-mapped"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        self.scales = None
+        if self.manifest["dtype"] == "int8":
+            self.scales = np.load(os.path.join(directory, SCALES_FILE), mmap_mode="r")
+        self.centroids = None
+        self.offsets = None
+        if self.manifest.get("nlist"):
+            self.centroids = np.load(os.path.join(directory, CENTROIDS_FILE))
+            self.offsets = np.load(os.path.join(directory, OFFSETS_FILE))
+        with open(os.path.join(directory, DOCUMENTS_FILE), encoding="utf-8") as f:
+            documents = json.load(f)
+        self.texts = [document["text"] for document in documents]
+        self.metadatas = [document["metadata"] for document in documents]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def dequantize(self, rows: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows])[:, None]
+        return vectors
+
+    def _scan(self, query: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """Scores for rows [start, stop), converting one block at a time to bound memory"""
+        scores = np.empty(stop - start, dtype=np.float32)
+        for block_start in range(start, stop, BLOCK_ROWS):
+            block_stop = min(stop, block_start + BLOCK_ROWS)
+            block_scores = np.asarray(self.vectors[block_start:block_stop], dtype=np.float32) @ query
+            if self.scales is not None:
+                block_scores *= self.scales[block_start:block_stop]
+            scores[block_start - start:block_stop - start] = block_scores
+        return scores
+
+    def search(self, query_vector: List[float], k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices and cosine similarities of the k best rows, best first"""
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        if self.centroids is None:
+            ranges = [(0, len(self))]
+        else:
+            nprobe = nprobe or self.manifest.get("nprobe", 1)
+            probes = np.argsort(-(self.centroids @ query))[:nprobe]
+            ranges = [(int(self.offsets[cluster]), int(self.offsets[cluster + 1])) for cluster in probes]
+            ranges = [(start, stop) for start, stop in ranges if stop > start]
+        if not ranges:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        indices = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        scores = np.concatenate([self._scan(query, start, stop) for start, stop in ranges])
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return indices[top], scores[top]
+
+    @classmethod
+    def build(cls, directory: str, texts: List[str], metadatas: List[Dict[str, Any]], embedding: Embeddings,
+              dtype: str = "float16", nlist: int = 0, nprobe: Optional[int] = None, batch_size: int = 256,
+              seed: int = 0) -> "MmapIndex":
+        """
+        Embed the texts and write a new index, replacing `directory` only once it is complete
+        Args:
+            dtype: float32, float16 or int8 (per-row scale)
+            nlist: IVF clusters; 0 builds a brute-force index
+            nprobe: Clusters scanned per query (default nlist / 8)
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector dtype '{dtype}', expected one of {', '.join(DTYPES)}")
+        if not texts:
+            raise ValueError("Cannot build a vector index without documents")
+
+        staging = directory.rstrip(os.sep) + ".building"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        # Embed into a float32 scratch file so large corpora never sit in RAM
+        first = _normalize(np.asarray(embedding.embed_documents(texts[:batch_size]), dtype=np.float32))
+        count, dimensions = len(texts), first.shape[1]
+        raw_path = os.path.join(staging, "raw.npy")
+        raw = np.lib.format.open_memmap(raw_path, mode="w+", dtype=np.float32, shape=(count, dimensions))
+        raw[:len(first)] = first
+        for start in range(batch_size, count, batch_size):
+            batch = embedding.embed_documents(texts[start:start + batch_size])
+            raw[start:start + len(batch)] = _normalize(np.asarray(batch, dtype=np.float32))
+
+        # IVF: cluster a sample, then store rows grouped by cluster so each probe reads one contiguous slice
+        nlist = min(nlist, count)
+        order = np.arange(count)
+        if nlist:
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(count, min(count, 256 * nlist), replace=False))
+            centroids = _kmeans(np.asarray(raw[sample_rows]), nlist, seed=seed)
+            assignments = np.concatenate([
+                np.argmax(np.asarray(raw[start:start + BLOCK_ROWS]) @ centroids.T, axis=1)
+                for start in range(0, count, BLOCK_ROWS)
+            ])
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))])
+            np.save(os.path.join(staging, CENTROIDS_FILE), centroids)
+            np.save(os.path.join(staging, OFFSETS_FILE), offsets.astype(np.int64))
+
+        vectors = np.lib.format.open_memmap(os.path.join(staging, VECTORS_FILE), mode="w+",
+                                            dtype=np.dtype(dtype), shape=(count, dimensions))
+        scales = None
+        if dtype == "int8":
+            scales = np.lib.format.open_memmap(os.path.join(staging, SCALES_FILE), mode="w+",
+                                               dtype=np.float32, shape=(count,))
+        for start in range(0, count, BLOCK_ROWS):
+            rows = order[start:start + BLOCK_ROWS]
+            quantized, block_scales = _quantize(np.asarray(raw[rows]), dtype)
+            vectors[start:start + len(rows)] = quantized
+            if scales is not None:
+                scales[start:start + len(rows)] = block_scales
+        vectors.flush()
+        if scales is not None:
+            scales.flush()
+        del raw, vectors, scales
+        os.remove(raw_path)
+
+        with open(os.path.join(staging, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            json.dump([{"text": texts[row], "metadata": metadatas[row]} for row in order], f, ensure_ascii=False)
+        with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "count": count,
+                "dimensions": dimensions,
+                "dtype": dtype,
+                "nlist": nlist,
+                "nprobe": nprobe or max(1, nlist // 8),
+                "embedding": type(embedding).__name__,
+            }, f, indent=2)
+
+        previous = directory.rstrip(os.sep) + ".previous"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(directory):
+            os.rename(directory, previous)
+        os.rename(staging, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+        return cls(directory)
+
+
+_indexes: Dict[str, Tuple[float, MmapIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def open_index(directory: str) -> MmapIndex:
+    """Shared MmapIndex per directory, reopened when the index is rebuilt"""
+    path = os.path.abspath(directory)
+    modified = os.path.getmtime(os.path.join(path, MANIFEST_FILE))
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != modified:
+            cached = (modified, MmapIndex(path))
+            _indexes[path] = cached
+        return cached[1]
+
+
+class MmapVectorStore(VectorStore):
+    """LangChain vector store over an MmapIndex; read-only, rebuilt with from_documents"""
+
+    def __init__(self, embedding_function: Embeddings, persist_directory: str, nprobe: Optional[int] = None):
+        self._embedding_function = embedding_function
+        self._persist_directory = persist_directory
+        self.nprobe = nprobe
+        self.index = open_index(persist_directory)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self.index.texts[row], metadata=dict(self.index.metadatas[row]))
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("MmapVectorStore is read-only; rebuild it with MmapVectorStore.from_documents")
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        rows, scores = self.index.search(embedding, k, self.nprobe)
+        return [(self._document(int(row)), float(score)) for row, score in zip(rows, scores)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Documents with their cosine similarity (higher is closer)"""
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding_function.embed_query(query), k)
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+                                      **kwargs: Any) -> List[Document]:
+        query_vector = _normalize(np.asarray(self._embedding_function.embed_query(query), dtype=np.float32))
+        rows, relevance = self.index.search(query_vector, fetch_k, self.nprobe)
+        if not len(rows):
+            return []
+        candidates = _normalize(self.index.dequantize(rows))
+
+        selected = [0]
+        redundancy = candidates @ candidates[0]
+        while len(selected) < min(k, len(rows)):
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            redundancy = np.maximum(redundancy, candidates @ candidates[best])
+        return [self._document(int(rows[index])) for index in selected]
+
+    def get(self, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """All stored chunks, shaped like Chroma.get"""
+        return {
+            "ids": [str(row) for row in range(len(self.index))],
+            "documents": list(self.index.texts),
+            "metadatas": [dict(metadata) for metadata in self.index.metadatas],
+        }
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   persist_directory: str = "rag/files/mmap_index", dtype: str = "float16", nlist: int = 0,
+                   nprobe: Optional[int] = None, **kwargs: Any) -> "MmapVectorStore":
+        metadatas = metadatas or [{} for _ in texts]
+        MmapIndex.build(persist_directory, list(texts), list(metadatas), embedding, dtype=dtype, nlist=nlist,
+                        nprobe=nprobe)
+        return cls(embedding, persist_directory, nprobe=nprobe)
@@ -0,0 +1,174 @@
+"""
+Re-ranking stage for retrieved chunks
+
+A Reranker rescores a wide candidate set with a scorer (lexical overlap, or a
+CPU cross-encoder when sentence-transformers is installed) and keeps a tight
+top k. Scores are cached per (query, chunk) and scoring stops once the time
+budget is spent; unscored candidates then keep their retrieval order behind
+the rescored ones, so the stage never dominates request latency.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from cache import TTLCache
+from rag.retrieval import lexical_overlap, tokenize
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class Scorer(ABC):
+    """Abstract (query, chunk) relevance scorer"""
+    name = "base"
+
+    @abstractmethod
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Return one relevance score per text, higher is better"""
+        pass
+
+
+class LexicalScorer(Scorer):
+    """Query term overlap, with a bonus for query bigrams that appear verbatim"""
+    name = "lexical"
+
+    def __init__(self, bigram_weight: float = 0.5):
+        self.bigram_weight = bigram_weight
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        query_tokens = tokenize(query)
+        bigrams = set(zip(query_tokens, query_tokens[1:]))
+        scores = []
+        for text in texts:
+            score = lexical_overlap(query, text)
+            if bigrams:
+                text_tokens = tokenize(text)
+                matched = bigrams & set(zip(text_tokens, text_tokens[1:]))
+                score += self.bigram_weight * len(matched) / len(bigrams)
+            scores.append(score)
+        return scores
+
+
+class CrossEncoderScorer(Scorer):
+    """sentence-transformers cross-encoder on CPU; the model is loaded on first use"""
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER, max_length: int = 512):
+        self.model_name = model_name
+        self.max_length = max_length
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+            return self._model
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        return [float(score) for score in self._get_model().predict([(query, text) for text in texts])]
+
+
+SCORERS = {
+    LexicalScorer.name: LexicalScorer,
+    CrossEncoderScorer.name: CrossEncoderScorer,
+}
+
+
+class Reranker:
+    """Cached, time-budgeted re-ranking of retrieved chunks"""
+
+    def __init__(self, scorer: Scorer, budget_seconds: float = 0.2, batch_size: int = 8,
+                 cache_size: int = 4096, cache_ttl: Optional[float] = 3600.0):
+        self.scorer = scorer
+        self.budget_seconds = budget_seconds
+        self.batch_size = batch_size
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        self.reranks = 0
+        self.scored = 0
+        self.budget_exhausted = 0
+
+    def _cache_key(self, query: str, doc: Document) -> tuple:
+        digest = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+        return (self.scorer.name, " ".join(tokenize(query)), digest)
+
+    def rerank(self, query: str, docs: List[Document], k: int,
+               budget_seconds: Optional[float] = None) -> List[Document]:
+        budget = self.budget_seconds if budget_seconds is None else budget_seconds
+        start = time.perf_counter()
+
+        scores: Dict[int, float] = {}
+        pending = []
+        for index, doc in enumerate(docs):
+            cached = self.cache.get(self._cache_key(query, doc))
+            if cached is None:
+                pending.append(index)
+            else:
+                scores[index] = cached
+
+        # Candidates arrive in retrieval order, so the budget is spent on the most promising ones first
+        exhausted = False
+        for offset in range(0, len(pending), self.batch_size):
+            if time.perf_counter() - start >= budget:
+                exhausted = True
+                break
+            batch = pending[offset:offset + self.batch_size]
+            for index, score in zip(batch, self.scorer.score(query, [docs[i].page_content for i in batch])):
+                scores[index] = score
+                self.cache.set(self._cache_key(query, docs[index]), score)
+            self.scored += len(batch)
+
+        self.reranks += 1
+        if exhausted:
+            self.budget_exhausted += 1
+
+        rescored = sorted(scores, key=lambda index: (-scores[index], index))
+        unscored = [index for index in range(len(docs)) if index not in scores]
+        return [docs[index] for index in rescored + unscored][:k]
+
+    def stats(self) -> Dict:
+        return {
+            "scorer": self.scorer.name,
+            "reranks": self.reranks,
+            "scored": self.scored,
+            "budget_exhausted": self.budget_exhausted,
+            "cache": self.cache.stats(),
+        }
+
+
+_rerankers: Dict[str, Reranker] = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(scorer: Optional[str] = None) -> Reranker:
+    """
+    Shared Reranker per scorer, so every strategy reuses one score cache
+    Configured by RAG_RERANK_SCORER (lexical | cross-encoder), RAG_RERANK_MODEL,
+    RAG_RERANK_BUDGET_MS, RAG_RERANK_CACHE_SIZE and RAG_RERANK_CACHE_TTL
+    """
+    name = scorer or os.getenv("RAG_RERANK_SCORER", LexicalScorer.name)
+    if name not in SCORERS:
+        raise ValueError(f"Unknown re-rank scorer '{name}', expected one of {', '.join(SCORERS)}")
+
+    with _rerankers_lock:
+        reranker = _rerankers.get(name)
+        if reranker is None:
+            if name == CrossEncoderScorer.name:
+                instance = CrossEncoderScorer(os.getenv("RAG_RERANK_MODEL", DEFAULT_CROSS_ENCODER))
+            else:
+                instance = SCORERS[name]()
+            reranker = Reranker(
+                instance,
+                budget_seconds=float(os.getenv("RAG_RERANK_BUDGET_MS", "200")) / 1000,
+                cache_size=int(os.getenv("RAG_RERANK_CACHE_SIZE", "4096")),
+                cache_ttl=float(os.getenv("RAG_RERANK_CACHE_TTL", "3600")),
+            )
+            _rerankers[name] = reranker
+        return reranker
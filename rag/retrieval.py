@@ -0,0 +1,233 @@
+"""
+Retrieval strategies for the Chroma RAG path
+
+A strategy turns a query into the chunks handed to the agent. Strategies are
+selected with a spec string such as "mmr:k=3,fetch_k=10", either passed to
+rag.load.get_query or set in RAG_RETRIEVAL_STRATEGY.
+"""
+
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+DEFAULT_RETRIEVAL_STRATEGY = "mmr:k=3,fetch_k=10"
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
+
+
+def document_key(doc: Document) -> Any:
+    """Stable identity of a chunk across retrievers"""
+    return doc.metadata.get('doc_id', doc.page_content)
+
+
+class LexicalIndex:
+    """In-memory BM25 index over every chunk of a Chroma collection"""
+
+    def __init__(self, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(doc.page_content)) for doc in documents]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    @classmethod
+    def from_vectordb(cls, vectordb) -> "LexicalIndex":
+        data = vectordb.get(include=["documents", "metadatas"])
+        documents = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(data["documents"], data["metadatas"])
+        ]
+        return cls(documents)
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for index, counts in enumerate(self.term_counts):
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term, 0)
+                if frequency:
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.average_length or 1))
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            if score > 0:
+                scores.append((score, index))
+        scores.sort(reverse=True)
+        return [(self.documents[index], score) for score, index in scores[:k]]
+
+
+_lexical_indexes: Dict[str, LexicalIndex] = {}
+_lexical_lock = threading.Lock()
+
+
+def lexical_index_for(vectordb) -> LexicalIndex:
+    """BM25 index for a vector store, built once per persist directory"""
+    key = getattr(vectordb, "_persist_directory", None) or str(id(vectordb))
+    with _lexical_lock:
+        index = _lexical_indexes.get(key)
+        if index is None:
+            index = LexicalIndex.from_vectordb(vectordb)
+            _lexical_indexes[key] = index
+        return index
+
+
+def invalidate_lexical_index(directory: str):
+    """Drop the BM25 index of a persist directory, so the next hybrid query rebuilds it from the new chunks"""
+    with _lexical_lock:
+        _lexical_indexes.pop(directory, None)
+
+
+def lexical_overlap(query: str, text: str) -> float:
+    """Fraction of distinct query terms that appear in the text"""
+    terms = set(tokenize(query))
+    if not terms:
+        return 0.0
+    return len(terms & set(tokenize(text))) / len(terms)
+
+
+class RetrievalStrategy(ABC):
+    """Abstract retrieval strategy over a Chroma vector store"""
+    name = "base"
+
+    def __init__(self, k: int = 3):
+        self.k = k
+
+    @abstractmethod
+    def retrieve(self, vectordb, query: str) -> List[Document]:
+        """Return the top k chunks for the query"""
+        pass
+
+    def params(self) -> Dict[str, Any]:
+        return {"k": self.k}
+
+    def describe(self) -> str:
+        return f"{self.name}:" + ",".join(f"{key}={value}" for key, value in self.params().items())
+
+
+class SimilarityStrategy(RetrievalStrategy):
+    """Plain nearest-neighbour search"""
+    name = "similarity"
+
+    def retrieve(self, vectordb, query: str) -> List[Document]:
+        return vectordb.similarity_search(query, k=self.k)
+
+
+class MMRStrategy(RetrievalStrategy):
+    """Maximal marginal relevance over the fetch_k nearest chunks"""
+    name = "mmr"
+
+    def __init__(self, k: int = 3, fetch_k: int = 10, lambda_mult: float = 0.5):
+        super().__init__(k)
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+
+    def retrieve(self, vectordb, query: str) -> List[Document]:
+        return vectordb.max_marginal_relevance_search(query, k=self.k, fetch_k=self.fetch_k,
+                                                      lambda_mult=self.lambda_mult)
+
+    def params(self) -> Dict[str, Any]:
+        return {"k": self.k, "fetch_k": self.fetch_k, "lambda_mult": self.lambda_mult}
+
+
+class HybridStrategy(RetrievalStrategy):
+    """Dense and BM25 candidates merged with reciprocal rank fusion"""
+    name = "hybrid"
+
+    def __init__(self, k: int = 3, fetch_k: int = 20, rrf_k: int = 60):
+        super().__init__(k)
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+
+    def retrieve(self, vectordb, query: str) -> List[Document]:
+        dense = vectordb.similarity_search(query, k=self.fetch_k)
+        lexical = [doc for doc, _ in lexical_index_for(vectordb).search(query, self.fetch_k)]
+
+        scores: Dict[Any, float] = {}
+        documents: Dict[Any, Document] = {}
+        for ranking in (dense, lexical):
+            for rank, doc in enumerate(ranking):
+                key = document_key(doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                documents.setdefault(key, doc)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return [documents[key] for key in ranked[:self.k]]
+
+    def params(self) -> Dict[str, Any]:
+        return {"k": self.k, "fetch_k": self.fetch_k, "rrf_k": self.rrf_k}
+
+
+class RerankedStrategy(RetrievalStrategy):
+    """Wider candidate set from a base strategy, rescored by a rag.rerank.Reranker"""
+    name = "reranked"
+
+    def __init__(self, k: int = 3, fetch_k: int = 20, base: str = "similarity",
+                 scorer: Optional[str] = None, budget_ms: Optional[float] = None):
+        super().__init__(k)
+        self.fetch_k = fetch_k
+        self.base = base
+        self.scorer = scorer
+        self.budget_ms = budget_ms
+        self.base_strategy = parse_retrieval_strategy(f"{base}:k={fetch_k}")
+
+    def retrieve(self, vectordb, query: str) -> List[Document]:
+        from rag.rerank import get_reranker
+
+        candidates = self.base_strategy.retrieve(vectordb, query)
+        budget = self.budget_ms / 1000 if self.budget_ms is not None else None
+        return get_reranker(self.scorer).rerank(query, candidates, self.k, budget_seconds=budget)
+
+    def params(self) -> Dict[str, Any]:
+        params = {"k": self.k, "fetch_k": self.fetch_k, "base": self.base}
+        if self.scorer:
+            params["scorer"] = self.scorer
+        if self.budget_ms is not None:
+            params["budget_ms"] = self.budget_ms
+        return params
+
+
+RETRIEVAL_STRATEGIES = {
+    SimilarityStrategy.name: SimilarityStrategy,
+    MMRStrategy.name: MMRStrategy,
+    HybridStrategy.name: HybridStrategy,
+    RerankedStrategy.name: RerankedStrategy,
+}
+
+
+def _parse_value(value: str) -> Any:
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_retrieval_strategy(spec: str) -> RetrievalStrategy:
+    """
+    Build a strategy from a spec string
+    Args:
+        spec: "<name>" or "<name>:key=value,..." e.g. "hybrid:k=5,fetch_k=20"
+    """
+    name, _, params = spec.strip().partition(":")
+    if name not in RETRIEVAL_STRATEGIES:
+        raise ValueError(f"Unknown retrieval strategy '{name}', expected one of {', '.join(RETRIEVAL_STRATEGIES)}")
+    kwargs = {}
+    for pair in filter(None, (part.strip() for part in params.split(","))):
+        key, _, value = pair.partition("=")
+        kwargs[key.strip()] = _parse_value(value.strip())
+    return RETRIEVAL_STRATEGIES[name](**kwargs)
@@ -0,0 +1,76 @@
+import json
+from typing import Any, Optional
+
+from agents.items import ModelResponse
+from agents.models.interface import Model
+
+from scheduler import LLMScheduler, estimate_tokens
+
+DEFAULT_OUTPUT_TOKENS = 500
+
+
+class ScheduledModel(Model):
+    """
+    agents SDK model whose calls wait for an LLMScheduler slot
+
+    Wraps a Model, or a model name resolved on first use the way the SDK
+    resolves Agent(model="..."). The reservation is the estimated prompt plus
+    the output limit; the response's usage settles it.
+    """
+
+    def __init__(self, model: Any, scheduler: LLMScheduler):
+        self._model = model
+        self.scheduler = scheduler
+
+    @property
+    def model(self) -> Model:
+        if isinstance(self._model, str):
+            from agents.models.multi_provider import MultiProvider
+
+            self._model = MultiProvider().get_model(self._model)
+        return self._model
+
+    @staticmethod
+    def _reservation(system_instructions, input, model_settings, tools) -> int:
+        prompt = json.dumps(input, default=str) if not isinstance(input, str) else input
+        tool_specs = json.dumps([getattr(tool, "name", "") for tool in tools or []])
+        output = getattr(model_settings, "max_tokens", None) or DEFAULT_OUTPUT_TOKENS
+        return estimate_tokens(system_instructions or "", prompt, tool_specs) + output
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, **kwargs) -> ModelResponse:
+        ticket = await self.scheduler.acquire_async(self._reservation(system_instructions, input, model_settings, tools))
+        used: Optional[int] = None
+        try:
+            response = await self.model.get_response(system_instructions, input, model_settings, tools,
+                                                     output_schema, handoffs, tracing, **kwargs)
+            used = response.usage.total_tokens or None
+            return response
+        finally:
+            self.scheduler.release(ticket, used)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, **kwargs):
+        ticket = await self.scheduler.acquire_async(self._reservation(system_instructions, input, model_settings, tools))
+        used: Optional[int] = None
+        try:
+            async for event in self.model.stream_response(system_instructions, input, model_settings, tools,
+                                                          output_schema, handoffs, tracing, **kwargs):
+                response = getattr(event, "response", None)
+                usage = getattr(response, "usage", None)
+                if usage is not None and getattr(usage, "total_tokens", None):
+                    used = usage.total_tokens
+                yield event
+        finally:
+            self.scheduler.release(ticket, used)
+
+    def get_retry_advice(self, request):
+        return self.model.get_retry_advice(request)
+
+    async def close(self) -> None:
+        if not isinstance(self._model, str):
+            await self._model.close()
+
+    async def _cleanup_on_run_end(self, owner: object) -> None:
+        if not isinstance(self._model, str):
+            await self._model._cleanup_on_run_end(owner)
@@ -0,0 +1,337 @@
+"""
+Central scheduler for LLM calls: rate limits, priorities and backpressure
+
+Every call of the chat provider (planner, final generation) and of the agents
+SDK model (router, specialists) asks the process-wide LLMScheduler for a slot
+before it reaches the provider. Slots are granted in priority order
+(interactive before batch, first come first served within a class) while the
+request and token budgets and the concurrency limit allow; callers wait until
+then, so a burst is absorbed by the queue instead of by provider 429s.
+
+    LLM_RPM=500                 # requests per minute (0 or unset: unlimited)
+    LLM_TPM=200000              # tokens per minute, estimated before and corrected after each call
+    LLM_MAX_CONCURRENCY=16      # calls in flight
+    LLM_MAX_QUEUE=200           # batch calls allowed to wait; more raise SchedulerBusy
+
+The scheduler is off (no wrapping at all) unless one of these is set.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def set_priority(priority: int):
+    """Priority of the LLM calls made from here on in the current context, e.g. inside one asyncio task"""
+    _priority.set(priority)
+
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """
+    Run the block's LLM calls at `priority`; follows the context into asyncio
+    tasks and asyncio.to_thread calls started inside it
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count of prompt text (about four characters per token)"""
+    return max(1, sum(len(text or "") for text in texts) // 4)
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a batch call arrives while LLM_MAX_QUEUE calls are already waiting"""
+
+
+@dataclass
+class TokenBucket:
+    """
+    `rate` units per second up to `capacity`. The balance may go negative when
+    a call used more than it reserved; later calls then wait for the debt.
+    """
+    rate: float
+    capacity: float
+    clock: Callable[[], float] = time.monotonic
+    tokens: float = field(init=False)
+    updated: float = field(init=False)
+
+    def __post_init__(self):
+        self.tokens = self.capacity
+        self.updated = self.clock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket wait for a full one)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.tokens -= amount
+
+    def adjust(self, amount: float):
+        """Charge (or refund, when negative) the difference between actual and reserved use"""
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+@dataclass
+class Ticket:
+    """A granted slot; hand it back to LLMScheduler.release when the call ends"""
+    priority: int
+    tokens: int
+    waited: float
+
+
+class _Waiter:
+    def __init__(self, priority: int, tokens: int, enqueued: float):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = enqueued
+        self.granted = False
+        self.cancelled = False
+        self.throttled = False
+        self.waited = 0.0
+        self._event: Optional[threading.Event] = None
+        self._future: Optional[asyncio.Future] = None
+
+    def grant(self) -> bool:
+        """Wake the caller; False when its event loop is already gone"""
+        if self._future is not None:
+            try:
+                self._future.get_loop().call_soon_threadsafe(self._resolve)
+            except RuntimeError:
+                return False
+        else:
+            self._event.set()
+        self.granted = True
+        return True
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Grants LLM call slots in priority order under rate and concurrency limits
+
+    A limit of 0 disables it. Calls reserve their estimated tokens when they
+    start and release() settles the difference with the actual usage. The
+    head of the queue is never bypassed, so a batch call cannot take the
+    budget an interactive call is waiting for.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, max_concurrency: int = 0,
+                 max_queue: int = 0, clock: Callable[[], float] = time.monotonic, wait_samples: int = 1000):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.clock = clock
+        self._requests = TokenBucket(requests_per_minute / 60, requests_per_minute, clock) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute, clock) if tokens_per_minute else None
+        self._condition = threading.Condition()
+        self._queue: List[Any] = []
+        self._sequence = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self.in_flight = 0
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self._granted = {priority: 0 for priority in PRIORITY_NAMES}
+        self._waits: Dict[int, Deque[float]] = {priority: deque(maxlen=wait_samples) for priority in PRIORITY_NAMES}
+        self.rejected = 0
+        self.rate_limited = 0
+        self.tokens_used = 0
+
+    # QUEUE
+
+    def _enqueue(self, priority: int, tokens: int) -> _Waiter:
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"Unknown priority {priority}, expected one of {sorted(PRIORITY_NAMES)}")
+        with self._condition:
+            # Interactive calls are never turned away; the queue bounds background work
+            waiting = sum(self._depth.values())
+            if self.max_queue and priority != INTERACTIVE and waiting >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusy(f"{waiting} LLM calls already waiting")
+            waiter = _Waiter(priority, tokens, self.clock())
+            heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+            self._depth[priority] += 1
+            return waiter
+
+    def _dispatch(self) -> Optional[float]:
+        """Grant slots from the head of the queue; seconds until the head may fit, or None"""
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                return None
+            now = self.clock()
+            delay = max(self._requests.delay(1, now) if self._requests else 0.0,
+                        self._tokens.delay(waiter.tokens, now) if self._tokens else 0.0)
+            if delay > 0:
+                if not waiter.throttled:
+                    waiter.throttled = True
+                    self.rate_limited += 1
+                return delay
+            heapq.heappop(self._queue)
+            if self._requests:
+                self._requests.take(1, now)
+            if self._tokens:
+                self._tokens.take(waiter.tokens, now)
+            self._depth[waiter.priority] -= 1
+            waiter.waited = now - waiter.enqueued
+            if waiter.grant():
+                self.in_flight += 1
+                self._granted[waiter.priority] += 1
+                self._waits[waiter.priority].append(waiter.waited)
+        return None
+
+    def _wake(self):
+        """Dispatch now and let the timer thread handle a rate-limited head"""
+        if self._dispatch() is not None:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._timer, name="llm-scheduler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _timer(self):
+        with self._condition:
+            while True:
+                self._condition.wait(timeout=self._dispatch())
+
+    def _cancel(self, waiter: _Waiter):
+        with self._condition:
+            if waiter.granted:
+                # Granted while its caller was being cancelled: give the slot back unused
+                self._release_locked(Ticket(waiter.priority, waiter.tokens, waiter.waited), 0)
+            elif not waiter.cancelled:
+                waiter.cancelled = True
+                self._depth[waiter.priority] -= 1
+                self._wake()
+
+    # SLOTS
+
+    def acquire(self, tokens: int = 1, priority: Optional[int] = None) -> Ticket:
+        """Block until a slot for a call of about `tokens` tokens is granted"""
+        waiter = self._enqueue(current_priority() if priority is None else priority, tokens)
+        waiter._event = threading.Event()
+        with self._condition:
+            self._wake()
+        waiter._event.wait()
+        return Ticket(waiter.priority, tokens, waiter.waited)
+
+    async def acquire_async(self, tokens: int = 1, priority: Optional[int] = None) -> Ticket:
+        """acquire() for coroutines: waits without blocking the event loop"""
+        waiter = self._enqueue(current_priority() if priority is None else priority, tokens)
+        waiter._future = asyncio.get_running_loop().create_future()
+        with self._condition:
+            self._wake()
+        try:
+            await waiter._future
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+        return Ticket(waiter.priority, tokens, waiter.waited)
+
+    def _release_locked(self, ticket: Ticket, used_tokens: Optional[int]):
+        self.in_flight -= 1
+        if used_tokens is not None:
+            self.tokens_used += used_tokens
+            if self._tokens:
+                self._tokens.adjust(used_tokens - ticket.tokens)
+        else:
+            self.tokens_used += ticket.tokens
+        self._wake()
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None):
+        """End a call; `used_tokens` (when known) replaces the estimate in the token budget"""
+        with self._condition:
+            self._release_locked(ticket, used_tokens)
+
+    @contextlib.contextmanager
+    def slot(self, tokens: int = 1, priority: Optional[int] = None):
+        ticket = self.acquire(tokens, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    # METRICS
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            waits = {priority: sorted(samples) for priority, samples in self._waits.items()}
+            stats = {
+                "in_flight": self.in_flight,
+                "queue_depth": {PRIORITY_NAMES[p]: depth for p, depth in self._depth.items()},
+                "granted": {PRIORITY_NAMES[p]: count for p, count in self._granted.items()},
+                "rejected": self.rejected,
+                "rate_limited": self.rate_limited,
+                "tokens_used": self.tokens_used,
+                "limits": {"requests_per_minute": self.requests_per_minute,
+                           "tokens_per_minute": self.tokens_per_minute,
+                           "max_concurrency": self.max_concurrency, "max_queue": self.max_queue},
+            }
+        stats["wait_ms"] = {PRIORITY_NAMES[p]: latency_summary(samples) for p, samples in waits.items()}
+        return stats
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Mean, p50, p95 and max in milliseconds of sorted durations in seconds"""
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    def at(fraction: float) -> float:
+        return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 3)
+
+    return {"count": len(samples), "mean": round(sum(samples) / len(samples) * 1000, 3),
+            "p50": at(0.50), "p95": at(0.95), "max": round(samples[-1] * 1000, 3)}
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Optional[LLMScheduler]:
+    """Process-wide scheduler configured from LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY and LLM_MAX_QUEUE; None when unset"""
+    global _scheduler
+    limits = {
+        "requests_per_minute": float(os.getenv("LLM_RPM", "0")),
+        "tokens_per_minute": float(os.getenv("LLM_TPM", "0")),
+        "max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", "0")),
+    }
+    if not any(limits.values()):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(max_queue=int(os.getenv("LLM_MAX_QUEUE", "0")), **limits)
+        return _scheduler
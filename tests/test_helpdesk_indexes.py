@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mcp_base.server.apple_helpdesk_manager import AppleHelpDeskDB
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "mcp_base", "server", "apple_helpdesk.db")
+
+
+class EnsureIndexesTest(unittest.TestCase):
+    """Hot query plans on a copy of the shipped database, which predates the performance indexes"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "apple_helpdesk.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.db = AppleHelpDeskDB(path)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_no_scans_after_ensure_indexes(self):
+        self.db.ensure_indexes()
+        self.assertEqual(self.db.check_hot_query_plans(), {})
+
+    def test_ensure_indexes_is_idempotent(self):
+        self.db.ensure_indexes()
+        self.assertEqual(self.db.ensure_indexes(), [])
+
+    def test_customer_email_search_ignores_case(self):
+        self.db.ensure_indexes()
+        exact = self.db.search_tickets_page(customer_email="john.smith@email.com")["tickets"]
+        mixed = self.db.search_tickets_page(customer_email="John.Smith@EMAIL.com")["tickets"]
+        self.assertTrue(exact)
+        self.assertEqual([ticket["id"] for ticket in mixed], [ticket["id"] for ticket in exact])
+
+    def test_email_index_allows_case_variant_customers(self):
+        self.db.create_customer("John", "Smith", "John.Smith@email.com")
+        self.db.ensure_indexes()
+        self.assertEqual(self.db.check_hot_query_plans(), {})
+        self.assertNotEqual(self.db.create_customer("John", "Smith", "JOHN.SMITH@email.com"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
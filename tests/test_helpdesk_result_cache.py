@@ -0,0 +1,51 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from cache import VersionedCache
+from mcp_base.server.async_helpdesk_db import AsyncAppleHelpDeskDB
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "mcp_base", "server", "apple_helpdesk.db")
+
+
+class ResultCacheInvalidationTest(unittest.TestCase):
+    """Cached ticket searches on a copy of the shipped database"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "apple_helpdesk.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.db = AsyncAppleHelpDeskDB(path, result_cache=VersionedCache())
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_mixed_case_email_search_sees_status_update(self):
+        async def scenario():
+            email = "John.Smith@EMAIL.com"
+            before = {ticket["id"]: ticket["status"] for ticket in await self.db.search_tickets(customer_email=email)}
+            await self.db.update_ticket_status(ticket_id=12, status="Closed")
+            after = {ticket["id"]: ticket["status"] for ticket in await self.db.search_tickets(customer_email=email)}
+            return before, after
+
+        before, after = asyncio.run(scenario())
+        self.assertEqual(before[12], "Open")
+        self.assertEqual(after[12], "Closed")
+
+    def test_email_case_variants_share_a_cache_entry(self):
+        async def scenario():
+            first = await self.db.search_tickets(customer_email="john.smith@email.com")
+            second = await self.db.search_tickets(customer_email="JOHN.SMITH@email.com")
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(second, first)
+        self.assertEqual(self.db.result_cache.stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
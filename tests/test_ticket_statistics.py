@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mcp_base.server.apple_helpdesk_manager import AppleHelpDeskDB
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "mcp_base", "server", "apple_helpdesk.db")
+
+INSERT_TICKET = """
+INSERT INTO tickets (ticket_number, customer_id, category_id, subject, description, status,
+                     created_at, resolved_at, closed_at)
+VALUES (?, 1, 1, 'Subject', 'Description', ?, '2024-03-04 10:00:00', ?, ?)
+"""
+
+
+class TicketStatisticsTest(unittest.TestCase):
+    """Trigger-maintained statistics must agree with a rebuild from the tickets table"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "apple_helpdesk.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.db = AppleHelpDeskDB(path)
+        self.db._ensure_ticket_statistics()
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        counters = self.db.conn.execute("SELECT dimension, stat_key, count FROM ticket_stats_counters "
+                                        "WHERE count != 0 ORDER BY 1, 2").fetchall()
+        buckets = self.db.conn.execute("SELECT period, bucket, metric, count FROM ticket_stats_buckets "
+                                       "WHERE count != 0 ORDER BY 1, 2, 3").fetchall()
+        return [tuple(row) for row in counters], [tuple(row) for row in buckets]
+
+    def assert_matches_rebuild(self):
+        incremental = self.snapshot()
+        self.db.rebuild_ticket_statistics()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_ticket_inserted_resolved_and_closed(self):
+        self.db.conn.execute(INSERT_TICKET, ("T-RESOLVED", "Resolved", "2024-03-05 10:00:00", None))
+        self.db.conn.execute(INSERT_TICKET, ("T-CLOSED", "Closed", "2024-03-05 10:00:00", "2024-03-06 10:00:00"))
+        self.db.conn.commit()
+        self.assert_matches_rebuild()
+
+    def test_null_status(self):
+        self.db.conn.execute(INSERT_TICKET, ("T-NULL", None, "2024-03-05 10:00:00", None))
+        self.db.conn.execute("UPDATE tickets SET status = 'Resolved' WHERE ticket_number = 'T-NULL'")
+        self.db.conn.execute("UPDATE tickets SET status = NULL WHERE ticket_number = 'T-NULL'")
+        self.db.conn.commit()
+        self.assert_matches_rebuild()
+
+    def test_replace_triggers_keeps_counts(self):
+        before = self.snapshot()
+        self.db.replace_ticket_statistics_triggers()
+        self.assertEqual(before, self.snapshot())
+        self.db.conn.execute(INSERT_TICKET, ("T-AFTER", "Resolved", "2024-03-05 10:00:00", None))
+        self.db.conn.commit()
+        self.assert_matches_rebuild()
+
+
+if __name__ == "__main__":
+    unittest.main()